@@ -5,13 +5,56 @@ from dotenv import load_dotenv
 class Configuration:
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
     TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
+    # Point the API clients elsewhere, e.g. at the local stand-ins from scripts/api_standins.py; unset uses the public APIs.
+    MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL")
+    TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL")
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
     LLM_MODEL = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B"
     OCR_MODEL = "mistral-ocr-latest"
     CHROMA_PATH = "chroma"
     DATA_PATH = "data"
     OUTPUT_PATH = "output_chunks"
+    PAGE_CATALOG_PATH = "page_catalog.sqlite"
+    # Page texts go into one compressed, append-only archive instead of a file per page in OUTPUT_PATH.
+    PAGE_ARCHIVE = True
+    PAGE_ARCHIVE_PATH = "page_archive.bin"
     IMAGE_CHUNKS_PATH = "image_chunks"
+    RAG_OUTPUTS_PATH = "rag_outputs"
+    OUTPUT_STORE_PATH = "rag_outputs_store"
+    DATASET_SNAPSHOT_PATH = "rag_outputs_index.pkl"
+    TRACE_PATH = os.getenv("PIPELINE_TRACE_PATH")
+    USAGE_LEDGER_PATH = "usage_ledger.jsonl"
+
+    # USD list prices, used to estimate the cost recorded in the usage ledger.
+    OCR_PRICE_PER_1000_PAGES = 1.0
+    LLM_PRICE_PER_MILLION_INPUT_TOKENS = 2.0
+    LLM_PRICE_PER_MILLION_OUTPUT_TOKENS = 2.0
+
+    RETRIEVAL_K = 5
+    # Vector and BM25 candidates per year are fused by reciprocal rank; set HYBRID_RETRIEVAL to False for vectors only.
+    HYBRID_RETRIEVAL = True
+    BM25_INDEX_PATH = "bm25_index.pkl"
+    FUSION_CANDIDATES = 20
+    RRF_K = 60
+    # Numeric table cells from OCR'd pages; the batch runner answers unambiguous indicators from it without the LLM.
+    TABLE_CELL_INDEX_PATH = "table_cell_index.pkl"
+    TABLE_LOOKUP = True
+    # Built by scripts/find_matching_parameters.py; the batch runner can skip indicators never mentioned in a country's
+    # pages. Off until validated against the gold set: OCR errors in a crop name make a page miss its indicators.
+    COVERAGE_MATRIX_PATH = "coverage_matrix.pkl"
+    COVERAGE_PRUNING = False
+    CONTEXT_TOKEN_BUDGET = 24000
+    LLM_MAX_TOKENS = 1024
+
+    # Pages whose pdfplumber text layer has at least this many letters and digits skip rasterization and OCR, unless
+    # one image covers this share of the page: a scan whose hidden OCR layer is usually worse than Mistral OCR.
+    TEXT_LAYER_FAST_PATH = True
+    MIN_TEXT_LAYER_CHARS = 200
+    MAX_TEXT_LAYER_IMAGE_COVERAGE = 0.8
+    # Paddle pages are deskewed and turned upright from a thumbnail before OCR, so PaddleOCR runs without its
+    # per-line orientation classifier; turn the classifier back on for collections with many upside-down pages.
+    PAGE_ORIENTATION_PREPASS = True
+    PADDLE_TEXTLINE_ORIENTATION = False
 
     KEYWORDS = ["not classified by size of holding", "Main Results"]
 
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CROPS = ["Wheat", "Rye", "Barley", "Oats", "Maize", "Rice", "Potatoes", "Sugar Beets", "Cotton", "Tobacco"]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def seeded_random(text: str) -> random.Random:
+    return random.Random(hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+
+def census_number(rng: random.Random) -> str:
+    return f"{rng.randint(100, 9_999_999):,}".replace(",", " ")
+
+
+def ocr_markdown(document: str) -> str:
+    # The same page image always gets the same table, so runs against the stand-in are comparable.
+    rng = seeded_random(document)
+    rows = ["| Crop | Number of holdings reporting | Area (total) | Production |", "|---|---|---|---|"]
+    for crop in rng.sample(CROPS, rng.randint(4, len(CROPS))):
+        rows.append(f"| {crop} | {census_number(rng)} | {census_number(rng)} | {census_number(rng)} |")
+    return f"TABLE {rng.randint(1, 40)}. AREA AND PRODUCTION OF CROPS\n\n" + "\n".join(rows)
+
+
+def chat_markdown(prompt: str) -> str:
+    rng = seeded_random(prompt)
+    countries = list(dict.fromkeys(re.findall(r"^Country: (.+)$", prompt, flags=re.MULTILINE))) or ["Unknown"]
+    years = list(dict.fromkeys(re.findall(r"^Year: (\S+)$", prompt, flags=re.MULTILINE))) or ["Unknown"]
+    question = prompt.rsplit("Answer the question based on the above context:", 1)[-1].strip()
+    indicator = re.split(r"\s+-\s+|\?", re.sub(r"^(What|How)\s+\w+\s+(the\s+)?", "", question))[0] or "Indicator"
+    rows = ["| Country | Year | Indicator | Value | Unit |", "|---|---|---|---|---|"]
+    for country in countries[:2]:
+        for year in years:
+            rows.append(f"| {country} | {year} | {indicator[:80]} | {census_number(rng)} | {rng.choice(['ha', 'number', 'metric tons'])} |")
+    return "\n".join(rows)
+
+
+def read_fixture(fixtures_dir: str, kind: str, key: str):
+    if not fixtures_dir:
+        return None
+    path = os.path.join(fixtures_dir, kind, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".md")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        # Token bucket; returns 0 when the request may go through, otherwise the seconds until the next token.
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class StandinService:
+
+    def __init__(self, name: str, latency: float, jitter: float, error_rate: float, rate_limit: float, burst: int,
+                 seed: int, fixtures_dir: str = None, token_latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_latency = token_latency
+        self.limiter = RateLimiter(rate_limit, burst)
+        self.fixtures_dir = fixtures_dir
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+
+    def draw(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            return self.rng.random(), self.rng.uniform(-self.jitter, self.jitter)
+
+    def count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def ocr(self, body: dict) -> dict:
+        document = body.get("document") or {}
+        source = document.get("image_url") or document.get("document_url") or ""
+        markdown = read_fixture(self.fixtures_dir, "ocr", source) or ocr_markdown(source)
+        return {
+            "pages": [{"index": 0, "markdown": markdown, "images": [], "dimensions": None}],
+            "model": body.get("model", "mistral-ocr-latest"),
+            "usage_info": {"pages_processed": 1, "doc_size_bytes": len(source)},
+        }
+
+    def chat(self, body: dict) -> dict:
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        content = read_fixture(self.fixtures_dir, "chat", prompt) or chat_markdown(prompt)
+        completion_tokens = min(estimate_tokens(content), body.get("max_tokens") or estimate_tokens(content))
+        return {
+            "id": f"standin-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", ""),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": completion_tokens,
+                      "total_tokens": estimate_tokens(prompt) + completion_tokens},
+        }
+
+
+def make_handler(service: StandinService, routes: dict):
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status: int, payload: dict, headers: dict = None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/health", "/stats"):
+                self.send_json(200, {"service": service.name, **service.stats})
+            else:
+                self.send_json(404, {"message": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            handler = routes.get(self.path.split("?")[0].rstrip("/"))
+            if handler is None:
+                self.send_json(404, {"message": f"Unknown path {self.path}"})
+                return
+
+            wait = service.limiter.acquire()
+            if wait:
+                service.count("rate_limited")
+                self.send_json(429, {"message": "Rate limit exceeded", "type": "rate_limited"},
+                               {"Retry-After": f"{max(wait, 0.001):.3f}"})
+                return
+
+            draw, jitter = service.draw()
+            try:
+                response = handler(json.loads(body or b"{}"))
+            except (ValueError, AttributeError) as e:
+                service.count("errors")
+                self.send_json(400, {"message": f"Invalid request: {e}"})
+                return
+            output_tokens = response.get("usage", {}).get("completion_tokens", 0)
+            time.sleep(max(service.latency + jitter + service.token_latency * output_tokens, 0.0))
+
+            if draw < service.error_rate:
+                service.count("errors")
+                self.send_json(500, {"message": "Injected server error", "type": "internal_error"})
+                return
+            service.count("ok")
+            self.send_json(200, response)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandinHandler
+
+
+def start_server(service: StandinService, routes: dict, host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(service, routes))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_standins(host: str = "127.0.0.1", mistral_port: int = 8901, together_port: int = 8902, ocr_latency: float = 0.5,
+                   chat_latency: float = 1.0, token_latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                   rate_limit: float = 0.0, burst: int = 1, seed: int = 0, fixtures_dir: str = None) -> dict:
+    mistral = StandinService("mistral", ocr_latency, jitter, error_rate, rate_limit, burst, seed, fixtures_dir)
+    together = StandinService("together", chat_latency, jitter, error_rate, rate_limit, burst, seed, fixtures_dir, token_latency)
+    return {
+        "mistral": start_server(mistral, {"/v1/ocr": mistral.ocr}, host, mistral_port),
+        "together": start_server(together, {"/v1/chat/completions": together.chat}, host, together_port),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-ins for the Mistral OCR and Together chat APIs")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--mistral-port', type=int, default=8901)
+    parser.add_argument('--together-port', type=int, default=8902)
+    parser.add_argument('--ocr-latency', type=float, default=0.5, help='Seconds per OCR request')
+    parser.add_argument('--chat-latency', type=float, default=1.0, help='Seconds per chat request before output tokens')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='Extra seconds per completion token')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- seconds added to every latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Requests per second per service before HTTP 429 (0 = off)')
+    parser.add_argument('--burst', type=int, default=1, help='Requests allowed at once before the rate limit applies')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', help='Directory with ocr/<sha256>.md and chat/<sha256>.md responses')
+    args = parser.parse_args()
+
+    servers = start_standins(args.host, args.mistral_port, args.together_port, args.ocr_latency, args.chat_latency,
+                             args.token_latency, args.jitter, args.error_rate, args.rate_limit, args.burst, args.seed,
+                             args.fixtures)
+    print(f"MISTRAL_SERVER_URL=http://{args.host}:{args.mistral_port}")
+    print(f"TOGETHER_BASE_URL=http://{args.host}:{args.together_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.shutdown()
@@ -1,26 +1,17 @@
 import yaml
 import re
 import os
-from src.rag_core.rag_answer import query_rag
 import pandas as pd
+from config import Configuration
+from src.rag_core.rag_answer import query_rag
+from src.utils.table_parser import parse_markdown_table, format_numeric_columns
+from src.utils.output_store import OutputStore
+from src.utils.usage_ledger import ledger, attribute
+from src.rag_core.table_cell_index import TableCellIndex
+from src.utils.coverage_matrix import CoverageMatrix
+from src.utils.page_catalog import PageCatalog
 import logging
 
-def format_number_with_commas(value, column_name=""):
-    if column_name.lower() in ['year', 'year_']:
-        return value
-    
-    if isinstance(value, str):
-        cleaned = re.sub(r'[,\s]', '', value)
-        try:
-            num = float(cleaned)
-            if num.is_integer():
-                return f"{int(num):,}".replace(",", " ")
-            else:
-                return f"{num:,.2f}".replace(",", " ")
-        except ValueError:
-            return value
-    return value
-
 class BatchRAGRunner:
     def __init__(self, config_path):
         config_path = os.path.join('scripts', config_path)
@@ -28,6 +19,21 @@ class BatchRAGRunner:
             self.config = yaml.safe_load(f)
         self.queries = self.config["queries"]
         self.indicator_groups = self.config["indicator_groups"]
+        self.store = OutputStore()
+        self.table_index = TableCellIndex.load() if Configuration.TABLE_LOOKUP else None
+        self.coverage = self.load_coverage() if Configuration.COVERAGE_PRUNING else None
+        self.index_answers = 0
+        self.llm_answers = 0
+        self.skipped = 0
+
+    def load_coverage(self):
+        # A matrix that does not cover exactly the catalogued pages could skip indicators of newly ingested pages.
+        coverage = CoverageMatrix.load()
+        if not coverage.is_current(PageCatalog().find()):
+            print(f"{Configuration.COVERAGE_MATRIX_PATH} does not match the page catalog; not skipping any indicator. "
+                  f"Rerun scripts/find_matching_parameters.py to refresh it.")
+            return None
+        return coverage
 
     def run(self):
         for q in self.queries:
@@ -56,50 +62,57 @@ class BatchRAGRunner:
                         question = f"What is the {indicator} in {country} in {years_for_filename[0]}?"
                     else:
                         years_str = " and ".join(years_for_filename)
-                        question = f"What are the {indicator} data for {country} across {years_str}? Please provide all available data for both years, including any differences in parameters between the years."
+                        question = f"What are the {indicator} data for {country} across {years_str}? Please provide all available data for every year, including any differences in parameters between the years."
                     
                     print(f"\n=== Question: {question}")
+
+                    if self.coverage is not None and self.coverage.covers_indicator(country, years, indicator) is False:
+                        self.skipped += 1
+                        print(f"Skipped '{indicator}': not mentioned in any page of {country} for {', '.join(years_for_filename)}")
+                        continue
                     
-                    first_year = years[0]
-                    
-                    answer = query_rag(question, country, first_year, save_csv=False)
-                    print(f"RAG Answer for '{indicator}':\n{answer}")
+                    rows = self.table_index.answer(country, years, indicator) if self.table_index is not None else None
+                    if rows is not None:
+                        self.index_answers += 1
+                        df = pd.DataFrame(rows, dtype=object)
+                        print(f"Table index answer for '{indicator}':\n{df.to_string(index=False)}")
+                    else:
+                        self.llm_answers += 1
+                        with attribute(country=country, category=category, indicator=indicator):
+                            answer = query_rag(question, country, years, save_csv=False)
+                        print(f"RAG Answer for '{indicator}':\n{answer}")
+                        df = parse_markdown_table(answer)
                     
                     safe_indicator = re.sub(r"[^\w\-]", "_", indicator)
 
                     safe_indicator = safe_indicator[:80]
    
                     filename = os.path.join(self.output_dir, f"output_{category}_{safe_indicator}.csv")
-                    table_lines = [line for line in answer.splitlines() if "|" in line]
-                    table_lines = [line for line in table_lines if not re.match(r"^\s*\|?\s*-+\s*\|", line)]
-                    if len(table_lines) >= 2:
-                        headers = [cell.strip() for cell in table_lines[0].split("|") if cell.strip()]
-                        rows = []
-                        for row_line in table_lines[1:]:
-                            row = [cell.strip() for cell in row_line.split("|") if cell.strip()]
-                            if len(row) != len(headers):
-                                if len(row) > len(headers):
-                                    row = row[:len(headers)]
-                                else:
-                                    while len(row) < len(headers):
-                                        row.append("")
-                            rows.append(row)
-                        import pandas as pd
-                        df = pd.DataFrame(rows, columns=headers)
-                        
+                    if df is not None:
                         year_col = next((col for col in df.columns if col.lower() in ['year']), None)
                         if year_col:
-                            df[year_col] = df[year_col].apply(lambda y: output_years_map.get(int(y), y) if y.isdigit() else y)
+                            df[year_col] = df[year_col].replace({str(y): str(o) for y, o in output_years_map.items() if o is not None})
 
-                        for column in df.columns:
-                            df[column] = df[column].apply(lambda x: format_number_with_commas(x, column))
+                        df = format_numeric_columns(df)
                         
                         df.to_csv(filename, index=False)
+                        self.store.append(df, country, category, indicator, source_file=filename)
                         print(f"Successfully created CSV: {filename}")
                     else:
                         print(f"Table not found in RAG answer, CSV not created for indicator: {indicator}")
+        self.report_lookups()
+
+    def report_lookups(self):
+        total = self.index_answers + self.llm_answers + self.skipped
+        if total:
+            print(f"\nAnswered {self.index_answers} of {total} indicators from the table cell index and skipped "
+                  f"{self.skipped} not covered by any page ({(self.index_answers + self.skipped) / total:.1%} of LLM calls avoided).")
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     runner = BatchRAGRunner("queries.yaml")
-    runner.run() 
\ No newline at end of file
+    try:
+        runner.run()
+    finally:
+        ledger.save()
+        ledger.print_rollups() 
\ No newline at end of file
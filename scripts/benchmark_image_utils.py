@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.utils.image_utils import (preprocess_image, trim_margins, get_binary_projection, find_best_split_x,
+                                   validate_split_corridor, smart_split_page, is_image_blank, gray_thumbnail, binarize,
+                                   estimate_skew, detect_orientation, deskew_and_orient)
+
+PAGE_SIZE_INCHES = (8.27, 11.69)
+DEFAULT_DPIS = [200, 300]
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.15
+SEED = 0
+
+
+def synthetic_page(dpi: int, seed: int = SEED) -> Image.Image:
+    # A two-column statistical table on yellowed paper: ruled columns, numeric rows, a gutter, scanner noise and a slight skew.
+    rng = np.random.default_rng(seed)
+    w, h = int(PAGE_SIZE_INCHES[0] * dpi), int(PAGE_SIZE_INCHES[1] * dpi)
+    margin, gutter = int(0.6 * dpi), int(0.4 * dpi)
+    page = np.full((h, w, 3), (226, 218, 196), np.uint8)
+    scale = dpi / 200
+    line_height = int(28 * scale)
+    column_width = (w - 2 * margin - gutter) // 2
+
+    for column in range(2):
+        x0 = margin + column * (column_width + gutter)
+        cv2.putText(page, "TABLE %d. AREA AND PRODUCTION" % (column + 1), (x0, margin), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.6 * scale, (40, 35, 30), max(1, int(2 * scale)))
+        cv2.line(page, (x0, margin + line_height // 2), (x0 + column_width, margin + line_height // 2), (50, 45, 40), 2)
+        for x in np.linspace(x0, x0 + column_width, 5).astype(int):
+            cv2.line(page, (x, margin + line_height // 2), (x, h - margin), (60, 55, 50), 1)
+        for row, y in enumerate(range(margin + 2 * line_height, h - margin, line_height)):
+            cv2.putText(page, "Region %d" % row, (x0 + 4, y), cv2.FONT_HERSHEY_PLAIN, 1.1 * scale, (30, 30, 30), 1)
+            for cell in range(1, 4):
+                value = "%d,%03d" % (rng.integers(1, 999), rng.integers(0, 999))
+                cv2.putText(page, value, (x0 + cell * column_width // 4 + 6, y), cv2.FONT_HERSHEY_PLAIN, 1.1 * scale,
+                            (30, 30, 30), 1)
+
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), 0.4, 1.0)
+    page = cv2.warpAffine(page, rotation, (w, h), borderValue=(226, 218, 196))
+    noise = rng.normal(0, 8, page.shape[:2])[..., None]
+    page = np.clip(page + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(page)
+
+
+def blank_page(dpi: int, seed: int = SEED) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    w, h = int(PAGE_SIZE_INCHES[0] * dpi), int(PAGE_SIZE_INCHES[1] * dpi)
+    page = np.clip(rng.normal(230, 3, (h, w)), 0, 255).astype(np.uint8)
+    return Image.fromarray(page).convert('RGB')
+
+
+def benchmark_cases(dpi: int) -> dict:
+    # Every case gets the input it sees in the extractors: raw pages for preprocessing, preprocessed pages for splitting.
+    page = synthetic_page(dpi)
+    preprocessed = preprocess_image(page)
+    trimmed = trim_margins(preprocessed)
+    raw_bin_img = get_binary_projection(trimmed, dilation_kernel_size=None)
+    split_x = find_best_split_x(trimmed)
+    blank = blank_page(dpi)
+    # A landscape table turned a quarter and scanned crooked, the case the orientation pre-pass exists for.
+    landscape = page.rotate(90, expand=True).rotate(2, fillcolor=(226, 218, 196))
+    thumbnail = binarize(gray_thumbnail(landscape))
+    return {
+        'preprocess_image': lambda: preprocess_image(page),
+        'preprocess_image_1930': lambda: preprocess_image(page, '1930'),
+        'trim_margins': lambda: trim_margins(preprocessed),
+        'get_binary_projection': lambda: get_binary_projection(trimmed, dilation_kernel_size=(trimmed.width // 50, 1)),
+        'find_best_split_x': lambda: find_best_split_x(trimmed),
+        'validate_split_corridor': lambda: validate_split_corridor(raw_bin_img, split_x, trimmed.width, trimmed.height),
+        'smart_split_page': lambda: smart_split_page(preprocessed),
+        'is_image_blank': lambda: is_image_blank(page),
+        'is_image_blank_empty_page': lambda: is_image_blank(blank),
+        'estimate_skew': lambda: estimate_skew(thumbnail),
+        'detect_orientation': lambda: detect_orientation(thumbnail),
+        'deskew_and_orient': lambda: deskew_and_orient(page),
+        'deskew_and_orient_landscape': lambda: deskew_and_orient(landscape),
+        # The per-page image work of the Paddle extractor without and with the pre-pass in front of it.
+        'paddle_page_prep': lambda: smart_split_page(page),
+        'paddle_page_prep_with_prepass': lambda: smart_split_page(deskew_and_orient(page)[0]),
+    }
+
+
+def time_case(func, repeat: int) -> dict:
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Measured in a separate run because tracing allocations slows everything down; numpy buffers are traced.
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'max_ms': max(timings),
+        'peak_memory_mb': peak / 1024 ** 2,
+        'pages_per_second': 1000 / statistics.median(timings) if statistics.median(timings) > 0 else 0.0,
+    }
+
+
+def run_benchmarks(dpis: list, repeat: int, only: list = None) -> dict:
+    results = {}
+    for dpi in dpis:
+        cases = benchmark_cases(dpi)
+        for name, func in cases.items():
+            if only and name not in only:
+                continue
+            result = results[f"{name}@{dpi}dpi"] = time_case(func, repeat)
+            print(f"{name}@{dpi}dpi: {result['median_ms']:.2f} ms, {result['pages_per_second']:.1f} pages/s "
+                  f"(peak {result['peak_memory_mb']:.1f} MB)")
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    regressions = []
+    for name, result in report['results'].items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        for metric in ('median_ms', 'peak_memory_mb'):
+            if reference[metric] > 0 and result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append({
+                    'case': name,
+                    'metric': metric,
+                    'baseline': reference[metric],
+                    'current': result[metric],
+                    'change': result[metric] / reference[metric] - 1,
+                })
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the image_utils functions every page goes through")
+    parser.add_argument('--dpi', type=int, nargs='+', default=DEFAULT_DPIS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', nargs='+', help='Run only these cases (e.g. smart_split_page)')
+    parser.add_argument('--output', default='image_utils_benchmark.json')
+    parser.add_argument('--baseline', help='Earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed slowdown before flagging (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.dpi, args.repeat, args.only)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report['regressions'] = compare_with_baseline(report, json.load(f), args.tolerance)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if report.get('regressions'):
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']:.2f} -> {regression['current']:.2f} ({regression['change']:+.0%})")
+        raise SystemExit(1)
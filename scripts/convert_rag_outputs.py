@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Configuration
+from src.utils.output_store import OutputStore
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the rag_outputs CSV tree into the partitioned Parquet store")
+    parser.add_argument('--source', default=Configuration.RAG_OUTPUTS_PATH, help='Root of the CSV tree')
+    parser.add_argument('--store', default=Configuration.OUTPUT_STORE_PATH, help='Parquet store directory')
+    parser.add_argument('--compact', action='store_true', help='Only rewrite the store into one file per partition')
+    args = parser.parse_args()
+
+    store = OutputStore(args.store)
+    start = time.perf_counter()
+    if args.compact:
+        rows = store.compact()
+        print(f"Compacted {rows} rows in {time.perf_counter() - start:.2f} sec")
+        return
+
+    rows = store.import_tree(args.source)
+    print(f"Imported {rows} rows from {args.source} into {args.store} in {time.perf_counter() - start:.2f} sec")
+
+    start = time.perf_counter()
+    df = store.load()
+    print(f"Loaded {len(df)} rows back in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
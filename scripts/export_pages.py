@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Configuration
+from src.utils.page_archive import PageArchive, is_archive_location
+from src.utils.page_catalog import PageCatalog
+
+
+def import_loose_files(archive: PageArchive, catalog: PageCatalog) -> int:
+    locations = {}
+    paths = []
+    for row in catalog.find():
+        path = row["text_path"]
+        if not path or is_archive_location(path) or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            locations[(row["source"], row["page"])] = archive.append(row["source"], row["page"], f.read(),
+                                                                     row["country"], row["year"])
+        paths.append(path)
+    catalog.update_locations(locations)
+    # The loose files are removed only once the catalog points at the archive.
+    for path in paths:
+        os.remove(path)
+    return len(locations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import or compact the compressed page archive")
+    parser.add_argument('--archive', default=Configuration.PAGE_ARCHIVE_PATH)
+    parser.add_argument('--output-dir', default=Configuration.OUTPUT_PATH, help='Where exported page files are written')
+    parser.add_argument('--country')
+    parser.add_argument('--year')
+    parser.add_argument('--source', help='Only pages of this PDF')
+    parser.add_argument('--import-files', action='store_true', help='Move the loose page files listed in the catalog into the archive')
+    parser.add_argument('--compact', action='store_true', help='Rewrite the archive without replaced or deleted pages')
+    parser.add_argument('--stats', action='store_true', help='Only print page count and compression ratio')
+    args = parser.parse_args()
+
+    archive = PageArchive(args.archive)
+    start = time.perf_counter()
+    if args.import_files:
+        print(f"Imported {import_loose_files(archive, PageCatalog())} page files in {time.perf_counter() - start:.2f} sec")
+    elif args.compact:
+        print(f"Compacted {archive.compact()} pages in {time.perf_counter() - start:.2f} sec")
+    elif not args.stats:
+        exported = archive.export(args.output_dir, args.country, args.year, args.source)
+        print(f"Exported {exported} pages to {args.output_dir} in {time.perf_counter() - start:.2f} sec")
+    print(archive.stats())
+    archive.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,79 +1,96 @@
+import argparse
 import os
-from collections import defaultdict
-
-def find_parameters_in_chunks():
-    crop_parameters = [
-        "Wheat", "Winter Wheat", "Spring Wheat", "Rye", "Rice", "Millet and Sorghum",
-        "Millet", "Sorghum", "Maize", "Barley", "Oats", "Spelt", "Maslin",
-        "Other mixed grains", "Soybean", "All dry beans and peas",
-        "Edible dry beans", "Lentils", "Chickpeas", "Edible dry peas",
-        "Potatoes", "Manioc", "Arrowroot", "Sweet potates", "Yams",
-        "Sugar Cane", "Sugar Beets", "Cotton", "Flax", "Hemp", "Groundnuts",
-        "Linseed", "Hempseed", "Castor beans", "Rapeseed", "Colza", "Sesame",
-        "Sunflower", "Tobacco", "Coffee", "Tea", "Cacao", "Coconut",
-        "Oil Plams", "Rubber", "Beans", "Dry beans", "Sweet potatoes", "Other cereals harversted for grain"
-    ]
-
-    machinery_parameters = [
-        "Tractors", "Plows", "Iron plows", "Disk plows", "wood plows", "ridging plows",
-        "tine harrows", "Rotary tillers", "Disk harrows", "cultivators", "hoes", "seed drills",
-        "sprayers", "dusters", "mowers", "rakes", "reapers", "binders", "combines(harvest-threshers)",
-        "corn pickers", "potato-harvesting machinery", "sugar-beet harvesting machinery", "threshers",
-        "hay balers", "sugarcane crushers", "carts", "jeeps", "Station wagons", "trucks", "Automobiles",
-        "Ploughs", "Harrows", "Rollers", "Fertilizer Distributors", "Mechanical hoes", "Grain harvesters",
-        "Tedders", "Potato lifters", "Cleaners and sorters", "Hay and forage presses", "Maize shredders",
-        "Chaffcutters", "Rootcutters", "Grinders", "Crushers", "Shedders"
-    ]
-
-    # Add general parameters that could be in any category but shouldn't be categorized as crops or machinery
-    general_parameters = ["Number of holdings reporting", "Hectares", "Metric tons"]
-
-    all_parameters = {
-        "Crops": {p.strip().lower() for p in crop_parameters if p.strip()},
-        "Machinery": {p.strip().lower() for p in machinery_parameters if p.strip()},
-        "General": {p.strip().lower() for p in general_parameters if p.strip()}
-    }
-
-    chunks_dir = 'output_chunks'
-    country_parameters = defaultdict(lambda: defaultdict(set))
-
-    try:
-        if not os.path.exists(chunks_dir) or not os.listdir(chunks_dir):
-            return
-
-        files = [f for f in os.listdir(chunks_dir) if f.endswith('.txt')]
-        
-        for filename in files:
-            try:
-                country = filename.split('_')[0]
-            except IndexError:
-                continue
-
-            filepath = os.path.join(chunks_dir, filename)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read().lower()
-                
-                for category, params in all_parameters.items():
-                    for param in params:
-                        if param in content:
-                            country_parameters[country][category].add(param)
-
-    except Exception as e:
+import sys
+import time
+
+import yaml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Configuration
+from src.utils.coverage_matrix import CoverageMatrix, indicator_term, term_key
+from src.utils.page_catalog import PageCatalog
+
+CROP_PARAMETERS = [
+    "Wheat", "Winter Wheat", "Spring Wheat", "Rye", "Rice", "Millet and Sorghum",
+    "Millet", "Sorghum", "Maize", "Barley", "Oats", "Spelt", "Maslin",
+    "Other mixed grains", "Soybean", "All dry beans and peas",
+    "Edible dry beans", "Lentils", "Chickpeas", "Edible dry peas",
+    "Potatoes", "Manioc", "Arrowroot", "Sweet potates", "Yams",
+    "Sugar Cane", "Sugar Beets", "Cotton", "Flax", "Hemp", "Groundnuts",
+    "Linseed", "Hempseed", "Castor beans", "Rapeseed", "Colza", "Sesame",
+    "Sunflower", "Tobacco", "Coffee", "Tea", "Cacao", "Coconut",
+    "Oil Plams", "Rubber", "Beans", "Dry beans", "Sweet potatoes", "Other cereals harversted for grain"
+]
+
+MACHINERY_PARAMETERS = [
+    "Tractors", "Plows", "Iron plows", "Disk plows", "wood plows", "ridging plows",
+    "tine harrows", "Rotary tillers", "Disk harrows", "cultivators", "hoes", "seed drills",
+    "sprayers", "dusters", "mowers", "rakes", "reapers", "binders", "combines(harvest-threshers)",
+    "corn pickers", "potato-harvesting machinery", "sugar-beet harvesting machinery", "threshers",
+    "hay balers", "sugarcane crushers", "carts", "jeeps", "Station wagons", "trucks", "Automobiles",
+    "Ploughs", "Harrows", "Rollers", "Fertilizer Distributors", "Mechanical hoes", "Grain harvesters",
+    "Tedders", "Potato lifters", "Cleaners and sorters", "Hay and forage presses", "Maize shredders",
+    "Chaffcutters", "Rootcutters", "Grinders", "Crushers", "Shedders"
+]
+
+# Add general parameters that could be in any category but shouldn't be categorized as crops or machinery
+GENERAL_PARAMETERS = ["Number of holdings reporting", "Hectares", "Metric tons"]
+
+PARAMETER_CATEGORIES = {"Crops": CROP_PARAMETERS, "Machinery": MACHINERY_PARAMETERS, "General": GENERAL_PARAMETERS}
+
+
+def query_subjects(config_path: str = os.path.join('scripts', 'queries.yaml')) -> list[str]:
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    subjects = []
+    for group in config.get("indicator_groups", []):
+        for indicator in group.get("indicators") or []:
+            term = indicator_term(indicator)
+            if term:
+                subjects.append(term)
+    return subjects
+
+
+def build_coverage(workers: int = 1, rebuild: bool = False, config_path: str = os.path.join('scripts', 'queries.yaml')) -> CoverageMatrix:
+    matrix = CoverageMatrix() if rebuild else CoverageMatrix.load()
+    terms = [term for params in PARAMETER_CATEGORIES.values() for term in params] + query_subjects(config_path)
+    rows = PageCatalog().find()
+    start = time.perf_counter()
+    scanned = matrix.scan(rows, terms, workers)
+    print(f"Scanned {scanned} of {len(rows)} pages for {len(matrix.keys)} terms in {time.perf_counter() - start:.2f} sec")
+    matrix.save()
+    return matrix
+
+
+def print_parameters_by_country(matrix: CoverageMatrix):
+    hits = matrix.frame()
+    if len(hits) == 0:
+        print("\nNo matching parameters were found in any of the pages.")
         return
+    found = hits.groupby("country")["term"].agg(set)
+    print("\n--- Found Matching Parameters by Country ---")
+    for country, terms in found.items():
+        print(f"\n{country}:")
+        for category, params in PARAMETER_CATEGORIES.items():
+            matched = sorted({term_key(param) for param in params} & terms)
+            if matched:
+                print(f"  {category}:")
+                for param in matched:
+                    print(f"    - {param.title()}")
 
-    if country_parameters:
-        print("\n--- Found Matching Parameters by Country ---")
-        for country in sorted(country_parameters.keys()):
-            print(f"\n{country.replace('-', ' ').title()}:")
-            country_data = country_parameters[country]
-            
-            for category in ["Crops", "Machinery", "General"]:
-                if country_data[category]:
-                    print(f"  {category}:")
-                    for param in sorted(list(country_data[category])):
-                        print(f"    - {param.title()}")
-    else:
-        print("\nNo matching parameters were found in any of the chunk files.")
 
 if __name__ == '__main__':
-    find_parameters_in_chunks()
+    parser = argparse.ArgumentParser(description="Scan the page store for indicator terms and save the coverage matrix")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rebuild', action='store_true', help='Rescan every page instead of only changed ones')
+    parser.add_argument('--queries', default=os.path.join('scripts', 'queries.yaml'))
+    parser.add_argument('--csv', help='Also save country, year, term, page count and page references to this file')
+    args = parser.parse_args()
+
+    if not os.path.exists(Configuration.PAGE_CATALOG_PATH):
+        parser.error(f"no page catalog at {Configuration.PAGE_CATALOG_PATH}; process the PDFs first")
+    coverage = build_coverage(args.workers, args.rebuild, args.queries)
+    print_parameters_by_country(coverage)
+    if args.csv:
+        coverage.frame().to_csv(args.csv, index=False)
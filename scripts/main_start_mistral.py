@@ -11,20 +11,41 @@ from config import Configuration
 from src.rag_core.chroma_manager import ChromaManager
 from src.data_processing.scan_extractor_mistral import process_all_pdfs
 from src.utils.chunk_manager import aggregate_country_chunks
+from src.utils.tracing import configure_tracing
+from src.utils.usage_ledger import ledger
+from src.rag_core.table_cell_index import TableCellIndex
+from src.utils.page_catalog import PageCatalog
+from src.utils.page_archive import PageArchive
 import logging
 
 def MainStartMistral():
     parser = argparse.ArgumentParser()
     parser.add_argument('--reset', action='store_true')
+    parser.add_argument('--trace', default=Configuration.TRACE_PATH, help='Write JSON-lines spans to this file')
     args = parser.parse_args()
     Configuration.initialize()
+    configure_tracing(args.trace)
+    catalog = PageCatalog()
+    archive = PageArchive() if Configuration.PAGE_ARCHIVE else None
     if args.reset:
+        catalog.clear()
+        if archive is not None:
+            archive.clear()
         ChromaManager.clear_database()
         if os.path.exists(Configuration.OUTPUT_PATH):
             for f in os.listdir(Configuration.OUTPUT_PATH):
                 os.remove(os.path.join(Configuration.OUTPUT_PATH, f))
         
-    docs = process_all_pdfs()
+    table_index = TableCellIndex() if args.reset else TableCellIndex.load()
+    try:
+        docs = process_all_pdfs(table_index, catalog, archive)
+    finally:
+        catalog.close()
+        if archive is not None:
+            archive.close()
+        table_index.save()
+        ledger.save()
+        ledger.print_rollups()
 
     logging.info("Aggregating country chunks...")
     country_docs = aggregate_country_chunks(docs)
@@ -1,43 +1,66 @@
 import argparse
 import os
-import re
 import shutil
 
 from config import Configuration
 from src.data_processing.scan_extractor_paddle import process_pdf_paddle
+from src.utils.tracing import configure_tracing, current_span
+from src.rag_core.table_cell_index import TableCellIndex
+from src.utils.page_catalog import PageCatalog
+from src.utils.page_archive import PageArchive, write_page_text
+from src.utils.country_year_extractor import CountryYearExtractor
 from paddleocr import PaddleOCR
 
 
-def save_documents(documents: list):
+def save_documents(documents: list, catalog: PageCatalog = None, archive: PageArchive = None):
     saved_count = 0
     os.makedirs(Configuration.OUTPUT_PATH, exist_ok=True)
+    pages = []
     
     for doc in documents:
-        country = doc.metadata.get("country", "Unknown")
-        year = doc.metadata.get("year", "Unknown")
+        source = doc.metadata.get("source", "Unknown")
         page = doc.metadata.get("page", 0)
-        
-        safe_filename = re.sub(r"[^\w\-_.]", "_", f"{country}_{year}_page{page}.txt")
-        out_path = os.path.join(Configuration.OUTPUT_PATH, safe_filename)
+        body = doc.page_content.split("\n\n", 1)[-1]
         
         try:
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(doc.page_content)
+            out_path = write_page_text(source, page, body, doc.metadata.get("country", "Unknown"),
+                                       doc.metadata.get("year", "Unknown"), archive)
             saved_count += 1
         except Exception as e:
-            pass
-    
+            print(f"Failed to save {source} page {page}: {e}")
+            current_span().add("pages_failed")
+            continue
+        pages.append({"source": source, "page": page, "country": doc.metadata.get("country", "Unknown"),
+                      "year": doc.metadata.get("year", "Unknown"), "text": body, "text_path": out_path,
+                      "category": CountryYearExtractor.extract_category(source, page), "engine": "paddle"})
+
+    if archive is not None:
+        # Pages are replaced in place by write_page_text; only pages no longer produced are dropped.
+        for source in {doc.metadata.get("source", "Unknown") for doc in documents}:
+            archive.delete_source(source, keep=[page["page"] for page in pages if page["source"] == source])
+    if catalog is not None:
+        for source in {page["source"] for page in pages}:
+            catalog.delete_source(source)
+        catalog.upsert_many(pages)
     return saved_count
 
 def main():
     parser = argparse.ArgumentParser(description="PDF -> OCR -> TXT (with column splitting)")
     parser.add_argument('--reset', action='store_true')
+    parser.add_argument('--trace', default=Configuration.TRACE_PATH, help='Write JSON-lines spans to this file')
     args = parser.parse_args()
     
     Configuration.initialize()
+    configure_tracing(args.trace)
     
-    if args.reset and os.path.exists(Configuration.OUTPUT_PATH):
-        shutil.rmtree(Configuration.OUTPUT_PATH)
+    catalog = PageCatalog()
+    archive = PageArchive() if Configuration.PAGE_ARCHIVE else None
+    if args.reset:
+        catalog.clear()
+        if archive is not None:
+            archive.clear()
+        if os.path.exists(Configuration.OUTPUT_PATH):
+            shutil.rmtree(Configuration.OUTPUT_PATH)
     
     os.makedirs(Configuration.OUTPUT_PATH, exist_ok=True)
     
@@ -48,18 +71,23 @@ def main():
     if not pdf_files:
         return
 
-    ocr = PaddleOCR(lang="en", use_textline_orientation=True)
+    ocr = PaddleOCR(lang="en", use_textline_orientation=Configuration.PADDLE_TEXTLINE_ORIENTATION)
     all_documents = []
+    table_index = TableCellIndex() if args.reset else TableCellIndex.load()
 
     for filename in pdf_files:
         filepath = os.path.join(Configuration.DATA_PATH, filename)
-        documents = process_pdf_paddle(filepath, filename, ocr)
+        documents = process_pdf_paddle(filepath, filename, ocr, table_index=table_index)
         all_documents.extend(documents)
+    table_index.save()
         
     if not all_documents:
         return
         
-    save_documents(all_documents)
+    save_documents(all_documents, catalog, archive)
+    catalog.close()
+    if archive is not None:
+        archive.close()
     
 
 if __name__ == '__main__':
@@ -1,12 +1,14 @@
 import time
 import os
+import json
 from typing import Dict, List
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from pdf2image import convert_from_path
 from PIL import Image
 
 from src.data_processing.scan_extractor_mistral import ScannedExtractorMistral
 from src.data_processing.scan_extractor_paddle import extract_text_paddle
+from src.utils.stage_timer import StageTimer, PERCENTILES
 from paddleocr import PaddleOCR
 from config import Configuration
 
@@ -22,30 +24,37 @@ class PerformanceMetrics:
 
 class PerformanceComparator:
     
-    def __init__(self):
+    def __init__(self, textline_orientation: bool = Configuration.PADDLE_TEXTLINE_ORIENTATION,
+                 orientation_prepass: bool = Configuration.PAGE_ORIENTATION_PREPASS):
         self.mistral_extractor = ScannedExtractorMistral()
-        self.paddle_ocr = PaddleOCR(lang="en", use_textline_orientation=True)
+        self.paddle_ocr = PaddleOCR(lang="en", use_textline_orientation=textline_orientation)
+        self.orientation_prepass = orientation_prepass
         self.results = {}
+        self.timer = StageTimer()
         
     def compare_single_pdf(self, pdf_path: str, dpi: int = 200) -> Dict[str, PerformanceMetrics]:
         filename = os.path.basename(pdf_path)
         try:
+            start_time = time.perf_counter()
             images = convert_from_path(pdf_path, dpi=dpi)
+            rasterization_time = time.perf_counter() - start_time
         except Exception as e:
             return {}
             
         results = {}
+        # Both engines reuse the same rasterized pages, so each is charged the full rasterization cost per page.
+        page_rasterization_time = rasterization_time / len(images) if images else 0.0
         
-        mistral_metrics = self._test_mistral(images, filename)
+        mistral_metrics = self._test_mistral(images, filename, page_rasterization_time)
         results['mistral'] = mistral_metrics
         
-        paddle_metrics = self._test_paddle(images, filename)
+        paddle_metrics = self._test_paddle(images, filename, page_rasterization_time)
         results['paddle'] = paddle_metrics
         
         return results
     
-    def _test_mistral(self, images: List[Image.Image], filename: str) -> PerformanceMetrics:
-        start_time = time.time()
+    def _test_mistral(self, images: List[Image.Image], filename: str, page_rasterization_time: float = 0.0) -> PerformanceMetrics:
+        start_time = time.perf_counter()
         total_text = ""
         successful_pages = 0
         
@@ -56,15 +65,19 @@ class PerformanceComparator:
                 break
         
         for i, image in enumerate(images):
-            try:
-                extracted_text = self.mistral_extractor.extract_text_mistral(image, current_year, i)
-                if extracted_text.strip():
-                    total_text += extracted_text + "\n"
-                    successful_pages += 1
-            except Exception as e:
-                continue
-        
-        processing_time = time.time() - start_time
+            with self.timer.page(engine='mistral', file=filename, page=i) as page:
+                self.timer.add('rasterization', page_rasterization_time)
+                page['success'] = False
+                try:
+                    extracted_text = self.mistral_extractor.extract_text_mistral(image, current_year, i, timer=self.timer)
+                    if extracted_text.strip():
+                        total_text += extracted_text + "\n"
+                        successful_pages += 1
+                        page['success'] = True
+                except Exception as e:
+                    continue
+        
+        processing_time = time.perf_counter() - start_time
         success_rate = successful_pages / len(images) if images else 0.0
         
         return PerformanceMetrics(
@@ -75,8 +88,8 @@ class PerformanceComparator:
             success_rate=success_rate
         )
     
-    def _test_paddle(self, images: List[Image.Image], filename: str) -> PerformanceMetrics:
-        start_time = time.time()
+    def _test_paddle(self, images: List[Image.Image], filename: str, page_rasterization_time: float = 0.0) -> PerformanceMetrics:
+        start_time = time.perf_counter()
         total_text = ""
         successful_pages = 0
         
@@ -87,16 +100,21 @@ class PerformanceComparator:
                 break
 
         for i, image in enumerate(images):
-            try:
-                extracted_text = extract_text_paddle(self.paddle_ocr, image, current_year)
-                
-                if extracted_text:
-                    total_text += extracted_text + "\n"
-                    successful_pages += 1
-            except Exception as e:
-                continue
+            with self.timer.page(engine='paddle', file=filename, page=i) as page:
+                self.timer.add('rasterization', page_rasterization_time)
+                page['success'] = False
+                try:
+                    extracted_text = extract_text_paddle(self.paddle_ocr, image, current_year, timer=self.timer,
+                                                         orientation_prepass=self.orientation_prepass)
+                    
+                    if extracted_text:
+                        total_text += extracted_text + "\n"
+                        successful_pages += 1
+                        page['success'] = True
+                except Exception as e:
+                    continue
         
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         success_rate = successful_pages / len(images) if images else 0.0
         
         return PerformanceMetrics(
@@ -207,9 +225,26 @@ class PerformanceComparator:
         report.append(f"Total time PaddleOCR: {total_paddle_time:.2f} sec")
         report.append(f"Total text volume Mistral: {total_mistral_text:,} characters")
         report.append(f"Total text volume PaddleOCR: {total_paddle_text:,} characters")
+        report.extend(self.generate_stage_report(self.timer.summary()))
         
         return "\n".join(report)
     
+    def generate_stage_report(self, summary: dict) -> List[str]:
+        if not summary:
+            return []
+        
+        report = ["", "=" * 80, "PER-PAGE STAGE TIMINGS", "=" * 80]
+        for engine, stats in summary.items():
+            report.append(f"{engine.upper()}:")
+            report.append(f"Pages: {stats['pages']}, {stats['pages_per_second']:.2f} pages/sec")
+            report.append("Latency: " + ", ".join(f"p{p} {stats[f'p{p}_ms']:.0f} ms" for p in PERCENTILES))
+            report.append(f"Peak RSS: {stats['peak_rss_mb']:.0f} MB")
+            for stage, stage_stats in sorted(stats['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+                report.append(f"  {stage:<18} mean {stage_stats['mean_ms']:>9.1f} ms  p95 {stage_stats['p95_ms']:>9.1f} ms  "
+                              f"{stage_stats['share'] * 100:5.1f}%")
+            report.append("")
+        return report
+    
     def run_comparison(self, dpi: int = 200) -> str:
         results = self.compare_all_pdfs(dpi)
         report = self.generate_report(results)
@@ -223,7 +258,19 @@ class PerformanceComparator:
         except Exception as e:
             pass
         
+        self.save_timings(Configuration.OUTPUT_PATH, results)
         return report
+    
+    def save_timings(self, output_dir: str, results: Dict[str, Dict[str, PerformanceMetrics]]):
+        summary = {
+            'engines': self.timer.summary(),
+            'unattributed_seconds': dict(self.timer.unattributed),
+            'files': {filename: {engine: asdict(metrics) for engine, metrics in file_results.items()}
+                      for filename, file_results in results.items()},
+        }
+        with open(os.path.join(output_dir, "performance_comparison_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        self.timer.write_csv(os.path.join(output_dir, "performance_comparison_pages.csv"))
 
 
 def main():
@@ -231,9 +278,14 @@ def main():
     
     parser = argparse.ArgumentParser(description="Performance comparison of Mistral vs PaddleOCR")
     parser.add_argument('--dpi', type=int, default=200, help='DPI for PDF conversion')
+    parser.add_argument('--textline-orientation', action='store_true',
+                        help="Run PaddleOCR's per-line orientation classifier")
+    parser.add_argument('--no-orientation-prepass', action='store_true',
+                        help='Skip the deskew and orientation pre-pass before Paddle OCR')
     args = parser.parse_args()
     
-    comparator = PerformanceComparator()
+    comparator = PerformanceComparator(textline_orientation=args.textline_orientation,
+                                       orientation_prepass=not args.no_orientation_prepass)
     report = comparator.run_comparison(dpi=args.dpi)
     
 
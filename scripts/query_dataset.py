@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Configuration
+from src.utils.dataset_index import DatasetIndex, source_fingerprint
+from src.utils.output_store import OutputStore
+
+def load_index(args) -> DatasetIndex:
+    # The snapshot is reused only while the files it was built from are unchanged.
+    root = Configuration.RAG_OUTPUTS_PATH if args.source == 'tree' else Configuration.OUTPUT_STORE_PATH
+    fingerprint = source_fingerprint(root, '.csv' if args.source == 'tree' else '.parquet')
+    if fingerprint is None:
+        sys.exit(f"No {args.source} at {root}; run the batch runner or scripts.convert_rag_outputs first")
+    fingerprint = f"{args.source}:{fingerprint}"
+    if os.path.exists(args.snapshot) and not args.rebuild:
+        index = DatasetIndex.load(args.snapshot)
+        if getattr(index, 'fingerprint', None) == fingerprint:
+            return index
+    if args.source == 'tree':
+        index = DatasetIndex.from_tree(root)
+    else:
+        index = DatasetIndex.from_store(OutputStore(root))
+    index.fingerprint = fingerprint
+    index.save(args.snapshot)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the extracted agricultural indicators")
+    parser.add_argument('--country', help='Country folder name, e.g. "Ceylon"')
+    parser.add_argument('--year', type=int, help='Census year; ranges such as 1959-60 match both years')
+    parser.add_argument('--category', help='Indicator category 0-8')
+    parser.add_argument('--group', help='Indicator group from the file name, e.g. "Rice" or "Sugar Cane"')
+    parser.add_argument('--indicator', help='Substring of the row indicator, e.g. "area"')
+    parser.add_argument('--snapshot', default=Configuration.DATASET_SNAPSHOT_PATH, help='Index snapshot file')
+    parser.add_argument('--source', choices=['store', 'tree'], default='store', help='Where to build the index from')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the snapshot before querying')
+    parser.add_argument('--output', help='Write the result to this CSV file instead of printing it')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_index(args)
+    loaded = time.perf_counter()
+    result = index.lookup(country=args.country, year=args.year, category=args.category,
+                          indicator_group=args.group, indicator_contains=args.indicator)
+    finished = time.perf_counter()
+
+    if args.output:
+        result.to_csv(args.output, index=False)
+    else:
+        columns = ['Country', 'Category', 'Indicator_Group', 'Year', 'Indicator', 'Value', 'Unit']
+        print(result[columns].to_string(index=False))
+    print(f"{len(result)} rows (index ready in {(loaded - start) * 1000:.1f} ms, "
+          f"query in {(finished - loaded) * 1000:.2f} ms)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,32 @@
+import argparse
+import json
 import sys
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.rag_core.rag_answer import query_rag
+from src.rag_core.rag_answer import (answer_query, get_vector_store, get_llm_client, get_embedding_function, retrieve_year,
+                                     merge_contexts, estimate_tokens)
+from src.utils.table_parser import parse_markdown_table
 
 def normalize_number(text: str) -> str:
     return ''.join(c for c in text if c.isdigit())
 
-def query_and_validate(question: str, expected_response: str) -> tuple[bool, str]:
-    expected_normalized = normalize_number(expected_response)
-    
-   country_match = re.search(r"in ([\w\s]+) in (\d{4})", question)
-    if not country_match:
-        print(f"Could not extract country and year from question: {question}")
-        return False, "Extraction failed"
-    
-    country = country_match.group(1).strip()
-    year = int(country_match.group(2))
-
-    response_content = query_rag(question, country, [year], save_csv=False)
-    
-    actual_normalized = normalize_number(response_content)
-
-    if expected_normalized in actual_normalized:
-        return True, response_content
-    else:
-        return False, response_content
+def answer_contains_number(answer: str, expected_normalized: str) -> bool:
+    df = parse_markdown_table(answer)
+    if df is None:
+        return expected_normalized in normalize_number(answer)
+    return any(expected_normalized in normalize_number(cell) for column in df.columns for cell in df[column])
 
-def run_all_tests():
-    tests = [
+GOLD_TESTS = [
 ("What was the total number of holdings in Peru in 1960?", "869 945"),
 ("What was the total area of owned holdings by land utilization in Peru in 1960?", "1 440 068"),
 ("How many holdings reported wheat in Peru in 1960?", "203 045"),
@@ -80,27 +76,193 @@ def run_all_tests():
 ("What was the absolute number of farms reporting orchards in Canada in 1930?", "222,712"),
 ]
 
-    passed, failed = 0, 0
-    failed_tests = []
+DEFAULT_WORKERS = 8
+DEFAULT_OUTPUT = "rag_eval_results.jsonl"
+DEFAULT_RETRIEVAL_OUTPUT = "rag_retrieval_recall.csv"
+RETRIEVAL_KS = [1, 3, 5, 10, 20]
+# "stored" is the Chroma collection as ingested; the others re-chunk the same country/year documents in memory.
+CHUNKING_CONFIGS = {
+    'stored': None,
+    'pages': 'pages',
+    'chars_4000_400': (4000, 400),
+    'chars_2000_200': (2000, 200),
+    'chars_1000_100': (1000, 100),
+}
+PAGE_SEPARATOR = re.compile(r"\n\n--- END OF PAGE [^\n]* ---\n\n")
 
-    for i, (question, expected) in enumerate(tests, 1):
-        print(f"--- Test {i}/{len(tests)} ---")
-        print(f"Question: {question}")
-        result, actual_response = query_and_validate(question, expected)
-        if result:
-            passed += 1
-            print("Result: Passed")
-        else:
-            failed += 1
-            failed_tests.append((question, expected, actual_response))
-            print("Result: Failed")
-        print("-" * (len(f"--- Test {i}/{len(tests)} ---")))
+def parse_question(question: str):
+    country_match = re.search(r"in ([\w\s]+) in (\d{4})", question)
+    if not country_match:
+        return None
+    return country_match.group(1).strip(), int(country_match.group(2))
+
+def query_and_validate(question: str, expected_response: str) -> dict:
+    expected_normalized = normalize_number(expected_response)
+    record = {'question': question, 'expected': expected_response, 'passed': False}
+    
+    parsed = parse_question(question)
+    if parsed is None:
+        record['error'] = "Could not extract country and year from question"
+        return record
+    record['country'], record['year'] = parsed
 
+    start_time = time.perf_counter()
+    result = answer_query(question, record['country'], record['year'])
+    record['latency_seconds'] = time.perf_counter() - start_time
+    record.update(vars(result))
+    record['passed'] = answer_contains_number(result.answer, expected_normalized)
+    return record
+
+def latency_percentiles(values) -> str:
+    values = [value for value in values if value]
+    if not values:
+        return "n/a"
+    p50, p95 = np.percentile(values, [50, 95])
+    return f"p50 {p50:.2f} s, p95 {p95:.2f} s"
+
+def summarize_results(records: list, elapsed: float):
+    passed = sum(record['passed'] for record in records)
+    prompt_tokens = sum(record.get('prompt_tokens', 0) for record in records)
+    completion_tokens = sum(record.get('completion_tokens', 0) for record in records)
 
     print("\n--- Test Summary ---")
-    print(f"Total tests: {len(tests)}")
+    print(f"Total tests: {len(records)}")
     print(f"Passed: {passed}")
-    print(f"Failed: {failed}")
+    print(f"Failed: {len(records) - passed}")
+    print(f"Errors: {sum(bool(record.get('error')) for record in records)}")
+    print(f"Accuracy: {passed / len(records) * 100 if records else 0:.1f}%")
+    print(f"Retrieval latency: {latency_percentiles(record.get('retrieval_seconds') for record in records)}")
+    print(f"LLM latency: {latency_percentiles(record.get('llm_seconds') for record in records)}")
+    print(f"Tokens: {prompt_tokens:,} prompt + {completion_tokens:,} completion = {prompt_tokens + completion_tokens:,}")
+    print(f"Wall time: {elapsed:.1f} s")
+    return passed / len(records) if records else 0.0
+
+def run_all_tests(workers: int = DEFAULT_WORKERS, output_file: str = DEFAULT_OUTPUT, limit: int = None):
+    tests = GOLD_TESTS[:limit] if limit else GOLD_TESTS
+    # Built once before the pool starts, so all workers share one vector store, embedding model and LLM client.
+    get_vector_store()
+    get_llm_client()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        records = list(executor.map(lambda test: query_and_validate(*test), tests))
+    elapsed = time.perf_counter() - start_time
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        for i, record in enumerate(records, 1):
+            f.write(json.dumps({'test': i, **record}, ensure_ascii=False) + "\n")
+            if not record['passed']:
+                print(f"Failed {i}/{len(records)}: {record['question']} (expected {record['expected']}"
+                      f"{', ' + record['error'] if record.get('error') else ''})")
+    print(f"Answers saved to {output_file}")
+
+    return summarize_results(records, elapsed)
+
+def chunk_text(text: str, chunking) -> list[str]:
+    if chunking == 'pages':
+        return [page for page in PAGE_SEPARATOR.split(text) if page.strip()]
+    size, overlap = chunking
+    return [text[start:start + size] for start in range(0, max(len(text) - overlap, 1), size - overlap)]
+
+@lru_cache(maxsize=None)
+def country_year_documents(country: str, year: int) -> tuple:
+    stored = get_vector_store().get(where={"$and": [{"country": {"$eq": country}}, {"year": {"$eq": str(year)}}]},
+                                    include=["documents"])
+    return tuple(stored["documents"])
+
+@lru_cache(maxsize=None)
+def chunk_index(country: str, year: int, config: str):
+    chunks = [chunk for text in country_year_documents(country, year) for chunk in chunk_text(text, CHUNKING_CONFIGS[config])]
+    if not chunks:
+        return [], np.zeros((0, 0))
+    embeddings = np.asarray(get_embedding_function().embed_documents(chunks), dtype=np.float32)
+    return chunks, embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def retrieve_chunks(question: str, country: str, year: int, config: str, k: int) -> list:
+    if CHUNKING_CONFIGS[config] is None:
+        return retrieve_year(get_vector_store(), question, country, year, k)
+    chunks, embeddings = chunk_index(country, year, config)
+    if not chunks:
+        return []
+    query = np.asarray(get_embedding_function().embed_query(question), dtype=np.float32)
+    scores = embeddings @ (query / np.linalg.norm(query))
+    top = np.argsort(-scores, kind='stable')[:k]
+    return [(Document(page_content=chunks[i]), float(scores[i])) for i in top]
+
+def context_contains_number(context: str, expected_normalized: str) -> bool:
+    # Checked line by line so digits of neighbouring numbers cannot be joined into a false hit.
+    return any(expected_normalized in normalize_number(line) for line in context.splitlines())
+
+def evaluate_retrieval(question: str, expected_response: str, config: str, ks: list) -> list:
+    parsed = parse_question(question)
+    if parsed is None:
+        return []
+    country, year = parsed
+    expected_normalized = normalize_number(expected_response)
+
+    # One search at the largest k; every smaller k is a prefix of its ranking.
+    start_time = time.perf_counter()
+    results = retrieve_chunks(question, country, year, config, max(ks))
+    retrieval_seconds = time.perf_counter() - start_time
+
+    records = []
+    for k in ks:
+        context = merge_contexts({year: results[:k]})
+        records.append({
+            'question': question,
+            'config': config,
+            'k': k,
+            'hit': context_contains_number(context, expected_normalized),
+            'context_tokens': estimate_tokens(context),
+            'retrieval_seconds': retrieval_seconds,
+        })
+    return records
+
+def run_retrieval_evaluation(workers: int = DEFAULT_WORKERS, output_file: str = DEFAULT_RETRIEVAL_OUTPUT, limit: int = None,
+                             ks: list = RETRIEVAL_KS, configs: list = None):
+    tests = GOLD_TESTS[:limit] if limit else GOLD_TESTS
+    configs = configs or list(CHUNKING_CONFIGS)
+    get_vector_store()
+    get_embedding_function()
+
+    records = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for config in configs:
+            # Each country/year is chunked and embedded once, before the questions that share it run in parallel.
+            if CHUNKING_CONFIGS[config] is not None:
+                for country, year in {parse_question(question) for question, _ in tests} - {None}:
+                    chunk_index(country, year, config)
+            for question_records in executor.map(lambda test: evaluate_retrieval(*test, config, ks), tests):
+                records.extend(question_records)
+
+    results = pd.DataFrame(records)
+    summary = results.groupby(['config', 'k'], sort=False).agg(
+        recall=('hit', 'mean'),
+        mean_context_tokens=('context_tokens', 'mean'),
+        max_context_tokens=('context_tokens', 'max'),
+        p50_retrieval_ms=('retrieval_seconds', lambda s: s.median() * 1000),
+    )
+    summary.to_csv(output_file)
+    with pd.option_context('display.float_format', '{:,.3f}'.format, 'display.max_columns', None, 'display.width', 200):
+        print(summary)
+    print(f"Recall table saved to {output_file}")
+    return summary
 
 if __name__ == "__main__":
-    run_all_tests()
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on the gold question set")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--output', help='JSONL answers file, or the recall CSV with --retrieval-only')
+    parser.add_argument('--limit', type=int, help='Only run the first N questions')
+    parser.add_argument('--min-accuracy', type=float, help='Exit with an error below this accuracy (0-1)')
+    parser.add_argument('--retrieval-only', action='store_true', help='Measure recall@k of the retrieved context without calling the LLM')
+    parser.add_argument('--k', type=int, nargs='+', default=RETRIEVAL_KS)
+    parser.add_argument('--chunking', nargs='+', choices=list(CHUNKING_CONFIGS), help='Chunking configurations to compare')
+    args = parser.parse_args()
+
+    if args.retrieval_only:
+        run_retrieval_evaluation(args.workers, args.output or DEFAULT_RETRIEVAL_OUTPUT, args.limit, sorted(args.k), args.chunking)
+        sys.exit(0)
+
+    accuracy = run_all_tests(args.workers, args.output or DEFAULT_OUTPUT, args.limit)
+    if args.min_accuracy is not None and accuracy < args.min_accuracy:
+        sys.exit(1)
@@ -0,0 +1,55 @@
+import argparse
+import json
+
+import pandas as pd
+
+from config import Configuration
+
+COUNT_COLUMNS = ['pages', 'documents', 'bytes', 'chars', 'retries']
+
+
+def load_trace(path: str) -> pd.DataFrame:
+    with open(path, "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return pd.DataFrame(events)
+
+
+def summarize_trace(events: pd.DataFrame, by: list = None) -> pd.DataFrame:
+    keys = ['name'] + (by or [])
+    events = events.reindex(columns=list(dict.fromkeys(list(events.columns) + keys + COUNT_COLUMNS + ['status'])))
+    events['seconds'] = events['duration_ms'] / 1000
+    events['errors'] = events['status'] == 'error'
+    grouped = events.groupby(keys, dropna=False)
+
+    summary = grouped.agg(
+        spans=('seconds', 'size'),
+        errors=('errors', 'sum'),
+        total_s=('seconds', 'sum'),
+        mean_ms=('duration_ms', 'mean'),
+        p50_ms=('duration_ms', 'median'),
+        p95_ms=('duration_ms', lambda d: d.quantile(0.95)),
+        **{column: (column, 'sum') for column in COUNT_COLUMNS},
+    )
+    summary[COUNT_COLUMNS] = summary[COUNT_COLUMNS].astype('int64')
+    summary['spans_per_s'] = summary['spans'] / summary['total_s']
+    # Throughput of every counted quantity over the time spent inside the spans that report it.
+    for column in ['pages', 'bytes', 'chars']:
+        summary[f'{column}_per_s'] = summary[column] / summary['total_s']
+    summary = summary.loc[:, (summary != 0).any(axis=0)]
+    return summary.sort_values('total_s', ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage throughput tables from a pipeline trace")
+    parser.add_argument('trace', nargs='?', default=Configuration.TRACE_PATH)
+    parser.add_argument('--by', nargs='+', help='Extra span attributes to group by (e.g. engine file)')
+    parser.add_argument('--csv', help='Also save the table to this file')
+    args = parser.parse_args()
+    if not args.trace:
+        parser.error("no trace file given and PIPELINE_TRACE_PATH is not set")
+
+    summary = summarize_trace(load_trace(args.trace), args.by)
+    with pd.option_context('display.max_columns', None, 'display.width', 200, 'display.float_format', '{:,.2f}'.format):
+        print(summary)
+    if args.csv:
+        summary.to_csv(args.csv)
@@ -1,5 +1,5 @@
 import os
-import re
+import time
 from pdf2image import convert_from_path
 import pytesseract
 from langchain_core.documents import Document
@@ -12,97 +12,198 @@ import base64
 import pdfplumber
 from src.utils.image_utils import preprocess_image, split_image_in_half, smart_split_page, is_image_blank
 from src.utils.text_utils import clean_ocr_text, stitch_numbers
+from src.utils.stage_timer import StageTimer, timed_stage, timed_page
+from src.utils.tracing import span
+from src.utils.usage_ledger import ledger, attribute
+from src.utils.table_parser import iter_markdown_tables
+from src.rag_core.table_cell_index import TableCellIndex
+from src.utils.page_catalog import PageCatalog
+from src.utils.page_archive import PageArchive, write_page_text
 
 class ScannedExtractorMistral:
     def __init__(self):
-        self.mistral_client = Mistral(api_key=Configuration.MISTRAL_API_KEY)
+        self.mistral_client = Mistral(api_key=Configuration.MISTRAL_API_KEY, server_url=Configuration.MISTRAL_SERVER_URL)
+        # Cleaning strips the table pipes, so the raw markdown of the last OCR call is kept for the table cell index.
+        self.last_markdown = ""
 
-    def extract_text_mistral(self, image: PILImage.Image, year: str, page_num: int = 0, filename: str = "") -> str:
-        header_text = pytesseract.image_to_string(
-            image.crop((0, 0, image.width, int(image.height * 0.12))), lang='eng', config='--psm 6')
+    def extract_text_mistral(self, image: PILImage.Image, year: str, page_num: int = 0, filename: str = "",
+                             timer: StageTimer = None) -> str:
+        with timed_stage(timer, "header_ocr"):
+            header_text = pytesseract.image_to_string(
+                image.crop((0, 0, image.width, int(image.height * 0.12))), lang='eng', config='--psm 6')
         
-        full_text = self._get_ocr_text(image)
+        full_text = self._get_ocr_text(image, timer)
         
         return f"{header_text}\n\n{full_text}"
 
-    def _get_ocr_text(self, image: PILImage.Image) -> str:
-        if is_image_blank(image):
-            return ""
+    def _get_ocr_text(self, image: PILImage.Image, timer: StageTimer = None) -> str:
+        self.last_markdown = ""
+        with timed_stage(timer, "main_ocr"):
+            if is_image_blank(image):
+                return ""
 
-        buffer = BytesIO()
-        image.save(buffer, format="JPEG")
-        base64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
-        
-        ocr_response = self.mistral_client.ocr.process(
-            model=Configuration.OCR_MODEL,
-            document={"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}
-        )
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG")
+            base64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+            
+            with span("mistral_ocr", model=Configuration.OCR_MODEL, bytes=buffer.tell()):
+                start_time = time.perf_counter()
+                try:
+                    ocr_response = self.mistral_client.ocr.process(
+                        model=Configuration.OCR_MODEL,
+                        document={"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}
+                    )
+                except Exception:
+                    ledger.record("mistral_ocr", Configuration.OCR_MODEL, time.perf_counter() - start_time, status="error")
+                    raise
+                usage_info = getattr(ocr_response, "usage_info", None)
+                ledger.record("mistral_ocr", Configuration.OCR_MODEL, time.perf_counter() - start_time,
+                              pages=getattr(usage_info, "pages_processed", None) or len(ocr_response.pages))
         
 
-        cleaned_text = clean_ocr_text(ocr_response.pages[0].markdown)
-        stitched_text = stitch_numbers(cleaned_text)
+        self.last_markdown = ocr_response.pages[0].markdown
+        with timed_stage(timer, "text_cleaning"):
+            cleaned_text = clean_ocr_text(self.last_markdown)
+            stitched_text = stitch_numbers(cleaned_text)
         return stitched_text
 
     @staticmethod
-    def is_text_pdf(filepath: str) -> bool:
+    def extract_tables_from_page(page) -> list:
+        tables = page.extract_tables() or []
+        return [[[str(cell or "").strip() for cell in row] for row in table if any(row)] for table in tables]
+
+    @staticmethod
+    def format_tables(tables: list) -> list:
+        return [f"[Table {j}]\n" + "\n".join([", ".join(row) for row in table]) for j, table in enumerate(tables)]
+
+    @staticmethod
+    def image_coverage(page) -> float:
+        # Share of the page covered by its largest image; archival scans are one page-sized image under an OCR layer.
+        page_area = float(page.width * page.height) or 1.0
+        covered = [(min(image["x1"], page.width) - max(image["x0"], 0)) * (min(image["bottom"], page.height) - max(image["top"], 0))
+                   for image in page.images]
+        return max([area for area in covered if area > 0] or [0.0]) / page_area
+
+    @staticmethod
+    def extract_text_layer(page) -> tuple[str, list]:
+        if ScannedExtractorMistral.image_coverage(page) >= Configuration.MAX_TEXT_LAYER_IMAGE_COVERAGE:
+            return "", []
+        text = page.extract_text() or ""
+        if sum(ch.isalnum() for ch in text) < Configuration.MIN_TEXT_LAYER_CHARS:
+            return "", []
+        tables = ScannedExtractorMistral.extract_tables_from_page(page)
+        return "\n\n".join([text] + ScannedExtractorMistral.format_tables(tables)), tables
+
+    @staticmethod
+    def read_text_layers(filepath: str) -> list[tuple[str, list]] | None:
+        # One entry per page: its text with its tables, and the tables' rows; ("", []) when the page has no
+        # usable text layer and needs OCR.
+        if not Configuration.TEXT_LAYER_FAST_PATH:
+            return None
         try:
             with pdfplumber.open(filepath) as pdf:
-                return any(page.extract_text() for page in pdf.pages[:2])
-        except:
-            return False
+                return [ScannedExtractorMistral.extract_text_layer(page) for page in pdf.pages]
+        except Exception:
+            return None
 
     @staticmethod
-    def extract_tables_from_page(page) -> list:
-        tables = page.extract_tables() or []
-        table_chunks = []
-        for j, table in enumerate(tables):
-            clean_table = [[str(cell or "").strip() for cell in row] for row in table if any(row)]
-            table_text = "\n".join([", ".join(row) for row in clean_table])
-            table_chunks.append(f"[Table {j}]\n{table_text}")
-        return table_chunks
+    def rasterize_pages(filepath: str, pages: list[int], dpi: int = 300):
+        # Consecutive pages are converted in one call; images are produced lazily so only one run is in memory at a time.
+        runs = []
+        for page in pages:
+            if runs and page == runs[-1][1] + 1:
+                runs[-1][1] = page
+            else:
+                runs.append([page, page])
+        for first, last in runs:
+            for offset, image in enumerate(convert_from_path(filepath, dpi=dpi, first_page=first + 1, last_page=last + 1)):
+                yield first + offset, image
 
-    def _process_single_pdf(self, filepath: str, filename: str) -> list[Document]:
-        documents = [] 
-        images = convert_from_path(filepath, dpi=300)
-        current_country = None
-        current_year = "Unknown"
-        num_pages = len(images)
-        for year in Configuration.YEARS:
-            if str(year) in filename:
-                current_year = str(year)
-                break
-        for i, image in enumerate(images):
-            preprocessed = preprocess_image(image, current_year)
-            
-            mistral_text = self.extract_text_mistral(preprocessed, current_year, i, filename)
-            current_country = CountryYearExtractor.extract_country(filename, i, mistral_text)
-            page_year = current_year
-            if not mistral_text.strip():
-                continue
-            header = f"Country: {current_country}\nYear: {page_year}\nPage: {i}\n\n"
-            full_text = header + mistral_text
-            
-            safe_name = re.sub(r"[^\w\-_.]", "_", f"{current_country}_{page_year}_page{i}.txt")
-            out_path = os.path.join(Configuration.OUTPUT_PATH, safe_name)
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(full_text)
-            
-            metadata = {
-                "country": current_country,
-                "year": page_year,
-                "source": filename,
-                "page": i,
-                "id": f"{filename}:{current_country}:{page_year}:page{i + 1}"
-            }
-            documents.append(Document(page_content=full_text, metadata=metadata))
-        documents = CountryYearExtractor.interpolate_unknown_countries(documents)
-        return documents
+    def _process_single_pdf(self, filepath: str, filename: str, timer: StageTimer = None,
+                            table_index: TableCellIndex = None, catalog: PageCatalog = None,
+                            archive: PageArchive = None) -> list[Document]:
+        with span("process_pdf", engine="mistral", file=filename, bytes=os.path.getsize(filepath)) as pdf_span:
+            documents = [] 
+            page_tables = {}
+            if catalog is not None:
+                catalog.delete_source(filename)
+            text_layers = self.read_text_layers(filepath)
+            if text_layers is None:
+                with timed_stage(timer, "rasterization"):
+                    images = convert_from_path(filepath, dpi=300)
+                text_layers = [("", [])] * len(images)
+                ocr_images = iter(enumerate(images))
+            else:
+                ocr_images = self.rasterize_pages(filepath, [i for i, (text, _) in enumerate(text_layers) if not text])
+            current_country = None
+            current_year = "Unknown"
+            num_pages = len(text_layers)
+            pdf_span.set(pages=num_pages, text_layer_pages=sum(bool(text) for text, _ in text_layers))
+            for year in Configuration.YEARS:
+                if str(year) in filename:
+                    current_year = str(year)
+                    break
+            for i, (text_layer, layer_tables) in enumerate(text_layers):
+                extraction = "text_layer" if text_layer else "ocr"
+                with span("page", engine="mistral", file=filename, page=i, extraction=extraction) as page_span, \
+                        timed_page(timer, engine="mistral", file=filename, page=i, extraction=extraction), \
+                        attribute(file=filename, page=i, year=current_year):
+                    if text_layer:
+                        with timed_stage(timer, "text_cleaning"):
+                            mistral_text = stitch_numbers(clean_ocr_text(text_layer))
+                        page_tables[i] = layer_tables
+                    else:
+                        with timed_stage(timer, "rasterization"):
+                            _, image = next(ocr_images)
+                        with timed_stage(timer, "preprocessing"):
+                            preprocessed = preprocess_image(image, current_year)
+                        
+                        mistral_text = self.extract_text_mistral(preprocessed, current_year, i, filename, timer)
+                        page_tables[i] = list(iter_markdown_tables(self.last_markdown))
+                    current_country = CountryYearExtractor.extract_country(filename, i, mistral_text)
+                    page_year = current_year
+                    page_span.set(country=current_country, chars=len(mistral_text))
+                if not mistral_text.strip():
+                    continue
+                header = f"Country: {current_country}\nYear: {page_year}\nPage: {i}\n\n"
+                full_text = header + mistral_text
+                
+                # Only the page text is stored; country, year and category live in the catalog row.
+                out_path = write_page_text(filename, i, mistral_text, current_country, page_year, archive)
+                if catalog is not None:
+                    catalog.upsert(filename, i, current_country, page_year, mistral_text, out_path,
+                                   CountryYearExtractor.extract_category(filename, i), "mistral", extraction)
+                
+                metadata = {
+                    "country": current_country,
+                    "year": page_year,
+                    "source": filename,
+                    "page": i,
+                    "extraction": extraction,
+                    "id": f"{filename}:{current_country}:{page_year}:page{i + 1}"
+                }
+                documents.append(Document(page_content=full_text, metadata=metadata))
+            documents = CountryYearExtractor.interpolate_unknown_countries(documents, catalog)
+            ledger.relabel(filename, {doc.metadata["page"]: {"country": doc.metadata["country"]} for doc in documents})
+            if archive is not None:
+                archive.relabel(filename, {doc.metadata["page"]: doc.metadata["country"] for doc in documents})
+                archive.delete_source(filename, keep=[doc.metadata["page"] for doc in documents])
+            if table_index is not None:
+                cells = 0
+                for doc in documents:
+                    page = doc.metadata["page"]
+                    cells += table_index.add_page(filename, page, doc.metadata["country"], doc.metadata["year"],
+                                                  page_tables.get(page, []))
+                pdf_span.set(table_cells=cells)
+            pdf_span.set(documents=len(documents))
+            return documents
 
-def process_all_pdfs():
+def process_all_pdfs(table_index: TableCellIndex = None, catalog: PageCatalog = None, archive: PageArchive = None):
     docs = []
     for fname in os.listdir(Configuration.DATA_PATH):
         if not fname.lower().endswith('.pdf'):
             continue
         path = os.path.join(Configuration.DATA_PATH, fname)
-        docs.extend(ScannedExtractorMistral()._process_single_pdf(path, fname))
+        docs.extend(ScannedExtractorMistral()._process_single_pdf(path, fname, table_index=table_index, catalog=catalog,
+                                                                archive=archive))
     return docs 
\ No newline at end of file
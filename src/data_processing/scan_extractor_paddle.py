@@ -11,43 +11,64 @@ from langchain_core.documents import Document
 
 from config import Configuration
 from src.utils.country_year_extractor import CountryYearExtractor
-from src.utils.image_utils import preprocess_image, split_image_in_half, smart_split_page
+from src.utils.image_utils import preprocess_image, split_image_in_half, smart_split_page, deskew_and_orient
+from src.utils.stage_timer import StageTimer, timed_stage, timed_page
+from src.utils.tracing import span, current_span
+from src.rag_core.table_cell_index import TableCellIndex
 
 
-def extract_text_paddle(ocr: PaddleOCR, pil_img, year: str, header_ratio: float = 0.12) -> str:
-    H = int(pil_img.height * header_ratio)
-    header_crop = pil_img.crop((0, 0, pil_img.width, H))
-    header_np = np.array(header_crop)
-    header_text = _ocr_np(ocr, header_np).strip()
+def extract_text_paddle(ocr: PaddleOCR, pil_img, year: str, header_ratio: float = 0.12, timer: StageTimer = None,
+                        layouts: list = None, orientation_prepass: bool = Configuration.PAGE_ORIENTATION_PREPASS) -> str:
+    if orientation_prepass:
+        with timed_stage(timer, "orientation"):
+            pil_img, rotation, skew = deskew_and_orient(pil_img)
+        current_span().set(rotation=rotation, skew=round(skew, 2))
 
-    if year == '1930':
-        left_img, right_img = split_image_in_half(pil_img)
-    else:
-        left_img, right_img = smart_split_page(pil_img)
+    with timed_stage(timer, "header_ocr"):
+        H = int(pil_img.height * header_ratio)
+        header_crop = pil_img.crop((0, 0, pil_img.width, H))
+        header_np = np.array(header_crop)
+        header_text = _ocr_np(ocr, header_np, timer).strip()
+
+    with timed_stage(timer, "column_splitting"):
+        if year == '1930':
+            left_img, right_img = split_image_in_half(pil_img)
+        else:
+            left_img, right_img = smart_split_page(pil_img)
 
-    left_np = np.array(left_img)
-    right_np = np.array(right_img)
+        left_np = np.array(left_img)
+        right_np = np.array(right_img)
 
-    left_text = _ocr_np(ocr, left_np).strip()
-    right_text = _ocr_np(ocr, right_np).strip()
+    with timed_stage(timer, "main_ocr"):
+        left_text = _ocr_np(ocr, left_np, timer, layouts).strip()
+        right_text = _ocr_np(ocr, right_np, timer, layouts).strip()
 
     parts = [t for t in [header_text, left_text, right_text] if t]
     return "\n\n".join(parts).strip()
 
-def _ocr_np(ocr: PaddleOCR, img_np: np.ndarray) -> str:
-    processed = preprocess_for_ocr(img_np)
+def _ocr_np(ocr: PaddleOCR, img_np: np.ndarray, timer: StageTimer = None, layouts: list = None) -> str:
+    with timed_stage(timer, "preprocessing"):
+        processed = preprocess_for_ocr(img_np)
     try:
         pred = ocr.predict(processed)
-        txts = collect_texts(pred)
-        joined = "\n".join(txts).strip()
+        with timed_stage(timer, "text_cleaning"):
+            txts = collect_texts(pred)
+            joined = "\n".join(txts).strip()
         if joined:
+            if layouts is not None:
+                layouts.append(collect_boxes(pred))
             return joined
     except Exception:
         pass
+    # The page span counts how often the predict() result had to be redone with the legacy ocr() call.
+    current_span().add("retries")
     try:
-        res = ocr.ocr(processed, use_textline_orientation=True)
-        txts = collect_texts(res)
-        return "\n".join(txts).strip()
+        res = ocr.ocr(processed, use_textline_orientation=Configuration.PADDLE_TEXTLINE_ORIENTATION)
+        if layouts is not None:
+            layouts.append(collect_boxes(res))
+        with timed_stage(timer, "text_cleaning"):
+            txts = collect_texts(res)
+            return "\n".join(txts).strip()
     except Exception:
         return ""
 
@@ -61,6 +82,44 @@ def preprocess_for_ocr(img: np.ndarray) -> np.ndarray:
     rgb = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
     return rgb
 
+def box_bounds(points) -> tuple:
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1 and points.size == 4:
+        return tuple(points)
+    points = points.reshape(-1, 2)
+    return points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()
+
+def collect_boxes(result_obj) -> List[tuple]:
+    # Word boxes as (x0, y0, x1, y1, text), from predict() results (rec_texts/rec_boxes) or legacy ocr() lines.
+    boxes: List[tuple] = []
+    def walk(x):
+        if x is None or isinstance(x, (str, np.ndarray)):
+            return
+        if isinstance(x, dict):
+            texts = x.get("rec_texts")
+            shapes = x.get("rec_boxes")
+            if shapes is None:
+                shapes = x.get("rec_polys")
+            if texts is None or shapes is None:
+                for value in x.values():
+                    walk(value)
+                return
+            for text, points in zip(texts, shapes):
+                if isinstance(text, str) and text.strip():
+                    boxes.append((*box_bounds(points), text.strip()))
+            return
+        if isinstance(x, (list, tuple)):
+            if len(x) == 2 and isinstance(x[1], (list, tuple)) and x[1] and isinstance(x[1][0], str):
+                try:
+                    boxes.append((*box_bounds(x[0]), x[1][0].strip()))
+                    return
+                except (TypeError, ValueError):
+                    pass
+            for item in x:
+                walk(item)
+    walk(result_obj)
+    return boxes
+
 def collect_texts(result_obj) -> List[str]:
     texts: List[str] = []
     def has_alnum(s: str) -> bool:
@@ -98,39 +157,57 @@ def collect_texts(result_obj) -> List[str]:
             uniq.append(t)
     return uniq
 
-def process_pdf_paddle(filepath: str, filename: str, ocr: PaddleOCR, dpi: int = 200) -> list[Document]:
-    documents = []
-    try:
-        images = convert_from_path(filepath, dpi=dpi)
-    except Exception as e:
-        print(f"Error converting PDF {filename}: {e}")
-        return []
-
-    current_year = "Unknown"
-    for year in Configuration.YEARS:
-        if str(year) in filename:
-            current_year = str(year)
-            break
-
-    for page_idx, pil_img in enumerate(images):
-        combo_text = extract_text_paddle(ocr, pil_img, current_year)
-
-        if not combo_text.strip():
-            continue
-        
-        current_country = CountryYearExtractor.extract_country(filename, page_idx, combo_text)
-        
-        header = f"Country: {current_country}\nYear: {current_year}\nPage: {page_idx}\n\n"
-        full_text = header + combo_text
-        
-        metadata = {
-            "country": current_country,
-            "year": current_year,
-            "source": filename,
-            "page": page_idx,
-            "id": f"{filename}:{current_country}:{current_year}:page{page_idx + 1}"
-        }
-        documents.append(Document(page_content=full_text, metadata=metadata))
-        
-    documents = CountryYearExtractor.interpolate_unknown_countries(documents)
-    return documents
+def process_pdf_paddle(filepath: str, filename: str, ocr: PaddleOCR, dpi: int = 200, timer: StageTimer = None,
+                       table_index: TableCellIndex = None) -> list[Document]:
+    with span("process_pdf", engine="paddle", file=filename, bytes=os.path.getsize(filepath), dpi=dpi) as pdf_span:
+        documents = []
+        page_layouts = {}
+        try:
+            with timed_stage(timer, "rasterization"):
+                images = convert_from_path(filepath, dpi=dpi)
+        except Exception as e:
+            print(f"Error converting PDF {filename}: {e}")
+            pdf_span.set(error=f"{type(e).__name__}: {e}")
+            return []
+
+        current_year = "Unknown"
+        for year in Configuration.YEARS:
+            if str(year) in filename:
+                current_year = str(year)
+                break
+        pdf_span.set(pages=len(images))
+
+        for page_idx, pil_img in enumerate(images):
+            with span("page", engine="paddle", file=filename, page=page_idx) as page_span, \
+                    timed_page(timer, engine="paddle", file=filename, page=page_idx):
+                page_layouts[page_idx] = []
+                combo_text = extract_text_paddle(ocr, pil_img, current_year, timer=timer, layouts=page_layouts[page_idx])
+                page_span.set(chars=len(combo_text))
+
+            if not combo_text.strip():
+                continue
+            
+            current_country = CountryYearExtractor.extract_country(filename, page_idx, combo_text)
+            
+            header = f"Country: {current_country}\nYear: {current_year}\nPage: {page_idx}\n\n"
+            full_text = header + combo_text
+            
+            metadata = {
+                "country": current_country,
+                "year": current_year,
+                "source": filename,
+                "page": page_idx,
+                "id": f"{filename}:{current_country}:{current_year}:page{page_idx + 1}"
+            }
+            documents.append(Document(page_content=full_text, metadata=metadata))
+            
+        documents = CountryYearExtractor.interpolate_unknown_countries(documents)
+        if table_index is not None:
+            cells = 0
+            for doc in documents:
+                page = doc.metadata["page"]
+                cells += table_index.add_layout(filename, page, doc.metadata["country"], doc.metadata["year"],
+                                                page_layouts.get(page, []))
+            pdf_span.set(table_cells=cells)
+        pdf_span.set(documents=len(documents))
+        return documents
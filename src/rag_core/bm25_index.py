@@ -0,0 +1,110 @@
+import math
+import os
+import re
+from collections import Counter
+from langchain_core.documents import Document
+from config import Configuration
+from src.utils.snapshot import load_snapshot, save_snapshot
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def partition_key(country, year) -> tuple[str, str]:
+    return str(country), str(year)
+
+
+class BM25Partition:
+
+    def __init__(self):
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.lengths = []
+        self.total_length = 0
+        self.postings = {}
+
+    def add(self, doc_id: str, text: str, metadata: dict):
+        position = len(self.ids)
+        terms = Counter(tokenize(text))
+        self.ids.append(doc_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.lengths.append(sum(terms.values()))
+        self.total_length += self.lengths[-1]
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[position] = frequency
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        n = len(self.ids)
+        if n == 0:
+            return []
+        average_length = self.total_length / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings.items():
+                norm = K1 * (1 - B + B * self.lengths[position] / average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+class BM25Index:
+
+    def __init__(self, path: str = Configuration.BM25_INDEX_PATH):
+        self.path = path
+        self.partitions = {}
+        self.ids = set()
+
+    def add_documents(self, documents: list[Document]) -> int:
+        added = 0
+        for doc in documents:
+            doc_id = doc.metadata["id"]
+            if doc_id in self.ids:
+                continue
+            key = partition_key(doc.metadata.get("country"), doc.metadata.get("year"))
+            self.partitions.setdefault(key, BM25Partition()).add(doc_id, doc.page_content, dict(doc.metadata))
+            self.ids.add(doc_id)
+            added += 1
+        return added
+
+    def search(self, query: str, country, year, k: int = Configuration.RETRIEVAL_K) -> list[tuple[Document, float]]:
+        partition = self.partitions.get(partition_key(country, year))
+        if partition is None:
+            return []
+        return [(Document(page_content=partition.texts[position], metadata=partition.metadatas[position]), score)
+                for position, score in partition.search(query, k)]
+
+    def save(self):
+        save_snapshot(self.path, self.partitions)
+
+    @classmethod
+    def load(cls, path: str = Configuration.BM25_INDEX_PATH) -> "BM25Index":
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        partitions = load_snapshot(path, "BM25 index")
+        index.partitions = partitions
+        index.ids = {doc_id for partition in partitions.values() for doc_id in partition.ids}
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[tuple[Document, float]]], k: int, rrf_k: int = Configuration.RRF_K) -> list[tuple[Document, float]]:
+    # Only ranks are fused, so cosine distances and BM25 scores never have to be put on one scale.
+    fused = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, 1):
+            doc_id = doc.metadata.get("id", doc.page_content)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(doc_id, doc)
+    ranked = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return [(documents[doc_id], score) for doc_id, score in ranked]
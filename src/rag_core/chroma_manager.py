@@ -2,6 +2,8 @@ import os
 import shutil
 from langchain_core.documents import Document
 from config import Configuration
+from src.utils.tracing import span
+from src.rag_core.bm25_index import BM25Index
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 
@@ -11,16 +13,34 @@ class ChromaManager:
             persist_directory=Configuration.CHROMA_PATH,
             embedding_function=HuggingFaceEmbeddings(model_name=Configuration.EMBEDDING_MODEL)
         )
+        self.bm25 = BM25Index.load()
 
     def add_documents(self, documents: list[Document]):
-        existing = self.db.get(include=[])
-        existing_ids = set(existing["ids"])
-        new_docs = [doc for doc in documents if doc.metadata["id"] not in existing_ids]
-        new_ids = [doc.metadata["id"] for doc in new_docs]
-        if new_docs:
-            self.db.add_documents(new_docs, ids=new_ids)
+        with span("chroma_add_documents", documents=len(documents)) as add_span:
+            existing = self.db.get(include=[])
+            existing_ids = set(existing["ids"])
+            new_docs = [doc for doc in documents if doc.metadata["id"] not in existing_ids]
+            new_ids = [doc.metadata["id"] for doc in new_docs]
+            add_span.set(added=len(new_docs), chars=sum(len(doc.page_content) for doc in new_docs))
+            if new_docs:
+                self.db.add_documents(new_docs, ids=new_ids)
+            self.sync_bm25(existing_ids, new_docs)
+
+    def sync_bm25(self, existing_ids: set, new_docs: list[Document]):
+        # Documents that were in Chroma before the BM25 index existed are indexed from the store once.
+        missing_ids = list(existing_ids - self.bm25.ids)
+        added = 0
+        if missing_ids:
+            stored = self.db.get(ids=missing_ids, include=["documents", "metadatas"])
+            added += self.bm25.add_documents([Document(page_content=text, metadata={**metadata, "id": doc_id})
+                                              for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])])
+        added += self.bm25.add_documents(new_docs)
+        if added:
+            self.bm25.save()
 
     @staticmethod
     def clear_database():
         if os.path.exists(Configuration.CHROMA_PATH):
-            shutil.rmtree(Configuration.CHROMA_PATH)
\ No newline at end of file
+            shutil.rmtree(Configuration.CHROMA_PATH)
+        if os.path.exists(Configuration.BM25_INDEX_PATH):
+            os.remove(Configuration.BM25_INDEX_PATH)
\ No newline at end of file
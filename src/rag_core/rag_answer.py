@@ -1,13 +1,20 @@
 import argparse
 import os
-import re
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from together import Together
 from config import Configuration
+from src.utils.table_parser import parse_markdown_table
+from src.rag_core.bm25_index import BM25Index, reciprocal_rank_fusion
+from src.utils.tracing import span
+from src.utils.usage_ledger import ledger
 
 
 load_dotenv()
@@ -21,6 +28,7 @@ return **all available values** for each **country separately**.
 
 If the question asks about data across multiple years, note that different years may have different parameters or indicators available. 
 Include all available data for each year, even if the parameters differ between years.
+Each page in the context starts with its Country and Year, so take the year of every value from the page it comes from.
 
 Please format your answer as a Markdown table with the following columns:
 | Country | Year | Indicator | Value | Unit |
@@ -34,75 +42,154 @@ Group all indicators by country - do not mix countries and do not create extra c
 Answer the question based on the above context: {question}
 """
 
+@lru_cache(maxsize=1)
 def get_embedding_function():
     return HuggingFaceEmbeddings(model_name=Configuration.EMBEDDING_MODEL)
 
-def query_rag(query_text: str, country: str, year: int, save_csv: bool = True) -> str:
-    embedding_function = get_embedding_function()
-    db = Chroma(
+@lru_cache(maxsize=1)
+def get_vector_store():
+    return Chroma(
         persist_directory=Configuration.CHROMA_PATH,
-        embedding_function=embedding_function
+        embedding_function=get_embedding_function()
     )
 
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+@lru_cache(maxsize=1)
+def get_bm25_index():
+    return BM25Index.load()
+
+def retrieve_year(db, query_text: str, country: str, year, k: int = Configuration.RETRIEVAL_K) -> list:
     filter_criteria = {
         "$and": [
             {"country": {"$eq": country}},
             {"year": {"$eq": str(year)}}
         ]
     }
-    
-    results = db.similarity_search_with_score(query_text, k=5, filter=filter_criteria)
-    if not results:
-        print(f"No matching documents found for country '{country}' and year '{year}'.")
+    if not Configuration.HYBRID_RETRIEVAL:
+        return db.similarity_search_with_score(query_text, k=k, filter=filter_criteria)
+
+    candidates = max(k, Configuration.FUSION_CANDIDATES)
+    vector_results = db.similarity_search_with_score(query_text, k=candidates, filter=filter_criteria)
+    lexical_results = get_bm25_index().search(query_text, country, year, candidates)
+    return reciprocal_rank_fusion([vector_results, lexical_results], k)
+
+def retrieve_years(db, query_text: str, country: str, years: list, k: int = Configuration.RETRIEVAL_K) -> dict:
+    if len(years) == 1:
+        return {years[0]: retrieve_year(db, query_text, country, years[0], k)}
+    with ThreadPoolExecutor(max_workers=len(years)) as executor:
+        futures = {year: executor.submit(retrieve_year, db, query_text, country, year, k) for year in years}
+        return {year: future.result() for year, future in futures.items()}
+
+def merge_contexts(results_by_year: dict, token_budget: int = Configuration.CONTEXT_TOKEN_BUDGET) -> str:
+    # Every year gets an equal share of the budget; whatever a year leaves unused carries over to the next one.
+    share = token_budget // max(len(results_by_year), 1)
+    carry = 0
+    sections = []
+    for year, results in results_by_year.items():
+        remaining = share + carry
+        for doc, _ in results:
+            if remaining <= 0:
+                break
+            text = doc.page_content[:remaining * 4]
+            remaining -= estimate_tokens(text)
+            sections.append(text)
+        carry = max(remaining, 0)
+    return "\n\n---\n\n".join(sections)
+
+@dataclass
+class RAGResult:
+    answer: str = ""
+    documents: int = 0
+    context_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retrieval_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    error: Optional[str] = None
+
+@lru_cache(maxsize=1)
+def get_llm_client():
+    return Together(api_key=Configuration.TOGETHER_API_KEY, base_url=Configuration.TOGETHER_BASE_URL)
+
+def answer_query(query_text: str, country: str, year, k: int = Configuration.RETRIEVAL_K) -> RAGResult:
+    years = list(year) if isinstance(year, (list, tuple)) else [year]
+    result = RAGResult()
+    with span("query_rag", country=country, years=years) as query_span:
+        db = get_vector_store()
+
+        start_time = time.perf_counter()
+        with span("retrieve", country=country, years=years) as retrieve_span:
+            results_by_year = retrieve_years(db, query_text, country, years, k)
+            results_by_year = {y: results for y, results in results_by_year.items() if results}
+            result.documents = sum(len(results) for results in results_by_year.values())
+            retrieve_span.set(documents=result.documents)
+        result.retrieval_seconds = time.perf_counter() - start_time
+        if not results_by_year:
+            query_span.set(answered=False)
+            return result
+
+        context_text = merge_contexts(results_by_year)
+        prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+        prompt = prompt_template.format(context=context_text, question=query_text)
+        result.context_tokens = estimate_tokens(context_text)
+        query_span.set(context_chars=len(context_text), prompt_chars=len(prompt))
+
+        start_time = time.perf_counter()
+        try:
+            with span("llm_completion", model=Configuration.LLM_MODEL):
+                response = get_llm_client().chat.completions.create(
+                    model=Configuration.LLM_MODEL,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=Configuration.LLM_MAX_TOKENS * len(years),
+                    temperature=0.2,
+                    top_p=0.7
+                )
+            result.answer = response.choices[0].message.content.strip()
+        except Exception as e:
+            result.llm_seconds = time.perf_counter() - start_time
+            result.error = f"{type(e).__name__}: {e}"
+            ledger.record("together_llm", Configuration.LLM_MODEL, result.llm_seconds, status="error",
+                          country=country, year=",".join(str(y) for y in years))
+            query_span.set(answered=False, error=result.error)
+            return result
+        result.llm_seconds = time.perf_counter() - start_time
+
+        usage = getattr(response, "usage", None)
+        result.prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        result.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        ledger.record("together_llm", Configuration.LLM_MODEL, result.llm_seconds, prompt_tokens=result.prompt_tokens,
+                      completion_tokens=result.completion_tokens, country=country, year=",".join(str(y) for y in years))
+        query_span.set(answered=True, answer_chars=len(result.answer))
+    return result
+
+def query_rag(query_text: str, country: str, year, save_csv: bool = True) -> str:
+    years = list(year) if isinstance(year, (list, tuple)) else [year]
+    result = answer_query(query_text, country, years)
+    if result.documents == 0:
+        print(f"No matching documents found for country '{country}' and year(s) {', '.join(str(y) for y in years)}.")
         return ""
-
-    context_text = "\\n\\n---\\n\\n".join([doc.page_content for doc, _ in results])
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
-
-    
-    client = Together(api_key=Configuration.TOGETHER_API_KEY)  
-    try:
-        response = client.chat.completions.create(
-            model=Configuration.LLM_MODEL,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1024,
-            temperature=0.2,
-            top_p=0.7
-        )
-        answer = response.choices[0].message.content.strip()
-        print("\\nAnswer:\\n", answer)
-    except Exception as e:
-        print("Error from Together API:", e)
+    if result.error:
+        print("Error from Together API:", result.error)
         return ""
+    print("\nAnswer:\n", result.answer)
 
     if save_csv:
-        table_lines = [line for line in answer.splitlines() if "|" in line]
-        table_lines = [line for line in table_lines if not re.match(r"^\\s*\\|?\\s*-+\\s*\\|", line)]
-
-        if len(table_lines) >= 2:
-            headers = [cell.strip() for cell in table_lines[0].split("|") if cell.strip()]
-            rows = []
-            for row_line in table_lines[1:]:
-                row = [cell.strip() for cell in row_line.split("|") if cell.strip()]
-                while len(row) < len(headers):
-                    row.append("")
-                rows.append(row)
-
-            df = pd.DataFrame(rows, columns=headers)
+        df = parse_markdown_table(result.answer)
+        if df is not None:
             df.to_csv("output.csv", index=False)
 
-    return answer
+    return result.answer
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("query_text", type=str, help="The query text.")
     args = parser.parse_args()
  
-    embedding_function = get_embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+    db = get_vector_store()
     total_chunks = len(db.get()["ids"])
 
 
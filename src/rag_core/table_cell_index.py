@@ -0,0 +1,200 @@
+import os
+import re
+from config import Configuration
+from src.utils.snapshot import load_snapshot, save_snapshot
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+NUMBER_PATTERN = re.compile(r"^[-–]?\d[\d\s,.]*$")
+INDICATOR_SEPARATOR = re.compile(r"\s+-\s*|\s*-\s+")
+UNIT_PATTERN = re.compile(r"\(([^)]*)\)")
+# Words a column header may leave out and still be the asked-for measure ("Number of holdings reporting" vs "Holdings reporting").
+MEASURE_STOPWORDS = {"of", "the", "and", "in", "number"}
+# Bracketed words that qualify the measure rather than give its unit ("Area (total)").
+QUALIFIER_WORDS = {"total"}
+
+
+def label_tokens(text: str) -> list[str]:
+    tokens = TOKEN_PATTERN.findall(str(text).lower())
+    # Row numbering ("1. Wheat", "12 Wheat") is not part of the label.
+    while tokens and tokens[0].isdigit():
+        tokens.pop(0)
+    return tokens
+
+
+def normalize_label(text: str) -> str:
+    return " ".join(label_tokens(text))
+
+
+def parse_number(text: str):
+    text = str(text).strip()
+    if not NUMBER_PATTERN.match(text):
+        return None
+    try:
+        return float(re.sub(r"[,\s]", "", text).replace("–", "-"))
+    except ValueError:
+        return None
+
+
+def header_unit(column: str) -> str:
+    units = [unit.strip() for unit in UNIT_PATTERN.findall(column)
+             if unit.strip().lower() not in MEASURE_STOPWORDS | QUALIFIER_WORDS]
+    return units[-1] if units else ""
+
+
+def table_cells(table: list[list[str]]):
+    # First row is the header, first column the row label; every numeric cell below becomes one (label, column, value).
+    if len(table) < 2:
+        return
+    header = table[0]
+    for row in table[1:]:
+        label = row[0] if row else ""
+        if not normalize_label(label) or parse_number(label) is not None:
+            continue
+        for column, cell in zip(header[1:], row[1:]):
+            value = parse_number(cell)
+            if value is not None and normalize_label(column):
+                yield label.strip(), column.strip(), value, cell.strip()
+
+
+def merge_split_numbers(line: list[tuple]) -> list[tuple]:
+    # OCR often returns "203 045" as two boxes; a 3-digit box right next to a number continues it.
+    merged = []
+    for box in line:
+        if merged:
+            x0, y0, x1, y1, text = merged[-1]
+            gap = box[0] - x1
+            if (parse_number(text) is not None and re.fullmatch(r"\d{3}", box[4].strip())
+                    and gap <= max(box[3] - box[1], y1 - y0) * 0.6):
+                merged[-1] = (x0, min(y0, box[1]), box[2], max(y1, box[3]), f"{text} {box[4].strip()}")
+                continue
+        merged.append(box)
+    return merged
+
+
+def layout_lines(boxes: list[tuple]) -> list[list[tuple]]:
+    boxes = [box for box in boxes if str(box[4]).strip()]
+    if not boxes:
+        return []
+    heights = sorted(box[3] - box[1] for box in boxes)
+    tolerance = max(heights[len(heights) // 2] * 0.6, 1.0)
+    lines = []
+    for box in sorted(boxes, key=lambda b: (b[1] + b[3]) / 2):
+        center = (box[1] + box[3]) / 2
+        if lines and center - lines[-1][0] <= tolerance:
+            lines[-1][1].append(box)
+        else:
+            lines.append([center, [box]])
+    return [merge_split_numbers(sorted(line, key=lambda b: b[0])) for _, line in lines]
+
+
+def layout_tables(boxes: list[tuple]) -> list[list[list[str]]]:
+    # Rebuilds tables from OCR word boxes (x0, y0, x1, y1, text): boxes on one baseline form a line, a line of
+    # two or more text boxes starts a table, and each number below it goes to the header cell nearest in x.
+    tables = []
+    header = None
+    for line in layout_lines(boxes):
+        numeric = [parse_number(box[4]) is not None for box in line]
+        if not any(numeric):
+            if len(line) >= 2:
+                header = line
+                tables.append([[box[4].strip() for box in header]])
+            continue
+        if header is None:
+            continue
+        first_number = numeric.index(True)
+        label = " ".join(box[4].strip() for box in line[:first_number])
+        row = [label] + [""] * (len(header) - 1)
+        centers = [(box[0] + box[2]) / 2 for box in header]
+        for box, is_number in zip(line[first_number:], numeric[first_number:]):
+            if not is_number:
+                continue
+            center = (box[0] + box[2]) / 2
+            column = min(range(len(centers)), key=lambda c: abs(centers[c] - center))
+            if column > 0 and not row[column]:
+                row[column] = box[4].strip()
+        tables[-1].append(row)
+    return [table for table in tables if len(table) > 1]
+
+
+def split_indicator(indicator: str) -> tuple[str, list[str]]:
+    parts = INDICATOR_SEPARATOR.split(indicator.strip(), maxsplit=1)
+    if len(parts) < 2:
+        return "", []
+    return parts[0].strip(), [measure.strip() for measure in parts[1].split(",") if measure.strip()]
+
+
+def measure_matches(measure: str, column: str) -> bool:
+    # Every word of the measure, qualifiers included, must be in the header, and the header may only add its unit:
+    # "Area (total)" matches "Area (total) (hectares)" but neither "Area irrigated" nor "Total area harvested".
+    wanted = set(label_tokens(measure)) - MEASURE_STOPWORDS
+    header = set(label_tokens(column)) - MEASURE_STOPWORDS
+    return bool(wanted) and wanted <= header and header - set(label_tokens(header_unit(column))) <= wanted
+
+
+class TableCellIndex:
+
+    def __init__(self, path: str = Configuration.TABLE_CELL_INDEX_PATH):
+        self.path = path
+        self.pages = {}
+        self.partitions = {}
+
+    def add_page(self, source: str, page: int, country, year, tables: list[list[list[str]]]) -> int:
+        # Re-processing a page replaces its cells, so reruns never leave two copies to make a lookup ambiguous.
+        key = (source, page)
+        previous = self.pages.pop(key, None)
+        if previous is not None:
+            self.partitions.get((previous["country"], previous["year"]), set()).discard(key)
+        cells = [{"row": normalize_label(label), "label": label, "column": column, "value": value, "text": text}
+                 for table in tables for label, column, value, text in table_cells(table)]
+        if not cells:
+            return 0
+        country, year = str(country), str(year)
+        self.pages[key] = {"country": country, "year": year, "cells": cells}
+        self.partitions.setdefault((country, year), set()).add(key)
+        return len(cells)
+
+    def add_layout(self, source: str, page: int, country, year, layouts: list[list[tuple]]) -> int:
+        return self.add_page(source, page, country, year, [table for boxes in layouts for table in layout_tables(boxes)])
+
+    def lookup(self, country, year, row_label: str, measure: str) -> list[dict]:
+        row = normalize_label(row_label)
+        matches = []
+        for key in sorted(self.partitions.get((str(country), str(year)), ())):
+            for cell in self.pages[key]["cells"]:
+                if cell["row"] == row and measure_matches(measure, cell["column"]):
+                    matches.append({**cell, "source": key[0], "page": key[1]})
+        return matches
+
+    def answer(self, country, years: list, indicator: str) -> list[dict] | None:
+        # Only answers when every year and measure of the indicator resolves to exactly one number; anything
+        # missing or conflicting is left to the LLM, which is asked for the whole indicator at once anyway.
+        subject, measures = split_indicator(indicator)
+        if not subject:
+            return None
+        rows = []
+        for year in years:
+            for measure in measures:
+                matches = self.lookup(country, year, subject, measure)
+                if len({cell["value"] for cell in matches}) != 1:
+                    return None
+                cell = matches[0]
+                rows.append({"Country": country, "Year": str(year), "Indicator": f"{subject} - {measure}",
+                             "Value": cell["text"], "Unit": header_unit(cell["column"])})
+        return rows or None
+
+    def __len__(self):
+        return sum(len(page["cells"]) for page in self.pages.values())
+
+    def save(self):
+        save_snapshot(self.path, self.pages)
+
+    @classmethod
+    def load(cls, path: str = Configuration.TABLE_CELL_INDEX_PATH) -> "TableCellIndex":
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        pages = load_snapshot(path, "table cell index")
+        index.pages = pages
+        for key, page in pages.items():
+            index.partitions.setdefault((page["country"], page["year"]), set()).add(key)
+        return index
@@ -3,6 +3,7 @@ import re
 from typing import List, Tuple
 from langchain_core.documents import Document
 from config import Configuration
+from src.utils.tracing import span
 import collections
 
 class ChunkManager:
@@ -44,6 +45,12 @@ class ChunkManager:
         return saved_files
 
 def aggregate_country_chunks(documents: list[Document]) -> list[Document]:
+    with span("aggregate_country_chunks", documents=len(documents)) as aggregation_span:
+        aggregated_docs = _aggregate_country_chunks(documents)
+        aggregation_span.set(aggregated=len(aggregated_docs), chars=sum(len(doc.page_content) for doc in aggregated_docs))
+        return aggregated_docs
+
+def _aggregate_country_chunks(documents: list[Document]) -> list[Document]:
 
     country_docs = collections.defaultdict(list)
     for doc in documents:
@@ -73,6 +80,9 @@ def aggregate_country_chunks(documents: list[Document]) -> list[Document]:
             "source": source,
             "id": f"{source}:{country}:{year}"
         }
+        extraction = sorted({doc.metadata["extraction"] for doc in docs if "extraction" in doc.metadata})
+        if extraction:
+            metadata["extraction"] = ",".join(extraction)
         agg_doc = Document(page_content=full_content, metadata=metadata)
         aggregated_docs.append(agg_doc)
             
@@ -1,8 +1,8 @@
-import os
-import re
 from rapidfuzz import fuzz
 from config import Configuration
 from langchain_core.documents import Document
+from src.utils.tracing import span
+from src.utils.page_catalog import PageCatalog
 
 MANUAL_COUNTRY_MAPPING = {
     
@@ -56,7 +56,15 @@ class CountryYearExtractor:
         return "Unknown"
 
     @staticmethod
-    def interpolate_unknown_countries(documents: list[Document]) -> list[Document]:
+    def interpolate_unknown_countries(documents: list[Document], catalog: PageCatalog = None) -> list[Document]:
+        with span("interpolate_unknown_countries", documents=len(documents)) as interpolation_span:
+            documents = CountryYearExtractor._interpolate_unknown_countries(documents, catalog)
+            interpolation_span.set(unknown=sum(doc.metadata["country"] == "Unknown" for doc in documents))
+            return documents
+
+    @staticmethod
+    def _interpolate_unknown_countries(documents: list[Document], catalog: PageCatalog = None) -> list[Document]:
+        reassigned = {}
         n = len(documents)
         countries = [doc.metadata["country"] for doc in documents]
         i = 0
@@ -70,7 +78,6 @@ class CountryYearExtractor:
                 country_after = countries[end + 1] if end + 1 < n else None
                 if country_before and country_after and country_before == country_after:
                     for j in range(start, end + 1):
-                        old_country = documents[j].metadata["country"]
                         documents[j].metadata["country"] = country_before
                         page_year = documents[j].metadata["year"]
                         page_num = documents[j].metadata["page"]
@@ -80,15 +87,10 @@ class CountryYearExtractor:
                         body = old_text.split("\n\n", 1)[-1] if "\n\n" in old_text else old_text
                         new_full_text = header + body
                         documents[j].page_content = new_full_text
-                        filename = documents[j].metadata["source"]
-                        safe_name = re.sub(r"[^\w\-_.]", "_", f"{page_category}_{country_before}_{page_year}_page{page_num}.txt")
-                        out_path = os.path.join(Configuration.OUTPUT_PATH, safe_name)
-                        old_safe_name = re.sub(r"[^\w\-_.]", "_", f"{page_category}_{old_country}_{page_year}_page{page_num}.txt")
-                        old_out_path = os.path.join(Configuration.OUTPUT_PATH, old_safe_name)
-                        if old_safe_name != safe_name and os.path.exists(old_out_path):
-                            os.remove(old_out_path)
-                        with open(out_path, "w", encoding="utf-8") as f:
-                            f.write(new_full_text)
+                        reassigned.setdefault(documents[j].metadata["source"], {})[page_num] = country_before
             else:
                 i += 1
+        if catalog is not None:
+            for source, countries in reassigned.items():
+                catalog.update_countries(source, countries)
         return documents 
\ No newline at end of file
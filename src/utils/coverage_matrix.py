@@ -0,0 +1,166 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+
+from config import Configuration
+from src.rag_core.table_cell_index import split_indicator
+from src.utils.page_archive import read_page_text
+from src.utils.snapshot import load_snapshot, save_snapshot
+
+BATCH_SIZE = 200
+# Longer indicator subjects are descriptions rather than names a page would repeat verbatim, so they never prune.
+MAX_SUBJECT_WORDS = 3
+# Connectors are left out on both sides, so "Millet & sorghum" is the same term as "Millet and Sorghum".
+TERM_STOPWORDS = {"and", "or", "of", "the"}
+
+
+def indicator_term(indicator: str) -> str:
+    # "Wheat - Number of holdings reporting, Area (total), Production" is covered by pages that mention wheat.
+    subject, _ = split_indicator(indicator or "")
+    key = term_key(subject)
+    return key if key and len(key.split()) <= MAX_SUBJECT_WORDS else ""
+
+
+def term_key(text: str) -> str:
+    # Case, spacing, connectors and a plural "s" on the last word do not make a different term
+    # ("Sugar  beets" == "sugar beet"). Keys map to themselves, so keying a key twice is harmless.
+    words = [word for word in re.findall(r"[a-z0-9]+", str(text).lower()) if word not in TERM_STOPWORDS]
+    if words and len(words[-1]) > 3 and words[-1].endswith("s") and not words[-1].endswith("ss"):
+        words[-1] = words[-1][:-1]
+    return " ".join(words)
+
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=8)
+def term_table(keys: tuple) -> dict:
+    # Terms indexed by their first word, so each word of a page is one dict lookup rather than one test per term.
+    table = {}
+    for key in keys:
+        words = tuple(key.split())
+        table.setdefault(words[0], []).append((words, key))
+    return table
+
+
+def scan_text(text: str, keys: tuple) -> set[str]:
+    if not keys or not text:
+        return set()
+    table = term_table(keys)
+    words = [word for word in WORD_PATTERN.findall(text.lower()) if word not in TERM_STOPWORDS]
+    found = set()
+    for i, word in enumerate(words):
+        candidates = table.get(word, [])
+        if word.endswith("s") and word[:-1] in table:
+            candidates = candidates + table[word[:-1]]
+        for term_words, key in candidates:
+            last = len(term_words) - 1
+            if key in found or i + last >= len(words):
+                continue
+            # Only the last word may carry the plural "s" that term_key dropped.
+            if all(words[i + j] == term_word or (j == last and words[i + j] == term_word + "s")
+                   for j, term_word in enumerate(term_words)):
+                found.add(key)
+    return found
+
+
+def scan_rows(rows: list[dict], keys: tuple) -> list[tuple[str, int, list[str]]]:
+    found = []
+    for row in rows:
+        try:
+            text = read_page_text(row)
+        except (OSError, ValueError):
+            text = ""
+        found.append((row["source"], row["page"], sorted(scan_text(text or "", keys))))
+    return found
+
+
+class CoverageMatrix:
+
+    def __init__(self, path: str = Configuration.COVERAGE_MATRIX_PATH):
+        self.path = path
+        self.keys = ()
+        # (source, page) -> {"hash", "country", "year", "terms"}
+        self.pages = {}
+        self.hits = {}
+        self.scanned = {}
+
+    def scan(self, rows: list[dict], terms: list[str], workers: int = 1) -> int:
+        # Only pages whose text changed, or every page when the term list changed, are read again;
+        # countries and years always come from the rows, so relabelled pages move without a rescan.
+        keys = tuple(sorted({term_key(term) for term in terms if term_key(term)}))
+        if keys != self.keys:
+            self.pages = {}
+            self.keys = keys
+        current = {(row["source"], row["page"]): row for row in rows}
+        self.pages = {key: page for key, page in self.pages.items() if key in current}
+        pending = [row for key, row in current.items()
+                   if key not in self.pages or self.pages[key]["hash"] != row.get("content_hash")]
+
+        batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+                results = list(executor.map(scan_rows, batches, [keys] * len(batches)))
+        else:
+            results = [scan_rows(batch, keys) for batch in batches]
+
+        for source, page, found in (item for result in results for item in result):
+            self.pages[(source, page)] = {"hash": current[(source, page)].get("content_hash"), "terms": found}
+        for key, row in current.items():
+            self.pages[key].update(country=str(row["country"]), year=str(row["year"]))
+        self._index()
+        return len(pending)
+
+    def is_current(self, rows: list[dict]) -> bool:
+        # The matrix only says anything about the pages it scanned; new, changed or removed pages make it stale.
+        return ({(row["source"], row["page"]): row.get("content_hash") for row in rows}
+                == {key: page["hash"] for key, page in self.pages.items()})
+
+    def _index(self):
+        self.hits = {}
+        self.scanned = {}
+        for (source, page), entry in sorted(self.pages.items()):
+            country_year = (entry["country"], entry["year"])
+            self.scanned[country_year] = self.scanned.get(country_year, 0) + 1
+            for term in entry["terms"]:
+                self.hits.setdefault(country_year + (term,), []).append((source, page))
+
+    def pages_for(self, country, year, term: str) -> list[tuple[str, int]]:
+        return self.hits.get((str(country), str(year), term_key(term)), [])
+
+    def covers_indicator(self, country, years: list, indicator: str) -> bool | None:
+        # None means "cannot tell": no subject term, a term that was not scanned for, or no pages of the country.
+        key = indicator_term(indicator)
+        if not key or key not in self.keys:
+            return None
+        years = [str(year) for year in years]
+        if not any((str(country), year) in self.scanned for year in years):
+            return None
+        return any(self.pages_for(country, year, key) for year in years)
+
+    def frame(self) -> pd.DataFrame:
+        records = [{"country": country, "year": year, "term": term, "pages": len(refs),
+                    "page_refs": ";".join(f"{source}:{page}" for source, page in refs)}
+                   for (country, year, term), refs in sorted(self.hits.items())]
+        return pd.DataFrame(records, columns=["country", "year", "term", "pages", "page_refs"])
+
+    def matrix(self) -> pd.DataFrame:
+        hits = self.frame()
+        if len(hits) == 0:
+            return pd.DataFrame()
+        return hits.pivot_table(index=["country", "year"], columns="term", values="pages", fill_value=0, aggfunc="sum")
+
+    def save(self):
+        save_snapshot(self.path, (self.keys, self.pages))
+
+    @classmethod
+    def load(cls, path: str = Configuration.COVERAGE_MATRIX_PATH) -> "CoverageMatrix":
+        matrix = cls(path)
+        if not os.path.exists(path):
+            return matrix
+        matrix.keys, matrix.pages = load_snapshot(path, "coverage matrix")
+        matrix._index()
+        return matrix
@@ -0,0 +1,130 @@
+import csv
+import io
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import pandas as pd
+from src.utils.snapshot import load_snapshot, save_snapshot
+
+SNAPSHOT_NAME = ".csv_tree_snapshot.pkl"
+# Same strings pandas.read_csv treats as missing by default.
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+
+def default_snapshot_path(root: str) -> str:
+    return os.path.join(root, SNAPSHOT_NAME)
+
+
+def list_csv_files(root: str) -> dict:
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.lower().endswith(".csv"):
+                continue
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            files[os.path.relpath(path, root)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def parse_csv_file(path: str, required_columns: Optional[tuple] = None) -> Optional[dict]:
+    # Files that pandas.read_csv would reject, or that lack a required column, are skipped as a whole.
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            text = f.read()
+            if text.count('"') % 2:
+                return None
+            reader = csv.reader(io.StringIO(text, newline=""))
+            header = next((row for row in reader if row), None)
+            if not header:
+                return None
+            if required_columns and not set(required_columns).issubset(header):
+                return None
+            names = list(required_columns) if required_columns else list(dict.fromkeys(header))
+            positions = [header.index(name) for name in names]
+            columns = {name: [] for name in names}
+            offset = None
+            for row in reader:
+                if not row:
+                    continue
+                if offset is None:
+                    # Like read_csv, extra leading fields in the first row become the index and shift the columns.
+                    offset = max(len(row) - len(header), 0)
+                    positions = [i + offset for i in positions]
+                if len(row) > len(header) + offset:
+                    return None
+                for name, i in zip(names, positions):
+                    cell = row[i] if i < len(row) else ""
+                    columns[name].append(None if cell in NA_VALUES else cell)
+            return columns
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+
+
+def _read_snapshot(snapshot_path: Optional[str], required_columns: Optional[tuple]) -> dict:
+    if not snapshot_path or not os.path.exists(snapshot_path):
+        return {}
+    try:
+        snapshot = load_snapshot(snapshot_path, "CSV tree")
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return {}
+    if snapshot.get("required_columns") != required_columns:
+        return {}
+    return snapshot["files"]
+
+
+def _write_snapshot(snapshot_path: str, required_columns: Optional[tuple], files: dict):
+    save_snapshot(snapshot_path, {"required_columns": required_columns, "files": files})
+
+
+def load_csv_tree(root: str, required_columns=None, workers: int = 8,
+                  snapshot_path: Optional[str] = None) -> pd.DataFrame:
+    required_columns = tuple(required_columns) if required_columns else None
+    current = list_csv_files(root)
+    cached = _read_snapshot(snapshot_path, required_columns)
+
+    files = {}
+    stale = []
+    for relpath, signature in current.items():
+        entry = cached.get(relpath)
+        if entry is not None and entry[0] == signature:
+            files[relpath] = entry
+        else:
+            stale.append(relpath)
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parsed = executor.map(lambda relpath: parse_csv_file(os.path.join(root, relpath), required_columns), stale)
+            for relpath, columns in zip(stale, parsed):
+                files[relpath] = (current[relpath], columns)
+
+    if snapshot_path and (stale or len(cached) != len(files)):
+        _write_snapshot(snapshot_path, required_columns, files)
+
+    data = {name: [] for name in required_columns or ()}
+    folders, sources = [], []
+    for relpath in sorted(files):
+        columns = files[relpath][1]
+        if not columns:
+            continue
+        rows = len(next(iter(columns.values()), []))
+        if not rows:
+            continue
+        for name, values in columns.items():
+            if name not in data:
+                data[name] = [None] * len(sources)
+            data[name].extend(values)
+        for name in data:
+            if name not in columns:
+                data[name].extend([None] * rows)
+        folders.extend([os.path.dirname(relpath)] * rows)
+        sources.extend([relpath] * rows)
+
+    frame = pd.DataFrame(data, dtype=object)
+    frame.insert(0, "Source_File", sources)
+    frame.insert(0, "Folder", folders)
+    return frame
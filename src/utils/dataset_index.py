@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+from collections import defaultdict
+from typing import Optional
+import numpy as np
+import pandas as pd
+from config import Configuration
+from src.utils.output_store import OutputStore, load_tree_frame
+from src.utils.snapshot import load_snapshot, save_snapshot
+
+INDEXED_FIELDS = ["Country", "Category", "Indicator_Group"]
+TEXT_COLUMNS = INDEXED_FIELDS + ["Reported_Country", "Year", "Indicator", "Unit", "Source_File"]
+YEAR_PATTERN = re.compile(r"(\d{4})(?:\s*[-/]\s*(\d{2,4}))?")
+
+
+def source_fingerprint(root: str, extension: str) -> Optional[str]:
+    # Path, size and modification time of every data file; None when there is no source to index.
+    if not os.path.isdir(root):
+        return None
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(extension):
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, root)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def index_key(value) -> str:
+    return re.sub(r"[\s_]+", " ", str(value)).strip().lower()
+
+
+def parse_year_span(value) -> tuple[int, int]:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return -1, -1
+    years = []
+    for match in YEAR_PATTERN.finditer(str(value)):
+        start = int(match.group(1))
+        years.append(start)
+        end = match.group(2)
+        if end:
+            end_year = int(end) if len(end) == 4 else start // 10 ** len(end) * 10 ** len(end) + int(end)
+            if end_year >= start:
+                years.append(end_year)
+    if not years:
+        return -1, -1
+    return min(years), max(years)
+
+
+class DatasetIndex:
+
+    def __init__(self, frame: pd.DataFrame):
+        frame = frame.reset_index(drop=True)
+        for column in TEXT_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].astype("category")
+        self.frame = frame
+
+        spans = [parse_year_span(value) for value in frame["Year"].astype(object)]
+        self.year_start = np.array([start for start, _ in spans], dtype=np.int16)
+        self.year_end = np.array([end for _, end in spans], dtype=np.int16)
+
+        self.codes = {}
+        self.key_codes = {}
+        self.postings = {}
+        for field in INDEXED_FIELDS:
+            categorical = frame[field].cat
+            self.codes[field] = categorical.codes.to_numpy()
+            key_codes = defaultdict(list)
+            for code, category in enumerate(categorical.categories):
+                key_codes[index_key(category)].append(code)
+            self.key_codes[field] = {key: np.array(codes) for key, codes in key_codes.items()}
+            self.postings[field] = self._build_postings(self.codes[field], len(categorical.categories), key_codes)
+
+        year_rows = defaultdict(list)
+        for row, (start, end) in enumerate(spans):
+            for year in range(start, end + 1) if start >= 0 else ():
+                year_rows[year].append(row)
+        self.postings["Year"] = {year: np.array(rows, dtype=np.int32) for year, rows in year_rows.items()}
+
+        # Cross-country slices ("Rice in 1960 everywhere") are the common query, so they get their own composite index.
+        group_year = defaultdict(list)
+        group_codes = self.codes["Indicator_Group"]
+        group_keys = {code: key for key, codes in self.key_codes["Indicator_Group"].items() for code in codes}
+        for year, rows in self.postings["Year"].items():
+            for row in rows:
+                group_year[(group_keys[group_codes[row]], year)].append(row)
+        self.postings["Indicator_Group_Year"] = {key: np.array(rows, dtype=np.int32) for key, rows in group_year.items()}
+
+    @staticmethod
+    def _build_postings(codes: np.ndarray, n_categories: int, key_codes: dict) -> dict:
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(n_categories + 1))
+        by_code = [order[bounds[c]:bounds[c + 1]] for c in range(n_categories)]
+        postings = {}
+        for key, codes_for_key in key_codes.items():
+            rows = np.concatenate([by_code[c] for c in codes_for_key])
+            postings[key] = np.sort(rows)
+        return postings
+
+    @classmethod
+    def from_store(cls, store: Optional[OutputStore] = None) -> "DatasetIndex":
+        return cls((store or OutputStore()).load())
+
+    @classmethod
+    def from_tree(cls, tree_root: str = Configuration.RAG_OUTPUTS_PATH) -> "DatasetIndex":
+        return cls(load_tree_frame(tree_root))
+
+    def save(self, path: str = Configuration.DATASET_SNAPSHOT_PATH):
+        save_snapshot(path, self.__dict__)
+
+    @classmethod
+    def load(cls, path: str = Configuration.DATASET_SNAPSHOT_PATH) -> "DatasetIndex":
+        index = cls.__new__(cls)
+        index.__dict__.update(load_snapshot(path, "dataset"))
+        return index
+
+    def _candidates(self, filters: dict, year: Optional[int]) -> np.ndarray:
+        lists = []
+        if "Indicator_Group" in filters and year is not None:
+            lists.append(self.postings["Indicator_Group_Year"].get((filters["Indicator_Group"], year), np.empty(0, np.int32)))
+        for field, key in filters.items():
+            lists.append(self.postings[field].get(key, np.empty(0, np.int32)))
+        if year is not None:
+            lists.append(self.postings["Year"].get(year, np.empty(0, np.int32)))
+        if not lists:
+            return np.arange(len(self.frame), dtype=np.int32)
+        return min(lists, key=len)
+
+    def lookup_rows(self, country=None, year: Optional[int] = None, category=None, indicator_group=None,
+                    indicator_contains: Optional[str] = None) -> np.ndarray:
+        filters = {field: index_key(value) for field, value in
+                   [("Country", country), ("Category", category), ("Indicator_Group", indicator_group)]
+                   if value is not None}
+        year = int(year) if year is not None else None
+        rows = self._candidates(filters, year)
+        if len(rows) == 0:
+            return rows
+
+        mask = np.ones(len(rows), dtype=bool)
+        for field, key in filters.items():
+            mask &= np.isin(self.codes[field][rows], self.key_codes[field].get(key, np.empty(0)))
+        if year is not None:
+            mask &= (self.year_start[rows] <= year) & (self.year_end[rows] >= year)
+        rows = rows[mask]
+
+        if indicator_contains and len(rows):
+            indicators = self.frame["Indicator"].iloc[rows].astype(str)
+            rows = rows[indicators.str.contains(indicator_contains, case=False, regex=False).to_numpy()]
+        return rows
+
+    def lookup(self, country=None, year: Optional[int] = None, category=None, indicator_group=None,
+               indicator_contains: Optional[str] = None, columns: Optional[list] = None) -> pd.DataFrame:
+        rows = self.lookup_rows(country, year, category, indicator_group, indicator_contains)
+        frame = self.frame.iloc[rows]
+        if columns:
+            frame = frame[columns]
+        return frame.astype({column: object for column in frame.columns if column in TEXT_COLUMNS})
+
+    def cross_country(self, indicator_group, year: int, indicator_contains: Optional[str] = None) -> pd.DataFrame:
+        frame = self.lookup(year=year, indicator_group=indicator_group, indicator_contains=indicator_contains,
+                            columns=["Country", "Indicator", "Value_Numeric", "Unit"])
+        return frame.sort_values(["Country", "Indicator"], kind="mergesort").reset_index(drop=True)
+
+    def values(self, field: str) -> list:
+        return sorted(self.postings[field])
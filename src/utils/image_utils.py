@@ -3,6 +3,15 @@ import numpy as np
 import cv2
 from typing import Tuple
 
+ORIENTATION_THUMBNAIL_SIDE = 1400
+MAX_SKEW_DEGREES = 5.0
+MIN_SKEW_DEGREES = 0.3
+MAX_SKEW_SAMPLES = 50000
+UPSIDE_DOWN_THRESHOLD = 0.25
+VERTICAL_TEXT_RATIO = 1.5
+MIN_WORD_BLOB_AREA = 20
+SPECK_AREA_RATIO = 0.3
+
 def preprocess_image(image: Image.Image, year: str = None) -> Image.Image:
     if str(year) == '1930':
         open_cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
@@ -194,4 +203,126 @@ def is_image_blank(image: Image.Image, threshold=10) -> bool:
         
     img_array = np.array(image_gray)
     std_dev = np.std(img_array)
-    return std_dev < threshold 
\ No newline at end of file
+    return std_dev < threshold
+
+def gray_thumbnail(image: Image.Image, max_side: int = ORIENTATION_THUMBNAIL_SIDE) -> np.ndarray:
+    gray = np.array(image.convert('L'))
+    scale = min(1.0, max_side / max(gray.shape))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    # Ink is 1, paper 0; a near-uniform page has no ink at all rather than Otsu's split of its noise.
+    if np.std(gray) < 10:
+        return np.zeros_like(gray)
+    _, bin_img = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return bin_img
+
+def rotate_image(img_array: np.ndarray, angle: float) -> np.ndarray:
+    h, w = img_array.shape[:2]
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img_array, rotation, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def estimate_skew(bin_img: np.ndarray, max_angle: float = MAX_SKEW_DEGREES) -> float:
+    # Projects the ink pixels at each candidate angle; text lines, columns and rules give the sharpest profiles when
+    # level. Rows and columns are scored together, so the angle is found whichever way the text runs.
+    # Returns the counter-clockwise tilt of the page in degrees.
+    ys, xs = np.nonzero(bin_img)
+    if len(ys) < 100:
+        return 0.0
+    step = -(-len(ys) // MAX_SKEW_SAMPLES)
+    ys = ys[::step].astype(np.float64)
+    xs = xs[::step].astype(np.float64)
+
+    def sharpness(positions):
+        positions = np.round(positions).astype(np.int64)
+        profile = np.bincount(positions - positions.min()).astype(np.float64)
+        return np.square(np.diff(profile)).sum() / np.square(profile).sum()
+
+    def score(angle):
+        theta = np.deg2rad(angle)
+        return (sharpness(ys * np.cos(theta) + xs * np.sin(theta))
+                + sharpness(xs * np.cos(theta) - ys * np.sin(theta)))
+
+    best = max(np.arange(-max_angle, max_angle + 1e-9, 0.5), key=score)
+    return float(max(np.arange(best - 0.5, best + 0.5 + 1e-9, 0.05), key=score))
+
+def remove_rules(bin_img: np.ndarray) -> np.ndarray:
+    # Table rules run both ways and say nothing about the text direction.
+    length = max(bin_img.shape) // 20
+    rules = (cv2.morphologyEx(bin_img, cv2.MORPH_OPEN, np.ones((1, length), np.uint8))
+             | cv2.morphologyEx(bin_img, cv2.MORPH_OPEN, np.ones((length, 1), np.uint8)))
+    return bin_img & (1 - rules)
+
+def remove_specks(bin_img: np.ndarray) -> np.ndarray:
+    # Commas, dots and dust hang below or above the letters without being descenders or ascenders.
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(bin_img, connectivity=8)
+    if count < 2:
+        return bin_img
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.zeros(count, np.uint8)
+    keep[1:] = areas >= SPECK_AREA_RATIO * np.median(areas)
+    return keep[labels]
+
+def text_runs_vertically(bin_img: np.ndarray) -> bool:
+    # Smudged together, the letters of a word or the digits of a number form a blob that is long along the text.
+    blobs = cv2.dilate(bin_img, np.ones((3, 3), np.uint8))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(blobs, connectivity=8)
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    words = widths * heights >= MIN_WORD_BLOB_AREA
+    return (heights[words] > 1.5 * widths[words]).sum() > VERTICAL_TEXT_RATIO * (widths[words] > 1.5 * heights[words]).sum()
+
+def ascender_asymmetry(bin_img: np.ndarray) -> float:
+    # Latin text has more ascenders (capitals, b d f h k l t) than descenders (g j p q y): in every text line,
+    # more ink sits above the dense x-height core than below it. Positive means upright, negative upside down.
+    profile = bin_img.sum(axis=1).astype(np.float64)
+    base = np.percentile(profile, 10)
+    inked = profile > base + 0.2 * (profile.max() - base)
+    above = below = 0.0
+    i, n = 0, len(inked)
+    while i < n:
+        if not inked[i]:
+            i += 1
+            continue
+        j = i
+        while j < n and inked[j]:
+            j += 1
+        half = (j - i) // 2
+        band = np.clip(profile[max(0, i - half):min(n, j + half)] - base, 0, None)
+        core = np.nonzero(band >= 0.5 * band.max())[0]
+        if len(core):
+            above += band[:core[0]].sum()
+            below += band[core[-1] + 1:].sum()
+        i = j
+    return (above - below) / max(above + below, 1.0)
+
+def detect_orientation(bin_img: np.ndarray) -> int:
+    # Degrees counter-clockwise (0, 90, 180 or 270) that turn a deskewed page upright. Lines of bare numbers carry
+    # little up/down signal, so pages keep the usual side up unless the ascenders clearly say otherwise: upright,
+    # or for landscape tables the printed convention of the table's top at the left edge of the page.
+    bin_img = remove_specks(remove_rules(bin_img))
+    if not bin_img.any():
+        return 0
+    if text_runs_vertically(bin_img):
+        return 90 if ascender_asymmetry(np.rot90(bin_img)) > UPSIDE_DOWN_THRESHOLD else 270
+    return 180 if ascender_asymmetry(bin_img) < -UPSIDE_DOWN_THRESHOLD else 0
+
+def deskew_and_orient(image: Image.Image) -> Tuple[Image.Image, int, float]:
+    # Page-level correction judged on one thumbnail: the skew first, then the orientation of the deskewed
+    # thumbnail. Returns the corrected page, the quarter turns and the skew it was rotated by.
+    gray = gray_thumbnail(image)
+    bin_img = binarize(gray)
+    if not bin_img.any():
+        return image, 0, 0.0
+    skew = estimate_skew(bin_img)
+    if abs(skew) < MIN_SKEW_DEGREES:
+        skew = 0.0
+    else:
+        bin_img = binarize(rotate_image(gray, -skew))
+        image = Image.fromarray(rotate_image(np.array(image), -skew))
+    orientation = detect_orientation(bin_img)
+    if orientation:
+        image = image.transpose({90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180,
+                                 270: Image.Transpose.ROTATE_270}[orientation])
+    return image, orientation, skew
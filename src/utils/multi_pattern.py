@@ -0,0 +1,45 @@
+import re
+from functools import lru_cache
+from typing import Optional
+import pandas as pd
+
+MEMO_SIZE = 4096
+
+
+def priority_order(keys: list) -> list:
+    # Mapping order, except that a key always comes before the keys it contains ("ha (thousands)" before "ha").
+    ordered = []
+    for key in keys:
+        contained = [i for i, other in enumerate(ordered) if other in key]
+        if contained:
+            ordered.insert(min(contained), key)
+        else:
+            ordered.append(key)
+    return ordered
+
+
+class MultiPatternMatcher:
+
+    def __init__(self, mapping: dict, memo_size: int = MEMO_SIZE):
+        keys = priority_order([str(key) for key in mapping if str(key)])
+        self.values = {str(key): value for key, value in mapping.items()}
+        self.priority = {key: rank for rank, key in enumerate(keys)}
+        # A lookahead reports a match at every position, so keys overlapping a higher-priority one are still seen.
+        self.pattern = re.compile("(?=(" + "|".join(map(re.escape, keys)) + "))") if keys else None
+        self.find = lru_cache(maxsize=memo_size)(self._find)
+
+    def _find(self, text: str) -> Optional[str]:
+        if self.pattern is None:
+            return None
+        best = None
+        for match in self.pattern.finditer(text):
+            key = match.group(1)
+            if best is None or self.priority[key] < self.priority[best]:
+                best = key
+                if self.priority[best] == 0:
+                    break
+        return self.values[best] if best is not None else None
+
+    def match_series(self, series: pd.Series) -> pd.Series:
+        found = {text: self.find(text) for text in series.dropna().unique()}
+        return series.map(found).astype(object)
@@ -0,0 +1,250 @@
+import csv
+import os
+import re
+import shutil
+import threading
+import uuid
+from typing import Iterable, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import Configuration
+from src.utils.table_parser import parse_numeric
+
+OUTPUT_COLUMNS = ["Country", "Year", "Indicator", "Value", "Unit"]
+HEADER_ALIASES = {"units": "Unit"}
+FILENAME_PATTERN = re.compile(r"^output_(\d+)_(.+)\.csv$", re.IGNORECASE)
+UNCATEGORIZED = "Uncategorized"
+
+PARTITION_COLUMNS = ["Category", "Country"]
+REPLACE_KEYS = ["Country", "Category", "Indicator_Group"]
+ROW_GROUP_SIZE = 1024
+STORE_SCHEMA = pa.schema([
+    ("Country", pa.string()),
+    ("Category", pa.string()),
+    ("Indicator_Group", pa.string()),
+    ("Reported_Country", pa.string()),
+    ("Year", pa.string()),
+    ("Indicator", pa.string()),
+    ("Value", pa.string()),
+    ("Value_Numeric", pa.float64()),
+    ("Unit", pa.string()),
+    ("Source_File", pa.string()),
+])
+PARTITIONING = ds.partitioning(
+    pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor="hive"
+)
+
+
+def safe_name(text: str) -> str:
+    return re.sub(r"[^\w\-]", "_", text)
+
+
+def parse_output_filename(filename: str, country: str) -> tuple[str, str]:
+    match = FILENAME_PATTERN.match(filename)
+    if match:
+        category, rest = match.group(1), match.group(2)
+    else:
+        category = UNCATEGORIZED
+        rest = re.sub(r"^output_", "", os.path.splitext(filename)[0])
+    prefix = safe_name(country) + "_"
+    if rest.startswith(prefix):
+        rest = rest[len(prefix):]
+    return category, rest.strip("_")
+
+
+def canonical_header(cell: str) -> Optional[str]:
+    name = cell.strip().strip("#|").strip().lower()
+    if name in HEADER_ALIASES:
+        return HEADER_ALIASES[name]
+    for column in OUTPUT_COLUMNS:
+        if name == column.lower():
+            return column
+    return None
+
+
+def read_output_csv(path: str) -> dict:
+    columns = {column: [] for column in OUTPUT_COLUMNS}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return columns
+        positions = [(i, canonical_header(cell)) for i, cell in enumerate(header)]
+        positions = [(i, name) for i, name in positions if name]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            for column in OUTPUT_COLUMNS:
+                columns[column].append(None)
+            for i, name in positions:
+                if i < len(row) and row[i].strip():
+                    columns[name][-1] = row[i].strip()
+    return columns
+
+
+def iter_output_files(root: str) -> Iterable[tuple[str, str]]:
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".csv"):
+                yield os.path.basename(dirpath), os.path.join(dirpath, filename)
+
+
+def to_store_frame(df: pd.DataFrame, country: str, category, indicator_group: str, source_file: str = "") -> pd.DataFrame:
+    renamed = {}
+    for column in df.columns:
+        name = canonical_header(str(column))
+        if name and name not in renamed.values():
+            renamed[column] = name
+    df = df[list(renamed)].rename(columns=renamed)
+    frame = pd.DataFrame(index=df.index)
+    frame["Country"] = country
+    frame["Category"] = [str(c) for c in category] if isinstance(category, list) else str(category)
+    frame["Indicator_Group"] = indicator_group
+    frame["Reported_Country"] = df["Country"] if "Country" in df else None
+    for column in ["Year", "Indicator", "Value", "Unit"]:
+        frame[column] = df[column].astype(object).where(df[column].notna(), None) if column in df else None
+    frame["Value_Numeric"] = parse_numeric(frame["Value"])
+    frame["Source_File"] = source_file
+    return frame.reset_index(drop=True)
+
+
+def load_tree_frame(tree_root: str = Configuration.RAG_OUTPUTS_PATH) -> pd.DataFrame:
+    columns = {column: [] for column in OUTPUT_COLUMNS}
+    countries, categories, indicator_groups, source_files = [], [], [], []
+    for country, path in iter_output_files(tree_root):
+        try:
+            file_columns = read_output_csv(path)
+        except (OSError, UnicodeDecodeError, csv.Error):
+            continue
+        rows = len(file_columns["Value"])
+        if not rows:
+            continue
+        category, indicator_group = parse_output_filename(os.path.basename(path), country)
+        for column in OUTPUT_COLUMNS:
+            columns[column].extend(file_columns[column])
+        countries.extend([country] * rows)
+        categories.extend([category] * rows)
+        indicator_groups.extend([indicator_group] * rows)
+        source_files.extend([os.path.relpath(path, tree_root)] * rows)
+    if not countries:
+        return pd.DataFrame(columns=STORE_SCHEMA.names)
+    return to_store_frame(pd.DataFrame(columns), countries, categories, indicator_groups, source_files)
+
+
+class OutputStore:
+
+    def __init__(self, root: str = Configuration.OUTPUT_STORE_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+        self._recover(self.root)
+        for partition in self._partitions(self.root):
+            self._recover(os.path.join(self.root, partition))
+
+    @staticmethod
+    def _recover(path: str):
+        # A crash during a swap leaves the previous copy next to the new one, or in place of it; finish the swap.
+        if os.path.exists(path + ".old"):
+            if os.path.exists(path):
+                shutil.rmtree(path + ".old")
+            else:
+                os.replace(path + ".old", path)
+
+    @staticmethod
+    def _directories(path: str) -> list:
+        if not os.path.isdir(path):
+            return []
+        return sorted({name[:-len(".old")] if name.endswith(".old") else name for name in os.listdir(path)
+                       if os.path.isdir(os.path.join(path, name)) and not name.startswith(".")})
+
+    @classmethod
+    def _partitions(cls, root: str) -> list:
+        return [os.path.join(category, country) for category in cls._directories(root)
+                for country in cls._directories(os.path.join(root, category))]
+
+    def _write(self, frame: pd.DataFrame, existing_data_behavior: str, root: str = None):
+        root = root or self.root
+        frame = frame.sort_values(["Category", "Country", "Indicator_Group"], kind="mergesort")
+        table = pa.Table.from_pandas(frame, schema=STORE_SCHEMA, preserve_index=False)
+        os.makedirs(root, exist_ok=True)
+        pq.write_to_dataset(
+            table,
+            root,
+            partitioning=PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior=existing_data_behavior,
+            row_group_size=ROW_GROUP_SIZE,
+        )
+
+    @staticmethod
+    def _swap(source: str, target: str):
+        # The new copy is complete before the old one is moved aside, so a failed write never loses data.
+        if os.path.exists(target):
+            os.replace(target, target + ".old")
+        os.replace(source, target)
+        shutil.rmtree(target + ".old", ignore_errors=True)
+
+    def _replace(self, frame: pd.DataFrame):
+        # Rows of the written (Country, Category, Indicator_Group) keys are replaced and all other rows are kept.
+        # Only the (Category, Country) partitions holding replaced rows are rewritten and swapped in, so writers
+        # in separate processes must not write the same country at once; writers sharing a store are serialized.
+        with self._lock:
+            existing = self.load(countries=list(frame["Country"].unique()), categories=list(frame["Category"].unique()))
+            stale = pd.MultiIndex.from_frame(existing[REPLACE_KEYS].astype(str)).isin(
+                pd.MultiIndex.from_frame(frame[REPLACE_KEYS].astype(str)))
+            if not stale.any():
+                self._write(frame, "overwrite_or_ignore")
+                return
+            rewritten = pd.MultiIndex.from_frame(existing[["Category", "Country"]]).isin(
+                pd.MultiIndex.from_frame(existing.loc[stale, ["Category", "Country"]]))
+            staging = f"{self.root}.tmp-{uuid.uuid4().hex}"
+            try:
+                self._write(pd.concat([existing[rewritten & ~stale][STORE_SCHEMA.names], frame], ignore_index=True),
+                            "overwrite_or_ignore", staging)
+                for partition in self._partitions(staging):
+                    os.makedirs(os.path.join(self.root, os.path.dirname(partition)), exist_ok=True)
+                    self._swap(os.path.join(staging, partition), os.path.join(self.root, partition))
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    def append(self, df: pd.DataFrame, country: str, category, indicator_group: str, source_file: str = "") -> int:
+        # Re-running an indicator replaces its rows, as it replaces its CSV.
+        frame = to_store_frame(df, country, category, indicator_group, source_file)
+        if len(frame):
+            self._replace(frame)
+        return len(frame)
+
+    def import_tree(self, tree_root: str = Configuration.RAG_OUTPUTS_PATH) -> int:
+        # The tree may be partial: only the indicator groups it contains are replaced.
+        frame = load_tree_frame(tree_root)
+        if len(frame):
+            self._replace(frame)
+        return len(frame)
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(self.root, format="parquet", partitioning=PARTITIONING, schema=STORE_SCHEMA)
+
+    def load(self, columns: Optional[list] = None, filter=None, countries: Optional[list] = None,
+             categories: Optional[list] = None, indicator_groups: Optional[list] = None) -> pd.DataFrame:
+        if not os.path.exists(self.root):
+            return pd.DataFrame(columns=columns or STORE_SCHEMA.names)
+        expression = filter
+        for field, values in [("Country", countries), ("Category", categories), ("Indicator_Group", indicator_groups)]:
+            if values:
+                condition = ds.field(field).isin([str(v) for v in values])
+                expression = condition if expression is None else expression & condition
+        return self.dataset().to_table(columns=columns, filter=expression).to_pandas()
+
+    def compact(self) -> int:
+        with self._lock:
+            frame = self.load()
+            if len(frame) == 0:
+                return 0
+            staging = f"{self.root}.tmp-{uuid.uuid4().hex}"
+            try:
+                self._write(frame[STORE_SCHEMA.names], "overwrite_or_ignore", staging)
+                self._swap(staging, self.root)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        return len(frame)
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import uuid
+import zlib
+from functools import lru_cache
+from typing import Iterator
+
+from config import Configuration
+from src.utils.page_catalog import content_hash, page_text_path
+
+ARCHIVE_PREFIX = "archive:"
+INDEX_SUFFIX = ".idx"
+COMPRESSION_LEVEL = 6
+
+
+class PageArchive:
+    # Page texts are zlib blobs appended to one data file; a JSON-lines sidecar maps (source, page) to
+    # offset and length. Later index lines win, so replacing or relabelling a page never rewrites old data.
+    # After compaction the data lives in a new generation file, named by the first line of the index.
+
+    def __init__(self, path: str = Configuration.PAGE_ARCHIVE_PATH):
+        self.path = path
+        self.data_path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.location = ARCHIVE_PREFIX + path
+        self.entries = {}
+        self.by_country_year = {}
+        self._lock = threading.Lock()
+        self._reader = None
+        self._reader_pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if lines:
+            try:
+                header = json.loads(lines[0])
+            except ValueError:
+                header = {}
+            if "data" in header:
+                self.data_path = os.path.join(os.path.dirname(self.path), header["data"])
+                lines = lines[1:]
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crash while appending leaves at most one partial line at the end.
+                continue
+            if entry.get("deleted") or entry["offset"] + entry["length"] <= size:
+                self._index(entry)
+
+    def _index(self, entry: dict):
+        key = (entry["source"], entry["page"])
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.by_country_year.get((previous["country"], previous["year"]), set()).discard(key)
+        if entry.get("deleted"):
+            return
+        self.entries[key] = entry
+        self.by_country_year.setdefault((entry["country"], entry["year"]), set()).add(key)
+
+    def _write_index(self, entries: list[dict]):
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        for entry in entries:
+            self._index(entry)
+
+    def append(self, source: str, page: int, text: str, country, year) -> str:
+        digest = content_hash(text)
+        with self._lock:
+            previous = self.entries.get((source, int(page)))
+            if previous is not None and previous["hash"] == digest:
+                entry = {**previous, "country": str(country), "year": str(year)}
+            else:
+                blob = zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+                # The blob is on disk before its index line, so an interrupted append is never indexed.
+                with open(self.data_path, "ab") as f:
+                    offset = f.tell()
+                    f.write(blob)
+                entry = {"source": source, "page": int(page), "country": str(country), "year": str(year),
+                         "offset": offset, "length": len(blob), "chars": len(text), "hash": digest}
+            if entry != previous:
+                self._write_index([entry])
+        return self.location
+
+    def relabel(self, source: str, countries: dict):
+        with self._lock:
+            entries = [{**self.entries[(source, int(page))], "country": str(country)}
+                       for page, country in countries.items() if (source, int(page)) in self.entries]
+            self._write_index([entry for entry in entries if entry != self.entries[(entry["source"], entry["page"])]])
+
+    def delete_source(self, source: str, keep=()) -> int:
+        # Drops the pages of a source except those in keep, from the index only; compact() reclaims their bytes.
+        # Re-ingesting deletes afterwards with the pages just written as keep, so unchanged pages are not appended again.
+        keep = {int(page) for page in keep}
+        with self._lock:
+            tombstones = [{"source": source, "page": page, "deleted": True} for src, page in self.entries
+                          if src == source and page not in keep]
+            self._write_index(tombstones)
+        return len(tombstones)
+
+    def _read(self, entry: dict) -> str:
+        # Forked workers share the parent's file offset, so each process opens its own handle.
+        if self._reader is None or self._reader_pid != os.getpid():
+            self._reader = open(self.data_path, "rb")
+            self._reader_pid = os.getpid()
+        self._reader.seek(entry["offset"])
+        return zlib.decompress(self._reader.read(entry["length"])).decode("utf-8")
+
+    def get(self, source: str, page: int) -> str | None:
+        with self._lock:
+            entry = self.entries.get((source, int(page)))
+            return None if entry is None else self._read(entry)
+
+    def find(self, country=None, year=None, source=None) -> list[dict]:
+        with self._lock:
+            if country is not None and year is not None:
+                keys = self.by_country_year.get((str(country), str(year)), set())
+                entries = [self.entries[key] for key in keys]
+            else:
+                entries = [entry for entry in self.entries.values()
+                           if (country is None or entry["country"] == str(country))
+                           and (year is None or entry["year"] == str(year))]
+        return sorted((entry for entry in entries if source is None or entry["source"] == source),
+                      key=lambda entry: (entry["source"], entry["page"]))
+
+    def iter_pages(self, country=None, year=None, source=None) -> Iterator[tuple[dict, str]]:
+        # Read in file order, so a full scan is one sequential pass over the data file.
+        for entry in sorted(self.find(country, year, source), key=lambda entry: entry["offset"]):
+            with self._lock:
+                text = self._read(entry)
+            yield entry, text
+
+    def export(self, output_dir: str = Configuration.OUTPUT_PATH, country=None, year=None, source=None) -> int:
+        os.makedirs(output_dir, exist_ok=True)
+        exported = 0
+        for entry, text in self.iter_pages(country, year, source):
+            with open(page_text_path(entry["source"], entry["page"], output_dir), "w", encoding="utf-8") as f:
+                f.write(text)
+            exported += 1
+        return exported
+
+    def compact(self) -> int:
+        # Drops blobs of replaced pages by copying the live ones into a new generation data file. The index naming
+        # it replaces the old index last, so a crash at any point leaves an index whose offsets match its data file.
+        with self._lock:
+            if not os.path.exists(self.data_path):
+                return 0
+            entries = sorted(self.entries.values(), key=lambda entry: entry["offset"])
+            data_path = f"{self.path}.{uuid.uuid4().hex[:12]}"
+            compacted = []
+            with open(self.data_path, "rb") as source, open(data_path, "wb") as target:
+                for entry in entries:
+                    source.seek(entry["offset"])
+                    compacted.append({**entry, "offset": target.tell()})
+                    target.write(source.read(entry["length"]))
+                target.flush()
+                os.fsync(target.fileno())
+            with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(json.dumps({"data": os.path.basename(data_path)}) + "\n")
+                for entry in compacted:
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.close()
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.remove(self.data_path)
+            self.data_path = data_path
+            self.entries = {}
+            self.by_country_year = {}
+            for entry in compacted:
+                self._index(entry)
+            return len(compacted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored = sum(entry["length"] for entry in self.entries.values())
+            chars = sum(entry["chars"] for entry in self.entries.values())
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        return {"pages": len(self.entries), "chars": chars, "live_bytes": stored, "file_bytes": size,
+                "ratio": round(chars / stored, 2) if stored else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def clear(self):
+        with self._lock:
+            self.close()
+            for path in {self.path, self.data_path, self.index_path}:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.data_path = self.path
+            self.entries = {}
+            self.by_country_year = {}
+
+
+def is_archive_location(location: str) -> bool:
+    return bool(location) and location.startswith(ARCHIVE_PREFIX)
+
+
+@lru_cache(maxsize=None)
+def open_archive(path: str = Configuration.PAGE_ARCHIVE_PATH) -> PageArchive:
+    return PageArchive(path)
+
+
+def read_page_text(row: dict) -> str:
+    # Works for catalog rows and archive entries alike.
+    location = row.get("text_path", ARCHIVE_PREFIX + Configuration.PAGE_ARCHIVE_PATH)
+    if is_archive_location(location):
+        return open_archive(location[len(ARCHIVE_PREFIX):]).get(row["source"], row["page"])
+    with open(location, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def write_page_text(source: str, page: int, text: str, country, year, archive: PageArchive = None) -> str:
+    # Returns where the text went: the archive location, or the loose file when no archive is used.
+    if archive is not None:
+        return archive.append(source, page, text, country, year)
+    path = page_text_path(source, page)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
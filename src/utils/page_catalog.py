@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import Configuration
+
+PAGE_COLUMNS = ['source', 'page', 'country', 'year', 'category', 'engine', 'extraction', 'content_hash', 'chars',
+                'text_path', 'updated_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    source TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    country TEXT,
+    year TEXT,
+    category TEXT,
+    engine TEXT,
+    extraction TEXT,
+    content_hash TEXT,
+    chars INTEGER,
+    text_path TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (source, page)
+);
+CREATE INDEX IF NOT EXISTS pages_country_year ON pages (country, year);
+CREATE INDEX IF NOT EXISTS pages_year ON pages (year);
+"""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def page_text_path(source: str, page: int, output_dir: str = Configuration.OUTPUT_PATH) -> str:
+    # Named after the PDF and page only, so a page keeps its file when its country is re-assigned.
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(output_dir, re.sub(r"[^\w\-_.]", "_", f"{stem}_page{page}.txt"))
+
+
+class PageCatalog:
+
+    def __init__(self, path: str = Configuration.PAGE_CATALOG_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def upsert(self, source: str, page: int, country, year, text: str, text_path: str = None, category=None,
+               engine: str = None, extraction: str = None):
+        self.upsert_many([{"source": source, "page": page, "country": country, "year": year, "text": text,
+                           "text_path": text_path, "category": category, "engine": engine, "extraction": extraction}])
+
+    def upsert_many(self, pages: list[dict]):
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [(page["source"], int(page["page"]), str(page["country"]), str(page["year"]),
+                 None if page.get("category") is None else str(page["category"]), page.get("engine"),
+                 page.get("extraction"), content_hash(page.get("text") or ""), len(page.get("text") or ""),
+                 page.get("text_path"), now) for page in pages]
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO pages ({', '.join(PAGE_COLUMNS)}) VALUES ({', '.join('?' * len(PAGE_COLUMNS))})", rows)
+
+    def update_countries(self, source: str, countries: dict) -> int:
+        # The interpolation pass only changes which country a page belongs to; the stored text stays where it is.
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self.connection:
+            cursor = self.connection.executemany(
+                "UPDATE pages SET country = ?, updated_at = ? WHERE source = ? AND page = ?",
+                [(str(country), now, source, int(page)) for page, country in countries.items()])
+        return cursor.rowcount
+
+    def update_locations(self, locations: dict) -> int:
+        with self._lock, self.connection:
+            cursor = self.connection.executemany(
+                "UPDATE pages SET text_path = ? WHERE source = ? AND page = ?",
+                [(location, source, int(page)) for (source, page), location in locations.items()])
+        return cursor.rowcount
+
+    def get(self, source: str, page: int) -> dict | None:
+        with self._lock:
+            row = self.connection.execute("SELECT * FROM pages WHERE source = ? AND page = ?", (source, int(page))).fetchone()
+        return dict(row) if row else None
+
+    def find(self, country=None, year=None, category=None, source=None) -> list[dict]:
+        filters = {"country": country, "year": year, "category": category, "source": source}
+        where = [(f"{column} = ?", str(value)) for column, value in filters.items() if value is not None]
+        query = "SELECT * FROM pages"
+        if where:
+            query += " WHERE " + " AND ".join(clause for clause, _ in where)
+        with self._lock:
+            rows = self.connection.execute(query + " ORDER BY source, page", [value for _, value in where]).fetchall()
+        return [dict(row) for row in rows]
+
+    def country_years(self) -> list[tuple[str, str, int]]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT country, year, COUNT(*) FROM pages GROUP BY country, year ORDER BY country, year").fetchall()
+        return [tuple(row) for row in rows]
+
+    def delete_source(self, source: str) -> int:
+        with self._lock, self.connection:
+            return self.connection.execute("DELETE FROM pages WHERE source = ?", (source,)).rowcount
+
+    def clear(self):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM pages")
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
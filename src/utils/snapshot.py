@@ -0,0 +1,22 @@
+import os
+import pickle
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path: str, payload, version: int = SNAPSHOT_VERSION):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Written next to the old file and swapped in, so a crash never leaves a truncated snapshot behind.
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump((version, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_snapshot(path: str, kind: str, version: int = SNAPSHOT_VERSION):
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+    if not isinstance(snapshot, tuple) or len(snapshot) != 2 or snapshot[0] != version:
+        raise ValueError(f"Unsupported {kind} snapshot in {path}")
+    return snapshot[1]
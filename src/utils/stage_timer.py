@@ -0,0 +1,127 @@
+import csv
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        import resource
+        # Not Linux: fall back to the process high-water mark (bytes on macOS, kilobytes elsewhere).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.records = []
+        self.unattributed = defaultdict(float)
+        self.current = None
+        self._children = []
+
+    @contextmanager
+    def page(self, **labels):
+        record = {**labels, 'total': 0.0, 'rss_mb': current_rss_mb(), 'stages': defaultdict(float)}
+        self.current = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['total'] += time.perf_counter() - start
+            record['stages']['other'] += max(record['total'] - sum(record['stages'].values()), 0.0)
+            record['stages'] = dict(record['stages'])
+            record['rss_mb'] = max(record['rss_mb'], current_rss_mb())
+            self.records.append(record)
+            self.current = None
+
+    @contextmanager
+    def stage(self, name: str):
+        # Stage times are exclusive: a nested stage is subtracted from the one around it, so the stages add up to the page.
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            if self.current is not None:
+                self.current['stages'][name] += own
+                self.current['rss_mb'] = max(self.current['rss_mb'], current_rss_mb())
+            else:
+                self.unattributed[name] += own
+
+    def add(self, name: str, seconds: float):
+        # Work done once for many pages (e.g. rasterizing a whole PDF) is charged to each page as its share.
+        if self.current is not None:
+            self.current['stages'][name] += seconds
+            self.current['total'] += seconds
+        else:
+            self.unattributed[name] += seconds
+
+    def stage_names(self) -> list:
+        names = []
+        for record in self.records:
+            names.extend(name for name in record['stages'] if name not in names)
+        return names
+
+    def summary(self, group_by: str = 'engine') -> dict:
+        groups = defaultdict(list)
+        for record in self.records:
+            groups[record.get(group_by)].append(record)
+
+        summary = {}
+        for group, records in groups.items():
+            totals = np.array([record['total'] for record in records])
+            stages = {}
+            for name in self.stage_names():
+                seconds = np.array([record['stages'].get(name, 0.0) for record in records])
+                stages[name] = {
+                    'total_seconds': float(seconds.sum()),
+                    'mean_ms': float(seconds.mean() * 1000),
+                    'p95_ms': float(np.percentile(seconds, 95) * 1000),
+                    'share': float(seconds.sum() / totals.sum()) if totals.sum() > 0 else 0.0,
+                }
+            summary[group] = {
+                'pages': len(records),
+                'total_seconds': float(totals.sum()),
+                'pages_per_second': float(len(records) / totals.sum()) if totals.sum() > 0 else 0.0,
+                **{f'p{p}_ms': float(np.percentile(totals, p) * 1000) for p in PERCENTILES},
+                'peak_rss_mb': float(max(record['rss_mb'] for record in records)),
+                'stages': stages,
+            }
+        return summary
+
+    def write_csv(self, path: str):
+        stage_names = self.stage_names()
+        labels = []
+        for record in self.records:
+            labels.extend(key for key in record if key not in ('total', 'rss_mb', 'stages') and key not in labels)
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(labels + ['total_ms', 'rss_mb'] + [f'{name}_ms' for name in stage_names])
+            for record in self.records:
+                writer.writerow([record.get(key) for key in labels]
+                                + [round(record['total'] * 1000, 3), round(record['rss_mb'], 1)]
+                                + [round(record['stages'].get(name, 0.0) * 1000, 3) for name in stage_names])
+
+
+def timed_stage(timer: Optional[StageTimer], name: str):
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def timed_page(timer: Optional[StageTimer], **labels):
+    return timer.page(**labels) if timer is not None else nullcontext()
@@ -0,0 +1,86 @@
+import re
+from typing import Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+SEPARATOR_PATTERN = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-*:?\s*)*\|?\s*$")
+THOUSANDS_PATTERN = r"(\d)(?=(\d{3})+(?!\d))"
+YEAR_COLUMNS = ("year", "year_")
+
+
+def split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+def iter_markdown_tables(text: str) -> Iterator[List[List[str]]]:
+    table = []
+    for line in text.splitlines():
+        if "|" not in line:
+            if table:
+                yield table
+                table = []
+            continue
+        if SEPARATOR_PATTERN.match(line):
+            continue
+        table.append(split_row(line))
+    if table:
+        yield table
+
+
+def parse_markdown_table(text: str) -> Optional[pd.DataFrame]:
+    headers = None
+    columns = None
+    for line in text.splitlines():
+        if "|" not in line or SEPARATOR_PATTERN.match(line):
+            continue
+        cells = split_row(line)
+        if headers is None:
+            headers = cells
+            columns = [[] for _ in headers]
+            continue
+        if cells == headers:
+            continue
+        for i, column in enumerate(columns):
+            column.append(cells[i] if i < len(cells) else "")
+
+    if not headers or not columns[0]:
+        return None
+    return pd.DataFrame({header: column for header, column in zip(headers, columns)}, dtype=object)
+
+
+def parse_numeric(series: pd.Series) -> pd.Series:
+    cleaned = series.astype(str).str.replace(r"[,\s]", "", regex=True)
+    numbers = pd.to_numeric(cleaned, errors="coerce")
+    return numbers.where(np.isfinite(numbers))
+
+
+def format_numbers(numbers: pd.Series) -> pd.Series:
+    formatted = pd.Series(np.nan, index=numbers.index, dtype=object)
+    valid = numbers.notna()
+    if not valid.any():
+        return formatted
+    values = numbers[valid].to_numpy(dtype=float)
+    integers = (values == np.floor(values)) & (np.abs(values) < 2 ** 63)
+    text = np.where(
+        integers,
+        np.char.mod("%d", np.where(integers, values, 0).astype(np.int64)),
+        np.char.mod("%.2f", values),
+    )
+    formatted[valid] = pd.Series(text, index=numbers.index[valid]).str.replace(THOUSANDS_PATTERN, r"\1 ", regex=True)
+    return formatted
+
+
+def format_numeric_columns(df: pd.DataFrame, skip_columns=YEAR_COLUMNS) -> pd.DataFrame:
+    df = df.copy()
+    for column in df.columns:
+        if str(column).lower() in skip_columns:
+            continue
+        numbers = parse_numeric(df[column])
+        if numbers.notna().any():
+            df[column] = format_numbers(numbers).where(numbers.notna(), df[column])
+    return df
@@ -0,0 +1,120 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from config import Configuration
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(tracer.ids)
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def __enter__(self):
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        self.token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        event = {
+            "ts": round(self.ts, 6),
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_ms": round(duration * 1000, 3),
+            "status": "error" if exc_type is not None or "error" in self.attrs else "ok",
+            **self.attrs,
+        }
+        if exc_type is not None:
+            event["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.write(event)
+        return False
+
+
+class _NullSpan:
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key: str, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.ids = itertools.count(1)
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def span(self, name: str, **attrs):
+        # Disabled tracing costs one attribute check per span and allocates nothing.
+        if self.path is None:
+            return NULL_SPAN
+        return Span(self, name, attrs)
+
+    def write(self, event: dict):
+        line = json.dumps({"pid": os.getpid(), **event}, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+tracer = Tracer(Configuration.TRACE_PATH)
+
+
+def configure_tracing(path: Optional[str]):
+    tracer.close()
+    tracer.path = path
+
+
+def span(name: str, **attrs):
+    return tracer.span(name, **attrs)
+
+
+def current_span():
+    return _current_span.get() or NULL_SPAN
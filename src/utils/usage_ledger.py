@@ -0,0 +1,116 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from config import Configuration
+
+ATTRIBUTION_KEYS = ['file', 'page', 'country', 'year', 'category', 'indicator']
+USAGE_COLUMNS = ['pages', 'prompt_tokens', 'completion_tokens', 'latency_s', 'cost_usd']
+
+_attribution = contextvars.ContextVar("usage_attribution", default={})
+
+
+@contextmanager
+def attribute(**labels):
+    # Everything recorded inside the block is charged to these labels; nested blocks add to or override the outer ones.
+    token = _attribution.set({**_attribution.get(), **labels})
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def estimate_cost(service: str, pages: int = 0, prompt_tokens: int = 0, completion_tokens: int = 0) -> float:
+    if service == "mistral_ocr":
+        return pages * Configuration.OCR_PRICE_PER_1000_PAGES / 1000
+    return (prompt_tokens * Configuration.LLM_PRICE_PER_MILLION_INPUT_TOKENS
+            + completion_tokens * Configuration.LLM_PRICE_PER_MILLION_OUTPUT_TOKENS) / 1_000_000
+
+
+class UsageLedger:
+
+    def __init__(self, path: str = Configuration.USAGE_LEDGER_PATH):
+        self.path = path
+        self.run_id = datetime.now().strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        self.rows = []
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, service: str, model: str, latency_s: float, pages: int = 0, prompt_tokens: int = 0,
+               completion_tokens: int = 0, status: str = "ok", **labels) -> dict:
+        row = {
+            'run_id': self.run_id,
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'service': service,
+            'model': model,
+            'status': status,
+            **{key: None for key in ATTRIBUTION_KEYS},
+            **_attribution.get(),
+            **labels,
+            'pages': pages,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency_s': round(latency_s, 4),
+            'cost_usd': estimate_cost(service, pages, prompt_tokens, completion_tokens),
+        }
+        with self._lock:
+            self.rows.append(row)
+        return row
+
+    def relabel(self, file: str, page_labels: dict):
+        # Countries are only final after interpolation, so OCR rows are re-attributed page by page afterwards.
+        with self._lock:
+            for row in self.rows[self.saved:]:
+                if row['file'] == file and row['page'] in page_labels:
+                    row.update(page_labels[row['page']])
+
+    def save(self):
+        with self._lock:
+            pending = self.rows[self.saved:]
+            if not pending:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for row in pending:
+                    f.write(json.dumps(row, default=str) + "\n")
+            self.saved = len(self.rows)
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(self.rows, columns=list(self.rows[0]) if self.rows else ['service'] + USAGE_COLUMNS)
+
+    def print_rollups(self):
+        usage = self.frame()
+        if len(usage) == 0:
+            print("No API usage recorded.")
+            return
+        print(f"\nAPI usage for run {self.run_id} (ledger: {self.path})")
+        print(rollup(usage, ['service', 'model']).to_string(float_format='{:,.4f}'.format))
+        print("\nBy country:")
+        print(rollup(usage.fillna({'country': 'Unknown'}), ['country', 'service']).to_string(float_format='{:,.4f}'.format))
+
+
+def rollup(usage: pd.DataFrame, by: list) -> pd.DataFrame:
+    usage = usage.assign(errors=usage['status'] != 'ok')
+    summary = usage.groupby(by, dropna=False).agg(
+        calls=('service', 'size'),
+        errors=('errors', 'sum'),
+        **{column: (column, 'sum') for column in USAGE_COLUMNS},
+    )
+    total = summary.sum().to_frame(('Total',) + ('',) * (len(by) - 1) if len(by) > 1 else 'Total').T
+    return pd.concat([summary, total.astype(summary.dtypes.to_dict())])
+
+
+def load_ledger(path: str = Configuration.USAGE_LEDGER_PATH) -> pd.DataFrame:
+    with open(path, "r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+ledger = UsageLedger()
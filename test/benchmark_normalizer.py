@@ -0,0 +1,135 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from check_testdata import normalizer, load_testdata_tree, merge_testdata_files_with_units, find_matching_combinations_with_units, with_group_column
+from data_normalizer import REFERENCE_KEYS, find_best_reference_match, check_value_between_points
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def normalize_rowwise(test_df, reference_df):
+    return pd.DataFrame([normalizer.normalize_single_test_record(row, reference_df) for _, row in test_df.iterrows()])
+
+def compare_rowwise(test_data, ref_data):
+    exact_matches = 0
+    deviation_sum = 0
+    for _, test_row in test_data.iterrows():
+        ref_data_year = ref_data[ref_data['Year'] == test_row['Year']]
+        if len(ref_data_year) > 0:
+            _, deviation, _ = find_best_reference_match(ref_data_year, test_row['Value'], test_row['Unit'])
+            exact_matches += deviation <= 1
+        elif len(ref_data) >= 2:
+            within_range, deviation, _, _ = check_value_between_points(ref_data, test_row['Value'], test_row['Year'])
+            exact_matches += within_range
+        else:
+            deviation = 100
+        deviation_sum += deviation
+    return exact_matches, len(test_data), deviation_sum / len(test_data) if len(test_data) > 0 else 0
+
+def compare_groups_rowwise(test_df, reference_df):
+    results = []
+    for country, category, indicator in find_matching_combinations_with_units(reference_df, test_df):
+        ref_mask = (reference_df['Country'] == country) & (reference_df['Category'] == category) & (reference_df['Indicator'] == indicator)
+        test_mask = (test_df['Country'] == country) & (test_df['Category'] == category) & (test_df['Indicator'] == indicator)
+        results.append(compare_rowwise(test_df[test_mask].sort_values('Year', kind='mergesort'), reference_df[ref_mask]))
+    return results
+
+def compare_groups_vectorized(test_df, reference_df):
+    combinations = pd.DataFrame(find_matching_combinations_with_units(reference_df, test_df), columns=REFERENCE_KEYS)
+    combinations['Group'] = np.arange(len(combinations))
+    ref_data = with_group_column(reference_df, combinations)
+    test_data = with_group_column(test_df, combinations).sort_values(['Group', 'Year'], kind='mergesort')
+    compared = normalizer.compare_values(test_data, ref_data)
+    return list(zip(*normalizer.summarize_comparison(test_data['Group'], compared, len(combinations))))
+
+def benchmark_comparison(testdata_dir, historicaldata_dir):
+    testdata_files = load_testdata_tree(testdata_dir)
+    rowwise_time = 0.0
+    vectorized_time = 0.0
+    groups = 0
+
+    for country, country_files in sorted(testdata_files.items()):
+        reference_file = os.path.join(historicaldata_dir, f"{country}.csv")
+        if not os.path.exists(reference_file):
+            continue
+        reference_df = pd.read_csv(reference_file)
+        test_df = merge_testdata_files_with_units(country_files)
+        if len(test_df) == 0:
+            continue
+        test_df = normalizer.normalize_test_data_to_reference(test_df, reference_df)
+
+        start = time.perf_counter()
+        expected = compare_groups_rowwise(test_df, reference_df)
+        rowwise_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = compare_groups_vectorized(test_df, reference_df)
+        vectorized_time += time.perf_counter() - start
+
+        assert len(actual) == len(expected), country
+        for (exact, total, avg), (expected_exact, expected_total, expected_avg) in zip(actual, expected):
+            assert (exact, total) == (expected_exact, expected_total), country
+            assert np.isclose(avg, expected_avg, equal_nan=True), country
+        groups += len(expected)
+
+    print(f"Comparison groups: {groups} (results identical)")
+    print(f"Row-wise:   {rowwise_time:.3f} sec")
+    print(f"Vectorized: {vectorized_time:.3f} sec")
+    if vectorized_time > 0:
+        print(f"Speed-up:   {rowwise_time / vectorized_time:.1f}x")
+
+def check_missing_units():
+    # The validation set rarely has rows without a unit; cover them with and without a matching reference group.
+    reference_df = pd.DataFrame({'Country': ['A', 'A', 'A'], 'Category': ['1', '1', '2'], 'Indicator': ['x', 'x', 'y'],
+                                 'Year': [1950, 1951, 1950], 'Value': [1.0, 2.0, 3.0], 'Unit': pd.Series(['tons', 'tons', None], dtype=object)})
+    test_df = pd.DataFrame({'Country': ['A'] * 4, 'Category': ['1', '2', '3', '3'], 'Indicator': ['x', 'y', 'z', 'z'],
+                            'Year': [1950] * 4, 'Value': [1.0, 2.0, 3.0, 4.0], 'Unit': pd.Series([None, None, None, 'kg'], dtype=object)})
+    for rows in [test_df, test_df.iloc[1:3], test_df.iloc[2:3]]:
+        assert_frame_equal(normalizer.normalize_test_data_to_reference(rows, reference_df),
+                           normalize_rowwise(rows, reference_df), check_dtype=False, obj='missing units')
+    print("Missing units: outputs identical")
+
+def benchmark_normalization(testdata_dir, historicaldata_dir):
+    testdata_files = load_testdata_tree(testdata_dir)
+    rowwise_time = 0.0
+    vectorized_time = 0.0
+    countries = 0
+    rows = 0
+
+    for country, country_files in sorted(testdata_files.items()):
+        reference_file = os.path.join(historicaldata_dir, f"{country}.csv")
+        if not os.path.exists(reference_file):
+            continue
+        reference_df = pd.read_csv(reference_file)
+        test_df = merge_testdata_files_with_units(country_files)
+        if len(test_df) == 0:
+            continue
+
+        start = time.perf_counter()
+        expected = normalize_rowwise(test_df, reference_df)
+        rowwise_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = normalizer.normalize_test_data_to_reference(test_df, reference_df)
+        vectorized_time += time.perf_counter() - start
+
+        assert_frame_equal(actual, expected, check_dtype=False, obj=country)
+        countries += 1
+        rows += len(test_df)
+
+    print(f"Countries: {countries}, test rows: {rows} (outputs identical)")
+    print(f"Row-wise:   {rowwise_time:.3f} sec")
+    print(f"Vectorized: {vectorized_time:.3f} sec")
+    if vectorized_time > 0:
+        print(f"Speed-up:   {rowwise_time / vectorized_time:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark unit normalization on the validation set")
+    parser.add_argument('--testdata-dir', default=os.path.join(CURRENT_DIR, 'testData'))
+    parser.add_argument('--historicaldata-dir', default=os.path.join(CURRENT_DIR, 'historicalData'))
+    args = parser.parse_args()
+    check_missing_units()
+    benchmark_normalization(args.testdata_dir, args.historicaldata_dir)
+    benchmark_comparison(args.testdata_dir, args.historicaldata_dir)
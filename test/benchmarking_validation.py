@@ -1,4 +1,5 @@
 import pandas as pd
+from bootstrap_ci import bootstrap_ci, grouped_bootstrap_ci
 
 def benchmarking_validation():
     try:
@@ -6,22 +7,27 @@ def benchmarking_validation():
     except FileNotFoundError:
         return
     
-    country_stats = results_df.groupby('Country').agg({
-        'Comparison_Result': 'count'
-    }).rename(columns={'Comparison_Result': 'Total_Matches'})
+    is_all_exact = results_df['Comparison_Result'].astype(str).str.contains('All exact matches', regex=False)
     
-    country_stats['Exact_Matches'] = results_df.groupby('Country')['Comparison_Result'].apply(
-        lambda x: sum(1 for r in x if 'All exact matches' in r)
-    )
-    
-    country_stats['Accuracy_Percent'] = (country_stats['Exact_Matches'] / country_stats['Total_Matches'] * 100).round(1)
+    country_stats = grouped_bootstrap_ci(is_all_exact, results_df['Country'])
+    country_stats = pd.DataFrame({
+        'Total_Matches': country_stats['N'],
+        'Exact_Matches': is_all_exact.groupby(results_df['Country']).sum(),
+        'Accuracy_Percent': (country_stats['Accuracy'].astype(float) * 100).round(1),
+        'Accuracy_CI_Low': (country_stats['CI_Low'].astype(float) * 100).round(1),
+        'Accuracy_CI_High': (country_stats['CI_High'].astype(float) * 100).round(1),
+    })
     
     country_stats = country_stats.sort_index()
     
     total_comparisons = len(results_df)
-    total_exact_matches = sum(1 for r in results_df['Comparison_Result'] if 'All exact matches' in r)
+    total_exact_matches = int(is_all_exact.sum())
     overall_accuracy = (total_exact_matches / total_comparisons * 100) if total_comparisons > 0 else 0
+    _, ci_low, ci_high = bootstrap_ci(is_all_exact)
+    
+    print(f"Overall accuracy: {overall_accuracy:.1f}% (95% CI {ci_low * 100:.1f}-{ci_high * 100:.1f}%)")
     
+    return country_stats
 
 if __name__ == "__main__":
     benchmarking_validation()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+N_RESAMPLES = 2000
+CONFIDENCE = 0.95
+SEED = 0
+# Upper bound on the size of one resample index matrix (resamples x rows).
+BATCH_ELEMENTS = 4_000_000
+
+def batch_sizes(n_resamples, n_rows, batch_elements=BATCH_ELEMENTS):
+    batch = max(1, batch_elements // max(n_rows, 1))
+    for start in range(0, n_resamples, batch):
+        yield min(batch, n_resamples - start)
+
+def percentile_interval(estimates, confidence=CONFIDENCE):
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(estimates, [tail, 100 - tail], axis=0)
+
+def bootstrap_ci(values, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=SEED):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+
+    rng = np.random.default_rng(seed)
+    means = np.concatenate([
+        values[rng.integers(0, len(values), size=(batch, len(values)))].mean(axis=1)
+        for batch in batch_sizes(n_resamples, len(values))
+    ])
+    low, high = percentile_interval(means, confidence)
+    return values.mean(), low, high
+
+def grouped_bootstrap_ci(values, groups, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=SEED):
+    groups = pd.Series(groups)
+    codes, labels = pd.factorize(groups, sort=True)
+    values = np.asarray(values, dtype=float)[codes >= 0]
+    codes = codes[codes >= 0]
+    index = pd.Index(labels, name=groups.name)
+    if len(values) == 0:
+        return pd.DataFrame(columns=['N', 'Accuracy', 'CI_Low', 'CI_High'], index=index)
+
+    order = np.argsort(codes, kind='stable')
+    values, codes = values[order], codes[order]
+    sizes = np.bincount(codes, minlength=len(labels))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    row_starts, row_sizes = starts[codes], sizes[codes]
+
+    # Every row draws its replacement from its own group, so each group is resampled independently at its own size
+    # and one reduceat over the group offsets gives all group means of a batch at once.
+    rng = np.random.default_rng(seed)
+    means = []
+    for batch in batch_sizes(n_resamples, len(values)):
+        resampled = row_starts + rng.integers(0, row_sizes, size=(batch, len(values)))
+        means.append(np.add.reduceat(values[resampled], starts, axis=1) / sizes)
+    low, high = percentile_interval(np.concatenate(means), confidence)
+
+    return pd.DataFrame({
+        'N': sizes,
+        'Accuracy': np.bincount(codes, weights=values) / sizes,
+        'CI_Low': low,
+        'CI_High': high,
+    }, index=index)
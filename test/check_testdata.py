@@ -1,78 +1,57 @@
+import argparse
 import pandas as pd
 import os
-import glob
+import sys
 import numpy as np
 import re
-from data_normalizer import DataNormalizer
-from data_normalizer import find_best_reference_match, check_value_between_points
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.csv_tree_loader import load_csv_tree, default_snapshot_path
+from data_normalizer import DataNormalizer, REFERENCE_KEYS
 from correlation_analysis import load_comparison_data, prepare_analysis_data, correlation_analysis, descriptive_statistics
 
 normalizer = DataNormalizer()
+TESTDATA_COLUMNS = ['Country', 'Year', 'Indicator', 'Value', 'Unit']
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTDATA_DIR = os.getenv("VALIDATION_TESTDATA_DIR", os.path.join(CURRENT_DIR, "testData"))
+HISTORICALDATA_DIR = os.getenv("VALIDATION_HISTORICALDATA_DIR", os.path.join(CURRENT_DIR, "historicalData"))
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", os.cpu_count() or 1))
+OUTPUT_FILE = "data_comparison_duplicate_handling.csv"
 
-def extract_testdata_with_units(file_path):
+def extract_testdata_with_units(df):
     try:
-        df = pd.read_csv(file_path)
-        
-        data = []
-        for _, row in df.iterrows():
-            value = normalizer.clean_value(row['Value'])
-            year = normalizer.extract_year_from_string(row['Year'])
-            
-            if value is None or year is None:
-                continue
-            
-            crop_name, data_type = normalizer.extract_crop_and_type_from_indicator(row['Indicator'])
-            
-            if crop_name and data_type:
-                normalized_unit = normalizer.normalize_unit(row['Unit'])
-                
-                data.append({
-                    'Country': row['Country'],
-                    'Year': year,
-                    'Category': crop_name,
-                    'Indicator': data_type,
-                    'Value': value,
-                    'Unit': normalized_unit if normalized_unit else 'Unknown',
-                    'Original_Unit': row['Unit'] if pd.notna(row['Unit']) else 'Unknown'
-                })
-        
-        return data
-        
+        return normalizer.extract_records(df)
     except Exception as e:
-        return []
+        print(f"Extracting {df['Folder'].iloc[0] if len(df) else 'test data'} failed ({e}); retrying file by file")
+    records = []
+    for source, rows in df.groupby('Source_File', sort=False):
+        try:
+            records.append(normalizer.extract_records(rows))
+        except Exception as e:
+            print(f"Skipping {source}: {e}")
+    return pd.concat(records) if records else pd.DataFrame()
 
-def merge_testdata_files_with_units(country_folder):
-    all_data = []
-    
-    csv_files = glob.glob(os.path.join(country_folder, "*.csv"))
-    
-    for file_path in csv_files:
-        file_data = extract_testdata_with_units(file_path)
-        all_data.extend(file_data)
+def load_testdata_tree(testdata_dir):
+    tree = load_csv_tree(testdata_dir, required_columns=TESTDATA_COLUMNS,
+                         snapshot_path=default_snapshot_path(testdata_dir))
+    return {folder: files for folder, files in tree.groupby('Folder', sort=False)}
+
+def merge_testdata_files_with_units(country_files):
+    all_data = extract_testdata_with_units(country_files)
     
-    if all_data:
-        return pd.DataFrame(all_data)
+    if len(all_data):
+        return all_data
     else:
         return pd.DataFrame()
 
-
-from data_normalizer import find_best_reference_match, check_value_between_points
-
-
 def find_matching_combinations_with_units(reference_df, test_df):
-    matches = []
-    
-    ref_combinations = set()
-    for _, row in reference_df.iterrows():
-        ref_combinations.add((row['Country'], row['Category'], row['Indicator']))
-    
-    test_combinations = set()
-    for _, row in test_df.iterrows():
-        test_combinations.add((row['Country'], row['Category'], row['Indicator']))
-    
-    common_combinations = ref_combinations.intersection(test_combinations)
-    
-    return list(common_combinations)
+    ref_combinations = reference_df[REFERENCE_KEYS].dropna().drop_duplicates()
+    test_combinations = test_df[REFERENCE_KEYS].dropna().drop_duplicates()
+    common_combinations = ref_combinations.merge(test_combinations, on=REFERENCE_KEYS)
+    common_combinations = common_combinations.sort_values(REFERENCE_KEYS, kind='mergesort')
+    return list(common_combinations.itertuples(index=False, name=None))
 
 def compare_values_within_range(ref_data, test_data, year_tolerance=5):
     matches = []
@@ -111,127 +90,105 @@ def compare_values_within_range(ref_data, test_data, year_tolerance=5):
     
     return matches
 
+def with_group_column(df, combinations):
+    # A left merge keeps the original row order, which decides the pick among duplicate reference years.
+    groups = df[REFERENCE_KEYS].merge(combinations, on=REFERENCE_KEYS, how='left')['Group'].to_numpy()
+    matched = ~np.isnan(groups)
+    return df[matched].assign(Group=groups[matched].astype(np.int64))
+
 def compare_trends_and_values_with_duplicates(reference_df, test_df, country_name):
-    results = []
-    
     normalized_test_df = normalizer.normalize_test_data_to_reference(test_df, reference_df)
     
-    matching_combinations = find_matching_combinations_with_units(reference_df, normalized_test_df)
-    
-    unit_conversions = 0
-    
-    for country, category, indicator in matching_combinations:
-        ref_data = reference_df[
-            (reference_df['Country'] == country) & 
-            (reference_df['Category'] == category) &
-            (reference_df['Indicator'] == indicator)
-        ].sort_values('Year')
-        
-        test_data = normalized_test_df[
-            (normalized_test_df['Country'] == country) & 
-            (normalized_test_df['Category'] == category) &
-            (normalized_test_df['Indicator'] == indicator)
-        ].sort_values('Year')
-        
-        if len(ref_data) == 0 or len(test_data) == 0:
-            continue
-        
-        conversions_in_this_comparison = test_data['Unit_Converted'].sum()
-        unit_conversions += conversions_in_this_comparison
-        
-        ref_years = sorted(ref_data['Year'].unique())
-        test_years = sorted(test_data['Year'].unique())
-        
-        ref_min_year = min(ref_years)
-        ref_max_year = max(ref_years)
-        test_min_year = min(test_years)
-        test_max_year = max(test_years)
-        
-        time_overlap = "No overlap"
-        if (test_min_year <= ref_max_year and test_max_year >= ref_min_year):
-            time_overlap = "Overlap"
-        
-        years_in_range = []
-        for year in test_years:
-            if ref_min_year <= year <= ref_max_year:
-                years_in_range.append(year)
-        
-        years_in_range_percent = len(years_in_range) / len(test_years) * 100 if len(test_years) > 0 else 0
-        
-        exact_matches, total_test_values, avg_deviation = normalizer.compare_test_data_with_reference(test_data, ref_data)
-        
-        comparison_result = normalizer.determine_comparison_result(exact_matches, total_test_values, avg_deviation)
-        
-        ref_unit = ref_data['Unit'].mode().iloc[0] if len(ref_data['Unit'].mode()) > 0 else ref_data['Unit'].iloc[0]
-        test_unit = test_data['Unit'].mode().iloc[0] if len(test_data['Unit'].mode()) > 0 else test_data['Unit'].iloc[0]
-        
-        unit_compatibility = "Compatible" if ref_unit == test_unit else "Converted"
-        
-        results.append({
-            'Country': country_name,
-            'Category': category,
-            'Indicator': indicator,
-            'Comparison_Type': "Exact + Interpolation",
-            'Comparison_Result': comparison_result,
-            'Reference_Data_Points': len(ref_data),
-            'Test_Data_Points': len(test_data),
-            'Reference_Years': f"{ref_min_year}-{ref_max_year}",
-            'Test_Years': f"{test_min_year}-{test_max_year}",
-            'Time_Overlap': time_overlap,
-            'Years_In_Range_Percent': years_in_range_percent,
-            'Years_In_Range': len(years_in_range),
-            'Reference_Unit': ref_unit,
-            'Test_Unit': test_unit,
-            'Unit_Compatibility': unit_compatibility,
-            'Unit_Conversions': conversions_in_this_comparison
-        })
-    
-    return results
+    combinations = pd.DataFrame(find_matching_combinations_with_units(reference_df, normalized_test_df), columns=REFERENCE_KEYS)
+    if len(combinations) == 0:
+        return []
+    n_groups = len(combinations)
+    combinations['Group'] = np.arange(n_groups)
+    
+    ref_data = with_group_column(reference_df, combinations)
+    test_data = with_group_column(normalized_test_df, combinations).sort_values(['Group', 'Year'], kind='mergesort')
+    
+    ref_years = ref_data.groupby('Group')['Year'].agg(['size', 'min', 'max']).reindex(range(n_groups))
+    test_years = test_data.groupby('Group')['Year'].agg(['size', 'min', 'max']).reindex(range(n_groups))
+    unit_conversions = test_data.groupby('Group')['Unit_Converted'].sum().reindex(range(n_groups))
+    
+    unique_test_years = test_data[['Group', 'Year']].drop_duplicates()
+    group_ref_years = ref_years.loc[unique_test_years['Group']]
+    in_range = (unique_test_years['Year'].to_numpy() >= group_ref_years['min'].to_numpy()) & \
+               (unique_test_years['Year'].to_numpy() <= group_ref_years['max'].to_numpy())
+    years_in_range = np.bincount(unique_test_years['Group'], weights=in_range, minlength=n_groups).astype(np.int64)
+    unique_year_counts = np.bincount(unique_test_years['Group'], minlength=n_groups)
+    
+    compared = normalizer.compare_values(test_data, ref_data)
+    exact_matches, total_test_values, avg_deviation = normalizer.summarize_comparison(test_data['Group'], compared, n_groups)
+    
+    ref_units = normalizer.mode_units(ref_data, ['Group']).set_index('Group')['Unit'].reindex(range(n_groups))
+    test_units = normalizer.mode_units(test_data, ['Group']).set_index('Group')['Unit'].reindex(range(n_groups))
+    
+    results = pd.DataFrame({
+        'Country': country_name,
+        'Category': combinations['Category'],
+        'Indicator': combinations['Indicator'],
+        'Comparison_Type': "Exact + Interpolation",
+        'Comparison_Result': [normalizer.determine_comparison_result(*values)
+                              for values in zip(exact_matches, total_test_values, avg_deviation)],
+        'Reference_Data_Points': ref_years['size'].to_numpy(),
+        'Test_Data_Points': test_years['size'].to_numpy(),
+        'Reference_Years': ref_years['min'].astype(str).to_numpy() + "-" + ref_years['max'].astype(str).to_numpy(),
+        'Test_Years': test_years['min'].astype(str).to_numpy() + "-" + test_years['max'].astype(str).to_numpy(),
+        'Time_Overlap': np.where((test_years['min'] <= ref_years['max']) & (test_years['max'] >= ref_years['min']),
+                                 "Overlap", "No overlap"),
+        'Years_In_Range_Percent': years_in_range / unique_year_counts * 100,
+        'Years_In_Range': years_in_range,
+        'Reference_Unit': ref_units.to_numpy(),
+        'Test_Unit': test_units.to_numpy(),
+        'Unit_Compatibility': np.where(ref_units.to_numpy() == test_units.to_numpy(), "Compatible", "Converted"),
+        'Unit_Conversions': unit_conversions.to_numpy(),
+    })
+    return results.to_dict('records')
+
+def validate_country(country_name, country_files, reference_file):
+    result = {'Country': country_name, 'Status': 'ok', 'Results': [], 'Error': None}
+    try:
+        reference_df = pd.read_csv(reference_file)
+        test_df = merge_testdata_files_with_units(country_files)
+        if len(test_df) == 0:
+            result['Status'] = 'no test data'
+            return result
+        result['Results'] = compare_trends_and_values_with_duplicates(reference_df, test_df, country_name)
+    except Exception as e:
+        result['Status'] = 'error'
+        result['Error'] = f"{type(e).__name__}: {e}"
+    return result
 
-def check_testdata_with_duplicate_handling():
-    testdata_dir = r"C:\Users\alexe\IdeaProjects\Rag_Pipline_Thesis_Teplykh\test\testData"
-    historicaldata_dir = r"C:\Users\alexe\IdeaProjects\Rag_Pipline_Thesis_Teplykh\test\historicalData"
+def check_testdata_with_duplicate_handling(testdata_dir=TESTDATA_DIR, historicaldata_dir=HISTORICALDATA_DIR,
+                                           workers=VALIDATION_WORKERS, output_file=OUTPUT_FILE):
+    testdata_files = load_testdata_tree(testdata_dir)
+    
+    jobs = []
+    for country_folder in sorted(testdata_files):
+        reference_file = os.path.join(historicaldata_dir, f"{country_folder}.csv")
+        if os.path.exists(reference_file):
+            jobs.append((country_folder, testdata_files[country_folder], reference_file))
+    
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            country_results = list(executor.map(validate_country, *zip(*jobs)))
+    else:
+        country_results = [validate_country(*job) for job in jobs]
     
     all_results = []
-    processed_countries = 0
-    total_matches = 0
-    total_unit_conversions = 0
-    
-    country_folders = [f for f in os.listdir(testdata_dir) 
-                      if os.path.isdir(os.path.join(testdata_dir, f))]
+    for country_result in country_results:
+        all_results.extend(country_result['Results'])
+        if country_result['Status'] == 'error':
+            print(f"{country_result['Country']}: {country_result['Error']}")
     
-    for country_folder in country_folders:
-        country_name = country_folder
-        
-        test_country_path = os.path.join(testdata_dir, country_folder)
-        reference_file = os.path.join(historicaldata_dir, f"{country_name}.csv")
-        
-        if not os.path.exists(reference_file):
-            continue
-        
-        try:
-            reference_df = pd.read_csv(reference_file)
-            
-            test_df = merge_testdata_files_with_units(test_country_path)
-            
-            if len(test_df) == 0:
-                continue
-            
-            comparison_results = compare_trends_and_values_with_duplicates(reference_df, test_df, country_name)
-            all_results.extend(comparison_results)
-            
-            processed_countries += 1
-            total_matches += len(comparison_results)
-            
-            country_conversions = sum([r['Unit_Conversions'] for r in comparison_results])
-            total_unit_conversions += country_conversions
-            
-        except Exception as e:
-            continue
+    processed_countries = sum(1 for r in country_results if r['Status'] == 'ok')
+    failed_countries = sum(1 for r in country_results if r['Status'] == 'error')
+    print(f"Validated {processed_countries} countries ({failed_countries} failed), {len(all_results)} comparisons")
     
     if all_results:
         results_df = pd.DataFrame(all_results)
-        output_file = "data_comparison_duplicate_handling.csv"
         results_df.to_csv(output_file, index=False, encoding='utf-8')
         
         return results_df
@@ -273,7 +230,7 @@ def run_correlation_analysis():
     
     print(f"Total comparisons: {stats['total_comparisons']}")
     print(f"Exact matches: {stats['exact_matches']}")
-    print(f"Overall accuracy: {stats['accuracy_rate']:.1f}%")
+    print(f"Overall accuracy: {stats['accuracy_rate']:.1f}% (95% CI {stats['accuracy_ci'][0]:.1f}-{stats['accuracy_ci'][1]:.1f}%)")
     print()
     print("Key correlations:")
     for name, corr, p_val in correlations:
@@ -281,6 +238,12 @@ def run_correlation_analysis():
         print(f"  {name}: {corr:.3f} (p={p_val:.3f}) {significance}")
 
 if __name__ == "__main__":
-    results_df = check_testdata_with_duplicate_handling()
+    parser = argparse.ArgumentParser(description="Validate extracted test data against the historical reference data")
+    parser.add_argument('--testdata-dir', default=TESTDATA_DIR)
+    parser.add_argument('--historicaldata-dir', default=HISTORICALDATA_DIR)
+    parser.add_argument('--workers', type=int, default=VALIDATION_WORKERS)
+    args = parser.parse_args()
+    
+    results_df = check_testdata_with_duplicate_handling(args.testdata_dir, args.historicaldata_dir, args.workers)
     analyze_results(results_df)
     run_correlation_analysis()
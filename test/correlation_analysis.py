@@ -3,6 +3,7 @@ import numpy as np
 from scipy.stats import pearsonr, spearmanr, kendalltau, ttest_ind, f_oneway, chi2_contingency
 import matplotlib.pyplot as plt
 import seaborn as sns
+from bootstrap_ci import bootstrap_ci, grouped_bootstrap_ci
 
 def load_comparison_data():
     try:
@@ -12,30 +13,25 @@ def load_comparison_data():
         return None
 
 def prepare_analysis_data(df):
-    analysis_data = []
-    
-    for _, row in df.iterrows():
-        year_range = str(row['Reference_Years'])
-        if '-' in year_range:
-            start_year = int(year_range.split('-')[0])
-        else:
-            start_year = int(year_range) if year_range.isdigit() else None
-        
-        analysis_data.append({
-            'Country': row['Country'],
-            'Category': row['Category'],
-            'Indicator': row['Indicator'],
-            'Start_Year': start_year,
-            'Test_Data_Points': row['Test_Data_Points'],
-            'Reference_Data_Points': row['Reference_Data_Points'],
-            'Years_In_Range_Percent': row['Years_In_Range_Percent'],
-            'Is_Exact_Match': 'All exact matches' in row['Comparison_Result'] or 'Some exact matches' in row['Comparison_Result'],
-            'Is_All_Exact': 'All exact matches' in row['Comparison_Result'],
-            'Unit_Compatibility': row['Unit_Compatibility'],
-            'Time_Overlap': row['Time_Overlap']
-        })
-    
-    analysis_df = pd.DataFrame(analysis_data)
+    df = df.reset_index(drop=True)
+    year_range = df['Reference_Years'].astype(str)
+    start_year = pd.to_numeric(year_range.str.split('-', n=1).str[0], errors='coerce')
+    comparison_result = df['Comparison_Result'].astype(str)
+    is_all_exact = comparison_result.str.contains('All exact matches', regex=False)
+    
+    analysis_df = pd.DataFrame({
+        'Country': df['Country'],
+        'Category': df['Category'],
+        'Indicator': df['Indicator'],
+        'Start_Year': start_year,
+        'Test_Data_Points': df['Test_Data_Points'],
+        'Reference_Data_Points': df['Reference_Data_Points'],
+        'Years_In_Range_Percent': df['Years_In_Range_Percent'],
+        'Is_Exact_Match': is_all_exact | comparison_result.str.contains('Some exact matches', regex=False),
+        'Is_All_Exact': is_all_exact,
+        'Unit_Compatibility': df['Unit_Compatibility'],
+        'Time_Overlap': df['Time_Overlap']
+    })
     analysis_df = analysis_df.dropna(subset=['Start_Year'])
     
     return analysis_df
@@ -98,6 +94,7 @@ def descriptive_statistics(df):
     total_comparisons = len(df)
     exact_matches = df['Is_Exact_Match'].sum()
     accuracy_rate = (exact_matches / total_comparisons * 100) if total_comparisons > 0 else 0
+    _, ci_low, ci_high = bootstrap_ci(df['Is_Exact_Match'])
     
     country_stats = df.groupby('Country').agg({
         'Test_Data_Points': 'mean',
@@ -112,6 +109,11 @@ def descriptive_statistics(df):
         'Is_Exact_Match': 'mean'
     }).round(2)
     
+    country_ci = grouped_bootstrap_ci(df['Is_Exact_Match'], df['Country'])
+    country_stats[['Accuracy_CI_Low', 'Accuracy_CI_High']] = country_ci[['CI_Low', 'CI_High']].astype(float).round(2)
+    crop_ci = grouped_bootstrap_ci(df['Is_Exact_Match'], df['Category'])
+    crop_stats[['Accuracy_CI_Low', 'Accuracy_CI_High']] = crop_ci[['CI_Low', 'CI_High']].astype(float).round(2)
+    
     indicator_stats = df.groupby('Indicator').agg({
         'Test_Data_Points': 'mean',
         'Reference_Data_Points': 'mean',
@@ -122,6 +124,7 @@ def descriptive_statistics(df):
         'total_comparisons': total_comparisons,
         'exact_matches': exact_matches,
         'accuracy_rate': accuracy_rate,
+        'accuracy_ci': (ci_low * 100, ci_high * 100),
         'country_stats': country_stats,
         'crop_stats': crop_stats,
         'indicator_stats': indicator_stats
@@ -3,6 +3,17 @@ import numpy as np
 import re
 import yaml
 import os
+import sys
+from functools import lru_cache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.multi_pattern import MultiPatternMatcher
+from src.utils.table_parser import parse_numeric
+
+REFERENCE_KEYS = ['Country', 'Category', 'Indicator']
+MATCH_TOLERANCE_PERCENT = 1
+INTERPOLATION_TOLERANCE_PERCENT = 20
 
 class DataNormalizer:
     
@@ -16,6 +27,8 @@ class DataNormalizer:
         self.unit_mappings = self.config.get('unit_mappings', {})
         self.conversions = self.config.get('unit_conversions', {})
         self.crop_mappings = self.config.get('crop_mappings', {})
+        self.unit_matcher = MultiPatternMatcher(self.unit_mappings)
+        self.crop_matcher = MultiPatternMatcher(self.crop_mappings)
     
     def _load_config(self, config_file):
         try:
@@ -61,11 +74,8 @@ class DataNormalizer:
         
         unit_str = str(unit_str).lower().strip()
         
-        for key, value in self.unit_mappings.items():
-            if key in unit_str:
-                return value
-        
-        return unit_str
+        unit = self.unit_matcher.find(unit_str)
+        return unit if unit is not None else unit_str
     
     def convert_to_reference_unit(self, value, from_unit, to_unit):
         if pd.isna(value) or from_unit == to_unit:
@@ -90,15 +100,44 @@ class DataNormalizer:
         elif 'metric tons' in indicator or 'production' in indicator or 'tons' in indicator:
             data_type = 'Production'
         
-        crop_name = None
-        
-        for key, value in self.crop_mappings.items():
-            if key in indicator:
-                crop_name = value
-                break
+        crop_name = self.crop_matcher.find(indicator)
         
         return crop_name, data_type
     
+    def extract_years(self, years):
+        text = years.astype(object).where(years.notna()).astype(str).str.strip()
+        plain = text.str.fullmatch(r'[+-]?\d+')
+        return pd.to_numeric(text.where(plain, text.str.extract(r'(\d{4})', expand=False)), errors='coerce')
+    
+    def normalize_units(self, units):
+        lowered = units.astype(object).where(units.notna()).dropna().astype(str).str.lower().str.strip()
+        mapped = self.unit_matcher.match_series(lowered)
+        return mapped.where(mapped.notna(), lowered).reindex(units.index)
+    
+    def extract_records(self, df):
+        values = parse_numeric(df['Value']).astype(float)
+        years = self.extract_years(df['Year'])
+        indicators = df['Indicator'].astype(object).where(df['Indicator'].notna()).dropna().astype(str).str.lower().str.strip()
+        
+        is_area = indicators.str.contains('hectares', regex=False) | indicators.str.contains('area', regex=False)
+        is_production = (indicators.str.contains('metric tons', regex=False) | indicators.str.contains('production', regex=False) |
+                         indicators.str.contains('tons', regex=False))
+        data_types = pd.Series(np.select([is_area, is_production], ['Area', 'Production'], ''), index=indicators.index)
+        crops = self.crop_matcher.match_series(indicators)
+        
+        keep = values.notna() & years.notna() & crops.reindex(df.index).notna() & data_types.reindex(df.index, fill_value='').ne('')
+        rows = df[keep]
+        units = self.normalize_units(rows['Unit'])
+        return pd.DataFrame({
+            'Country': rows['Country'].to_numpy(),
+            'Year': years[keep].astype(np.int64).to_numpy(),
+            'Category': crops[keep[keep].index].to_numpy(),
+            'Indicator': data_types[keep[keep].index].to_numpy(),
+            'Value': values[keep].to_numpy(),
+            'Unit': units.where(units.notna() & units.ne(''), 'Unknown').to_numpy(),
+            'Original_Unit': rows['Unit'].where(rows['Unit'].notna(), 'Unknown').to_numpy(),
+        }, index=rows.index)
+    
     def normalize_single_test_record(self, test_row, reference_df):
         ref_data = reference_df[
             (reference_df['Country'] == test_row['Country']) & 
@@ -126,49 +165,141 @@ class DataNormalizer:
             normalized_row['Unit_Converted'] = False
             return normalized_row
     
+    def convert_values(self, values, from_units, to_units):
+        factors = (from_units.astype(str) + '_to_' + to_units.astype(str)).map(self.conversions)
+        convert = factors.notna() & values.notna() & (from_units != to_units)
+        return values.where(~convert, values * factors)
+    
+    def mode_units(self, df, keys):
+        groups = df.groupby(keys, sort=False).ngroup().to_numpy()
+        units, unique_units = pd.factorize(df['Unit'], sort=True)
+        has_group = groups >= 0
+        first_rows = np.unique(groups[has_group], return_index=True)[1]
+        result = df.loc[df.index[has_group][first_rows], keys].reset_index(drop=True)
+        
+        # Same choice as Series.mode().iloc[0]: the most frequent unit, ties broken by the smallest value (argmax takes
+        # the first code of the sorted factorization); groups whose units are all missing fall back to Unit.iloc[0].
+        first_units = pd.Series(df['Unit'].to_numpy(dtype=object)[np.flatnonzero(has_group)[first_rows]], dtype=object)
+        counted = has_group & (units >= 0)
+        counts = np.bincount(groups[counted] * len(unique_units) + units[counted],
+                             minlength=len(first_rows) * len(unique_units)).reshape(len(first_rows), len(unique_units))
+        if len(unique_units) == 0:
+            result['Unit'] = first_units
+            return result
+        result['Unit'] = pd.Series(unique_units.take(counts.argmax(axis=1)), dtype=object).where(counts.max(axis=1) > 0, first_units)
+        return result
+    
+    def reference_units(self, reference_df):
+        return self.mode_units(reference_df, REFERENCE_KEYS).rename(columns={'Unit': 'Ref_Unit'})
+    
     def normalize_test_data_to_reference(self, test_df, reference_df):
-        normalized_data = []
+        if len(test_df) == 0:
+            return pd.DataFrame()
         
-        for _, test_row in test_df.iterrows():
-            normalized_row = self.normalize_single_test_record(test_row, reference_df)
-            normalized_data.append(normalized_row)
+        ref_units = self.reference_units(reference_df)
+        ref_units['Matched'] = True
+        merged = test_df[REFERENCE_KEYS].merge(ref_units, on=REFERENCE_KEYS, how='left')
+        merged.index = test_df.index
+        matched = merged['Matched'].eq(True) & test_df[REFERENCE_KEYS].notna().all(axis=1)
+        ref_unit = merged['Ref_Unit']
         
-        return pd.DataFrame(normalized_data)
+        normalized = test_df.copy()
+        normalized['Value'] = test_df['Value'].where(~matched, self.convert_values(test_df['Value'], test_df['Unit'], ref_unit))
+        # Collecting the rows one by one turns every missing unit into NaN unless all of them are None.
+        unit = test_df['Unit'].astype(object).where(~matched, ref_unit)
+        normalized['Unit'] = unit if np.equal(unit.to_numpy(), None).all() else unit.where(unit.notna(), np.nan)
+        # As in Python, a missing unit given as None equals None while NaN differs from everything.
+        both_none = np.equal(test_df['Unit'].to_numpy(dtype=object), None) & np.equal(ref_unit.to_numpy(dtype=object), None)
+        normalized['Unit_Converted'] = matched & (test_df['Unit'] != ref_unit) & ~both_none
+        return normalized
     
-    def compare_test_data_with_reference(self, test_data, ref_data):
-        exact_matches = 0
-        total_test_values = len(test_data)
-        avg_deviation = 0
+    def compare_values(self, test_df, ref_df):
+        # Both frames carry an integer Group column; each test row is only compared with the reference rows of its group.
+        test_groups = test_df['Group'].to_numpy(dtype=np.int64)
+        test_years = test_df['Year'].to_numpy(dtype=float)
+        test_values = test_df['Value'].to_numpy(dtype=float)
+        test = pd.DataFrame({'Row': np.arange(len(test_df)), 'Group': test_groups, 'Year': test_df['Year'].to_numpy(),
+                             'Value': test_values, 'Unit': test_df['Unit'].to_numpy()})
+        ref = ref_df[['Group', 'Year', 'Value', 'Unit']]
+        ref = ref[ref['Year'].notna()]
         
-        for _, test_row in test_data.iterrows():
-            test_year = test_row['Year']
-            test_value = test_row['Value']
-            test_unit = test_row['Unit']
-            
-            ref_data_year = ref_data[ref_data['Year'] == test_year]
-            
-            if len(ref_data_year) > 0:
-                best_match, deviation, match_type = find_best_reference_match(ref_data_year, test_value, test_unit)
-                
-                if best_match is not None:
-                    if deviation <= 1:
-                        exact_matches += 1
-                    avg_deviation += deviation
-                else:
-                    avg_deviation += 100
-            else:
-                if len(ref_data) >= 2:
-                    within_range, deviation, interpolated, status = check_value_between_points(ref_data, test_value, test_year)
-                    if within_range:
-                        exact_matches += 1
-                    avg_deviation += deviation
-                else:
-                    avg_deviation += 100
+        # Same year: a single reference row is taken as is, several are converted to the test unit and the closest one wins.
+        pairs = test.merge(ref, on=['Group', 'Year'], suffixes=('', '_Ref'))
+        converted = self.convert_values(pairs['Value_Ref'], pairs['Unit_Ref'], pairs['Unit'])
+        pair_deviation = (np.abs((converted - pairs['Value']) / pairs['Value'] * 100)).where(pairs['Value'] != 0, np.inf)
+        per_row = pair_deviation.groupby(pairs['Row'].to_numpy()).agg(['size', 'min'])
+        same_year_count = np.zeros(len(test), dtype=np.int64)
+        same_year_count[per_row.index] = per_row['size']
+        same_year_deviation = np.full(len(test), np.nan)
+        same_year_deviation[per_row.index] = per_row['min']
+        
+        # Other years: linear interpolation between the neighbouring reference years, all rows at once.
+        ref_groups = ref['Group'].to_numpy(dtype=np.int64)
+        ref_years = ref['Year'].to_numpy(dtype=float)
+        ref_values = ref['Value'].to_numpy(dtype=float)
+        order = np.lexsort((ref_years, ref_groups))
+        ref_groups, ref_years, ref_values = ref_groups[order], ref_years[order], ref_values[order]
+        
+        bracketed = np.zeros(len(test), dtype=bool)
+        interpolated = np.full(len(test), np.nan)
+        if len(ref_years):
+            known_years = np.concatenate([ref_years, test_years[~np.isnan(test_years)]])
+            base, span = known_years.min(), known_years.max() - known_years.min() + 1
+            upper = np.searchsorted(ref_groups * span + (ref_years - base), test_groups * span + (test_years - base), side='left')
+            lower = upper - 1
+            upper_idx = np.minimum(upper, len(ref_years) - 1)
+            lower_idx = np.maximum(lower, 0)
+            bracketed = ((lower >= 0) & (upper < len(ref_years)) &
+                         (ref_groups[lower_idx] == test_groups) & (ref_groups[upper_idx] == test_groups))
+            year1, year2 = ref_years[lower_idx], ref_years[upper_idx]
+            value1, value2 = ref_values[lower_idx], ref_values[upper_idx]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                interpolated = value1 + (value2 - value1) * (test_years - year1) / (year2 - year1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            interpolation_deviation = np.where(
+                interpolated != 0,
+                np.abs((test_values - interpolated) / interpolated) * 100,
+                np.where(test_values != 0, np.inf, 0.0),
+            )
+        
+        n_groups = max(test_groups.max(initial=-1), ref_df['Group'].max() if len(ref_df) else -1) + 1
+        ref_sizes = np.bincount(ref_df['Group'].to_numpy(dtype=np.int64), minlength=n_groups)[test_groups]
         
-        avg_deviation = avg_deviation / total_test_values if total_test_values > 0 else 0
+        single = same_year_count == 1
+        several = same_year_count > 1
+        interpolated_rows = ~single & ~several & (ref_sizes >= 2) & bracketed
+        outside_rows = ~single & ~several & (ref_sizes >= 2) & ~bracketed
         
+        deviation = np.select([single, several, interpolated_rows, outside_rows],
+                              [0.0, same_year_deviation, interpolation_deviation, 0.0], 100.0)
+        is_match = single | (several & (same_year_deviation <= MATCH_TOLERANCE_PERCENT)) | \
+                   (interpolated_rows & (interpolation_deviation <= INTERPOLATION_TOLERANCE_PERCENT))
+        match_type = np.select(
+            [single, several & (deviation == 0), several & (deviation <= 1), several & (deviation <= 5),
+             several & (deviation <= 20), several, interpolated_rows, outside_rows],
+            ["Single match", "Exact match", "Very close", "Close", "Reasonable", "Far",
+             "Interpolated", "Test year outside reference range"],
+            "Insufficient reference data",
+        )
+        return pd.DataFrame({'Deviation': deviation, 'Is_Match': is_match, 'Match_Type': match_type}, index=test_df.index)
+    
+    def summarize_comparison(self, groups, compared, n_groups):
+        groups = np.asarray(groups, dtype=np.int64)
+        exact_matches = np.bincount(groups, weights=compared['Is_Match'].to_numpy(dtype=float), minlength=n_groups).astype(np.int64)
+        total_test_values = np.bincount(groups, minlength=n_groups)
+        # bincount adds in row order and, unlike a pandas groupby sum, keeps NaN deviations visible.
+        deviation_sum = np.bincount(groups, weights=compared['Deviation'].to_numpy(), minlength=n_groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_deviation = np.where(total_test_values > 0, deviation_sum / total_test_values, 0.0)
         return exact_matches, total_test_values, avg_deviation
     
+    def compare_test_data_with_reference(self, test_data, ref_data):
+        if len(test_data) == 0:
+            return 0, 0, 0
+        compared = self.compare_values(test_data.assign(Group=0), ref_data.assign(Group=0))
+        exact_matches, total_test_values, avg_deviation = self.summarize_comparison(np.zeros(len(test_data)), compared, 1)
+        return int(exact_matches[0]), int(total_test_values[0]), float(avg_deviation[0])
+    
     def determine_comparison_result(self, exact_matches, total_test_values, avg_deviation):
         if exact_matches == total_test_values:
             result = "All exact matches"
@@ -182,6 +313,11 @@ class DataNormalizer:
         return f"{result} ({exact_matches}/{total_test_values}, avg dev: {avg_deviation:.1f}%)"
 
 
+@lru_cache(maxsize=None)
+def default_normalizer():
+    return DataNormalizer()
+
+
 def find_best_reference_match(ref_data, test_value, test_unit):
     if len(ref_data) == 0:
         return None, None, None
@@ -189,7 +325,7 @@ def find_best_reference_match(ref_data, test_value, test_unit):
     if len(ref_data) == 1:
         return ref_data.iloc[0], 0, "Single match"
     
-    temp_normalizer = DataNormalizer()
+    temp_normalizer = default_normalizer()
     
     ref_data_copy = ref_data.copy()
     ref_data_copy['Converted_Value'] = ref_data_copy.apply(
@@ -226,7 +362,7 @@ def interpolate_between_points(ref_data, test_year):
     if len(ref_data) < 2:
         return None, None, None
     
-    ref_sorted = ref_data.sort_values('Year')
+    ref_sorted = ref_data.sort_values('Year', kind='mergesort')
     
     years = ref_sorted['Year'].values
     values = ref_sorted['Value'].values
@@ -1,151 +1,118 @@
+import argparse
 import pandas as pd
+import numpy as np
 import os
+import sys
 import glob
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.csv_tree_loader import load_csv_tree, default_snapshot_path
 from data_normalizer import DataNormalizer
 
 normalizer = DataNormalizer()
+VALUE_COLUMNS = ['Country', 'Year', 'Indicator', 'Value', 'Unit']
+KEY_COLUMNS = ['Country', 'Year', 'Category', 'Indicator']
+COMPARED_FIELDS = ['Value', 'Unit']
+STATUSES = ['match', 'mismatch', 'gold_only', 'test_only']
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLD_DIR = os.getenv("VALIDATION_GOLD_DIR", os.path.join(CURRENT_DIR, "goldValue"))
+EXTRACTED_DIR = os.getenv("VALIDATION_EXTRACTED_DIR", os.path.join(CURRENT_DIR, "valueForTest"))
 
-def merge_files_in_country_folder(country_folder_path):
-    all_data = []
-    csv_files = glob.glob(os.path.join(country_folder_path, "*.csv"))
-    
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            for _, row in df.iterrows():
-                value = normalizer.clean_value(row['Value'])
-                year = normalizer.extract_year_from_string(row['Year'])
-                
-                if value is None or year is None:
-                    continue
-                
-                crop_name, data_type = normalizer.extract_crop_and_type_from_indicator(row['Indicator'])
-                
-                if crop_name and data_type:
-                    normalized_unit = normalizer.normalize_unit(row['Unit'])
-                    
-                    all_data.append({
-                        'Country': row['Country'],
-                        'Year': year,
-                        'Category': crop_name,
-                        'Indicator': data_type,
-                        'Value': value,
-                        'Unit': normalized_unit if normalized_unit else 'Unknown'
-                    })
-        except Exception as e:
-            continue
-    
-    return pd.DataFrame(all_data)
+def split_duplicates(df, keys):
+    # Later rows win, as they did when the rows were collected into a dict.
+    duplicated = df.duplicated(keys, keep='last')
+    return df[~duplicated], df[duplicated]
 
-def compare_dataframes_correctly(gold_df, test_df):
-    if len(gold_df) == 0 and len(test_df) == 0:
-        return {'total_combinations': 0, 'matches': 0, 'differences': 0, 'accuracy': 100.0}
-    
-    gold_keys = set()
-    test_keys = set()
-    
-    gold_data = {}
-    test_data = {}
-    
-    for _, row in gold_df.iterrows():
-        key = f"{row['Country']},{row['Year']},{row['Category']},{row['Indicator']}"
-        gold_keys.add(key)
-        gold_data[key] = f"{row['Value']},{row['Unit']}"
-    
-    for _, row in test_df.iterrows():
-        key = f"{row['Country']},{row['Year']},{row['Category']},{row['Indicator']}"
-        test_keys.add(key)
-        test_data[key] = f"{row['Value']},{row['Unit']}"
-    
-    common_keys = gold_keys.intersection(test_keys)
-    total_combinations = len(common_keys)
-    
-    matches = 0
-    differences = []
-    
-    for key in common_keys:
-        gold_value_unit = gold_data[key]
-        test_value_unit = test_data[key]
-        
-        if gold_value_unit == test_value_unit:
-            matches += 1
-        else:
-            differences.append({
-                'combination': key,
-                'gold_value_unit': gold_value_unit,
-                'test_value_unit': test_value_unit
-            })
-    
-    accuracy = (matches / total_combinations * 100) if total_combinations > 0 else 0
-    
+def diff_dataframes(gold_df, test_df, keys=KEY_COLUMNS):
+    gold = gold_df.reindex(columns=keys + COMPARED_FIELDS)
+    test = test_df.reindex(columns=keys + COMPARED_FIELDS)
+    if len(gold) == 0:
+        gold = gold.astype(test.dtypes.to_dict())
+    if len(test) == 0:
+        test = test.astype(gold.dtypes.to_dict())
+    gold, gold_duplicates = split_duplicates(gold, keys)
+    test, test_duplicates = split_duplicates(test, keys)
+    
+    merged = gold.merge(test, on=keys, how='outer', suffixes=('_gold', '_test'), indicator=True)
+    both = (merged['_merge'] == 'both').to_numpy()
+    differs = np.zeros(len(merged), dtype=bool)
+    for field in COMPARED_FIELDS:
+        gold_values, test_values = merged[f'{field}_gold'], merged[f'{field}_test']
+        same = (gold_values == test_values) | (gold_values.isna() & test_values.isna())
+        merged[f'{field}_Differs'] = both & ~same.to_numpy()
+        differs |= merged[f'{field}_Differs'].to_numpy()
+    merged['Value_Diff'] = merged['Value_test'] - merged['Value_gold']
+    merged['Status'] = np.select([both & ~differs, both, (merged['_merge'] == 'left_only').to_numpy()], STATUSES[:3], STATUSES[3])
+    return merged.drop(columns='_merge'), gold_duplicates, test_duplicates
+
+def summarize_diff(status_counts, has_rows=True):
+    total_combinations = status_counts['match'] + status_counts['mismatch']
+    accuracy = status_counts['match'] / total_combinations * 100 if total_combinations > 0 else (0 if has_rows else 100.0)
     return {
-        'total_combinations': total_combinations,
-        'matches': matches,
-        'differences': len(differences),
-        'accuracy': accuracy,
-        'differences_details': differences,
-        'gold_only': len(gold_keys - test_keys),
-        'test_only': len(test_keys - gold_keys)
+        'total_combinations': int(total_combinations),
+        'matches': int(status_counts['match']),
+        'differences': int(status_counts['mismatch']),
+        'accuracy': float(accuracy),
+        'gold_only': int(status_counts['gold_only']),
+        'test_only': int(status_counts['test_only']),
     }
 
-def manual_validation():
-    gold_dir = r"C:\Users\alexe\IdeaProjects\Rag_Pipline_Thesis_Teplykh\test\goldValue"
-    test_dir = r"C:\Users\alexe\IdeaProjects\Rag_Pipline_Thesis_Teplykh\test\valueForTest"
-    
-    gold_countries = set()
-    test_countries = set()
-    
-    for item in os.listdir(gold_dir):
-        item_path = os.path.join(gold_dir, item)
-        if os.path.isdir(item_path):
-            gold_countries.add(item)
+def load_country_records(root_dir, folders):
+    tree = load_csv_tree(root_dir, required_columns=VALUE_COLUMNS, snapshot_path=default_snapshot_path(root_dir))
+    tree = tree[tree['Folder'].isin(folders)]
+    records = normalizer.extract_records(tree).drop(columns=['Original_Unit'])
+    records['Folder'] = tree.loc[records.index, 'Folder'].to_numpy()
+    return records
+
+def manual_validation(gold_dir=GOLD_DIR, test_dir=EXTRACTED_DIR, output_file="manual_validation_results.csv",
+                      diff_file="manual_validation_differences.csv"):
+    gold_countries = {item for item in os.listdir(gold_dir) if os.path.isdir(os.path.join(gold_dir, item))}
+    test_countries = {item for item in os.listdir(test_dir) if os.path.isdir(os.path.join(test_dir, item))}
+    matching_countries = sorted(gold_countries.intersection(test_countries))
     
-    for item in os.listdir(test_dir):
-        item_path = os.path.join(test_dir, item)
-        if os.path.isdir(item_path):
-            test_countries.add(item)
+    gold_df = load_country_records(gold_dir, matching_countries)
+    test_df = load_country_records(test_dir, matching_countries)
     
-    matching_countries = gold_countries.intersection(test_countries)
+    # One outer join over all countries; the folder is part of the key so countries never match each other.
+    diff, gold_duplicates, test_duplicates = diff_dataframes(gold_df, test_df, ['Folder'] + KEY_COLUMNS)
+    status_counts = pd.crosstab(diff['Folder'], diff['Status']).reindex(index=matching_countries, columns=STATUSES, fill_value=0)
+    gold_duplicate_counts = gold_duplicates['Folder'].value_counts()
+    test_duplicate_counts = test_duplicates['Folder'].value_counts()
     
     results = []
-    total_matches = 0
-    total_combinations = 0
-    total_differences = 0
-    
     for country in matching_countries:
-        gold_country_path = os.path.join(gold_dir, country)
-        test_country_path = os.path.join(test_dir, country)
-        
-        gold_df = merge_files_in_country_folder(gold_country_path)
-        test_df = merge_files_in_country_folder(test_country_path)
-        
-        comparison_result = compare_dataframes_correctly(gold_df, test_df)
-        
+        result = summarize_diff(status_counts.loc[country], has_rows=status_counts.loc[country].sum() > 0)
         results.append({
             'country': country,
-            'total_combinations': comparison_result['total_combinations'],
-            'matches': comparison_result['matches'],
-            'differences': comparison_result['differences'],
-            'accuracy': comparison_result['accuracy'],
-            'gold_only': comparison_result.get('gold_only', 0),
-            'test_only': comparison_result.get('test_only', 0),
-            'gold_files_count': len(glob.glob(os.path.join(gold_country_path, "*.csv"))),
-            'test_files_count': len(glob.glob(os.path.join(test_country_path, "*.csv")))
+            **result,
+            'gold_duplicates': gold_duplicate_counts.get(country, 0),
+            'test_duplicates': test_duplicate_counts.get(country, 0),
+            'gold_files_count': len(glob.glob(os.path.join(gold_dir, country, "*.csv"))),
+            'test_files_count': len(glob.glob(os.path.join(test_dir, country, "*.csv")))
         })
-        
-        total_matches += comparison_result['matches']
-        total_combinations += comparison_result['total_combinations']
-        total_differences += comparison_result['differences']
     
+    total_matches = status_counts['match'].sum()
+    total_combinations = total_matches + status_counts['mismatch'].sum()
     overall_accuracy = (total_matches / total_combinations * 100) if total_combinations > 0 else 0
     
-    results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('accuracy', ascending=False)
-    results_df.to_csv("manual_validation_results.csv", index=False)
+    results_df = pd.DataFrame(results, columns=['country', 'total_combinations', 'matches', 'differences', 'accuracy',
+                                                'gold_only', 'test_only', 'gold_duplicates', 'test_duplicates',
+                                                'gold_files_count', 'test_files_count'])
+    results_df = results_df.sort_values('accuracy', ascending=False, kind='mergesort')
+    results_df.to_csv(output_file, index=False)
+    diff[diff['Status'] != 'match'].to_csv(diff_file, index=False)
     
     print(f"Overall accuracy: {overall_accuracy:.1f}%")
+    if len(gold_duplicates) or len(test_duplicates):
+        print(f"Duplicate keys (last value kept): {len(gold_duplicates)} gold, {len(test_duplicates)} extracted")
     
     return results_df
 
 if __name__ == "__main__":
-    manual_validation()
+    parser = argparse.ArgumentParser(description="Compare extracted values with the manually annotated gold values")
+    parser.add_argument('--gold-dir', default=GOLD_DIR)
+    parser.add_argument('--test-dir', default=EXTRACTED_DIR)
+    args = parser.parse_args()
+    
+    manual_validation(args.gold_dir, args.test_dir)